@@ -6,7 +6,9 @@ from __future__ import division
 
 import sys
 import numpy
-import fftw3
+
+from ..ops.fft_tasks import FFTTasks
+from ..utils import Options
 
 numpy.seterr("raise")
 
@@ -66,132 +68,86 @@ def _calc_params(pixel_size, roi_center_line, N):
 
     return (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um
 
-def _alloc_fft(N, _cache={}):
-    if N not in _cache:
-        line = numpy.empty((N,), dtype=complex)
-        fline = numpy.empty ((N,), dtype=complex)
-        fft = fftw3.Plan (line, fline, direction='forward', flags=['estimate'])
-        ifft = fftw3.Plan (fline, line, direction='backward', flags=['estimate'])
-        _cache[N] = (line, fline), (fft, ifft)
-    return _cache[N]
+def _get_fft_task(N):
+    """ Return FFT task for lines with length N.
+    """
+    return FFTTasks((N,), 'double', options=Options(fftw_plan_flags='estimate'))
 
-def estimate_period_fft(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
-    (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
-    tmpline = numpy.zeros ((N,), dtype=float)
+def _get_lines(image, (i0,j0,i1,j1,i2,j2), roi_width, N):
+    """ Return an array of ROI lines with shape (roi_width+1, N).
+    """
+    ks = range (-roi_width//2, roi_width//2+1)
+    lines = numpy.zeros ((len(ks), N), dtype=float)
     tmpimage = image.astype (float)
-    for k in range (-roi_width//2, roi_width//2+1):
-        interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
-        line[:] = tmpline
-        fft.execute()
-        fline[0] = 0
-        fline *= fline.conjugate ()
-        pline += fline.real
+    for n, k in enumerate(ks):
+        interpolate_bilinear(lines[n], tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
+    return lines
+
+def _get_power_spectra(flines, kmin, kmax, filter_low, filter_high):
+    """ Compute power spectra of lines Fourier transforms in-place.
+    """
+    flines[:,0] = 0
+    flines *= flines.conjugate ()
+    if filter_low:
+        flines[:,:kmin] = 0
+        flines[:,flines.shape[-1]- kmin+1:] = 0
+    if filter_high:
+        flines[:,kmax:-kmax+1] = 0
+    return flines
+
+def estimate_period_fft(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
+    params, (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
+    task = _get_fft_task(N)
+    flines = task.fft_many(_get_lines(image, params, roi_width, N))
+    flines = _get_power_spectra(flines, kmin, kmax, False, False)
+    pline = flines.real.sum(axis=0)
     peak_index = pline[kmin:kmax].argmax() + kmin
     period_px = N / peak_index
     return period_px * l_um / N
 
 def estimate_period_acf1(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
-    (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
-    tmpline = numpy.zeros ((N,), dtype=float)
-    tmpimage = image.astype (float)
-    for k in range (-roi_width//2, roi_width//2+1):
-        interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
-        line[:] = tmpline
-        fft.execute()
-        fline[0] = 0
-        fline *= fline.conjugate ()
-        if filter_low:
-            fline[:kmin] = 0
-            fline[len (fline)- kmin+1:] = 0
-        if filter_high:
-            fline[kmax:-kmax+1] = 0            
-        ifft.execute()
-        pline += line.real
+    params, (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
+    task = _get_fft_task(N)
+    flines = task.fft_many(_get_lines(image, params, roi_width, N))
+    flines = _get_power_spectra(flines, kmin, kmax, filter_low, filter_high)
+    pline = task.ifft_many(flines, asreal=True).sum(axis=0)
     period_px = pline[imin:imax].argmax() + imin
     return period_px * l_um / N
 
 def estimate_period_acf2(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
-    (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
-    l = []
-    tmpline = numpy.zeros ((N,), dtype=float)
-    tmpimage = image.astype (float)
-    import matplotlib.pyplot as plt
-    for k in range (-roi_width//2, roi_width//2+1):
-        interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
-        line[:] = tmpline
-        fft.execute()
-        fline[0] = 0
-        fline *= fline.conjugate()
-        if filter_low:
-            fline[:kmin] = 0
-            fline[len (fline)- kmin+1:] = 0
-        if filter_high:
-            fline[kmax:-kmax+1] = 0            
-        ifft.execute()
-        period_px = line.real[imin:imax].argmax() + imin
-        if period_px in [imin,imax-1]:
-            #print 'Skipping', k, period_px
-            continue
-        l.append(period_px)
+    params, (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
+    task = _get_fft_task(N)
+    flines = task.fft_many(_get_lines(image, params, roi_width, N))
+    flines = _get_power_spectra(flines, kmin, kmax, filter_low, filter_high)
+    acfs = task.ifft_many(flines, asreal=True)
+    periods_px = acfs[:,imin:imax].argmax(axis=1) + imin
+    # skip lines with maximum at the border of the period range
+    l = periods_px[(periods_px!=imin) & (periods_px!=imax-1)]
     period_px = numpy.mean (l)
     return period_px * l_um / N
 
 def estimate_period_acf3(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
-    (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
-    l = []
-    w = []
-    tmpline = numpy.zeros ((N,), dtype=float)
-    tmpimage = image.astype (float)
-    for k in range (-roi_width//2, roi_width//2+1):
-        interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
-        line[:] = tmpline
-        fft.execute()
-        fline[0] = 0
-        fline *= fline.conjugate ()
-        if filter_low:
-            fline[:kmin] = 0
-            fline[len (fline)- kmin+1:] = 0
-        if filter_high:
-            fline[kmax:-kmax+1] = 0            
-        ifft.execute()
-        period_px = line.real[imin:imax].argmax() + imin
-        if period_px in [imin,imax-1]:
-            #print 'Skipping', k, period_px
-            continue
-        w.append(line.real[period_px]/line.real[0])
-        l.append(period_px * w[-1])
-
-    period_px = numpy.sum(l) / numpy.sum(w)
+    params, (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
+    task = _get_fft_task(N)
+    flines = task.fft_many(_get_lines(image, params, roi_width, N))
+    flines = _get_power_spectra(flines, kmin, kmax, filter_low, filter_high)
+    acfs = task.ifft_many(flines, asreal=True)
+    periods_px = acfs[:,imin:imax].argmax(axis=1) + imin
+    mask = (periods_px!=imin) & (periods_px!=imax-1)
+    acfs, periods_px = acfs[mask], periods_px[mask]
+    w = acfs[numpy.arange(len(acfs)), periods_px] / acfs[:,0]
+    period_px = numpy.sum(periods_px * w) / numpy.sum(w)
     return period_px * l_um / N
 
 def estimate_period_fft4(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
-    (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
-    tmpline = numpy.zeros ((N,), dtype=float)
-    tmpimage = image.astype (float)
-    for k in range (-roi_width//2, roi_width//2+1):
-        interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
-        line[:] = tmpline
-        fft.execute()
-        fline[0] = 0
-        if filter_high:
-            fline[kmax:-kmax+1] = 0
-        fline *= fline.conjugate ()
-        ifft.execute()
-        period_px = line.real[imin:imax].argmax() + imin
-        if period_px in [imin,imax-1]:
-            #print 'Skipping', k, period_px
-            continue
-        pline += fline.real
+    params, (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
+    task = _get_fft_task(N)
+    flines = task.fft_many(_get_lines(image, params, roi_width, N))
+    flines = _get_power_spectra(flines, kmin, kmax, False, filter_high)
+    acfs = task.ifft_many(flines, asreal=True)
+    periods_px = acfs[:,imin:imax].argmax(axis=1) + imin
+    mask = (periods_px!=imin) & (periods_px!=imax-1)
+    pline = flines.real[mask].sum(axis=0)
     peak_index = pline[kmin:kmax].argmax() + kmin
     kmin = max (peak_index-10, kmin)
     kmax = min(peak_index+10, kmax)
@@ -202,8 +158,7 @@ def estimate_period_fft4(image, pixel_size, roi_center_line, roi_width, N, filte
 
 def estimate_period_acf5(image, pixel_size, roi_center_line, roi_width, N, filter_low=False, filter_high=False):
     (i0,j0,i1,j1,i2,j2), (imin,imax,kmin,kmax), l_um = _calc_params(pixel_size, roi_center_line, N)
-    (line, fline), (fft, ifft) = _alloc_fft(N)
-    pline = numpy.zeros ((N,), dtype=float)
+    task = _get_fft_task(N)
     l = []
     tmpline = numpy.zeros ((N,), dtype=float)
     tmpimage = image.astype(float)
@@ -212,17 +167,16 @@ def estimate_period_acf5(image, pixel_size, roi_center_line, roi_width, N, filte
     for k in range (-roi_width//2, roi_width//2+1):
         interpolate_bilinear(tmpline, tmpimage, (i0+k*i2, j0+k*j2), ((i1-i0)/N, (j1-j0)/N))
         if period_estimate is None:
-            line[:] = tmpline
-            fft.execute()
+            fline = task.fft(tmpline)
             fline[0] = 0
             fline[1] = fline[-1] = 0
             fline[2] = fline[-2] = 0
             fline *= fline.conjugate()
             if filter_high:
                 fline[kmax:-kmax+1] = 0            
-            ifft.execute()
-            period_estimate = line.real[imin:imax].argmax() + imin
-            #print line.real[period_estimate]/N
+            line = task.ifft(fline, asreal=True)
+            period_estimate = line[imin:imax].argmax() + imin
+            #print line[period_estimate]
         
         p = orig_estimate = period_estimate
         dp = 0.05 
@@ -6,15 +6,15 @@ import numpy
 from enthought.traits.api import Button, Any, Bool, Tuple, Enum, Float, Int, Instance
 from enthought.traits.ui.api import View, VGroup, Item, HGroup, HSplit, Group, TupleEditor
 
-from iocbio.ops.fft_tasks import FFTTasks
+from iocbio.ops.fft_tasks import FFTTasks, fft_plan_pool
 from iocbio.utils import Options
-from iocbio.ops.local_extrema_ext import local_minima, local_maxima
+from iocbio.ops.local_extrema import find_local_minima, find_local_maxima
+from iocbio.ops.filters import get_discrete_gauss_multipliers
 
 from .base_viewer_task import BaseViewerTask
 from .array_data_source import ArrayDataSource
 from .timeit import TimeIt
 
-_fft_worker_cache = [None, None]
 
 from threading import Thread
 
@@ -48,7 +48,7 @@ class OpsViewerTask(BaseViewerTask):
 
     compute_fft_button = Button('Compute FFT')
     compute_ifft_button = Button('Compute IFFT')
-    clear_fft_worker_button = Button('Clear FFT worker cache')
+    clear_fft_worker_button = Button('Clear FFT plan pool')
     find_local_maxima_button = Button('Find local maxima')
     find_local_minima_button = Button('Find local minima')
     clear_points_button = Button('Clear points')
@@ -100,24 +100,13 @@ class OpsViewerTask(BaseViewerTask):
 
     @property
     def fft_worker(self):
-        if _fft_worker_cache[0] != self.viewer.data.shape:
-            timeit = TimeIt (self.viewer, 'creating FFT worker')
-            _fft_worker_cache[0] = self.viewer.data.shape
-            _fft_worker_cache[1] = FFTTasks(self.viewer.data.shape, options = Options(fftw_threads = 4))
-            timeit.stop()
-        return _fft_worker_cache[1]
-
-    @fft_worker.deleter
-    def fft_worker(self):
-        timeit = TimeIt('removing FFT worker')
-        _fft_worker_cache[0] = None
-        _fft_worker_cache[1] = None
+        # plans and buffers are reused from fft_plan_pool
+        return FFTTasks(self.viewer.data.shape, options = Options(fftw_threads = 4))
 
     def _clear_fft_worker_button_fired(self):
-        fft_worker = self.fft_worker
-        if fft_worker is not None:
-            fft_worker.clear()
-        del self.fft_worker
+        timeit = TimeIt(self.viewer, 'removing FFT workers')
+        fft_plan_pool.clear()
+        timeit.stop()
 
     def _discrete_gauss_scales_changed(self, old, new):
         if old==new: return
@@ -150,20 +139,14 @@ class OpsViewerTask(BaseViewerTask):
         if not isinstance (data, numpy.ndarray):
             data = data[:] # tiffarray
         threshold = self.threshold
-        boundary = self.boundary_map[self.boundary]
         timeit = TimeIt(self.viewer, 'computing local maxima')
-        def cb(done, result, timeit=timeit):
-            timeit.update('%.2f%% done, %s points sofar' % (done*100.0, len (result)))
-            if len (result)>1000000:
-                raise RuntimeError('too many points (more than billion), try blurring')
         try:
-            l = local_maxima(data, threshold, boundary, cb)
+            l = find_local_maxima(data, threshold, self.boundary, self.max_nof_points)
         except Exception, msg:
             timeit.stop('failed with exception: %s' % (msg))
             raise
         timeit.stop()
-        l.sort(reverse=True)
-        self.viewer.set_point_data(l[:self.max_nof_points])
+        self.viewer.set_point_data([(v,) + tuple(i) for v, i in zip(l['value'], l['index'])])
         self.viewer.reset()
 
     def compute_local_minima(self):
@@ -171,20 +154,14 @@ class OpsViewerTask(BaseViewerTask):
         if not isinstance (data, numpy.ndarray):
             data = data[:] # tiffarray
         threshold = self.threshold
-        boundary = self.boundary_map[self.boundary]
         timeit = TimeIt (self.viewer, 'computing local minima')
-        def cb(done, result, timeit=timeit):
-            timeit.update('%.2f%% done, %s points sofar' % (done*100.0, len (result)))
-            if len (result)>1000000:
-                raise RuntimeError('too many points (more than billion), try blurring')
         try:
-            l = local_minima(data, threshold, boundary, cb)
+            l = find_local_minima(data, threshold, self.boundary, self.max_nof_points)
         except Exception, msg:
             timeit.stop('failed with exception: %s' % (msg))
             raise
         timeit.stop()
-        l.sort(reverse=False)
-        self.viewer.set_point_data(l[:self.max_nof_points])
+        self.viewer.set_point_data([(v,) + tuple(i) for v, i in zip(l['value'], l['index'])])
         self.viewer.reset()
 
     def _find_local_minima_button_fired(self):
@@ -241,12 +218,7 @@ class OpsViewerTask(BaseViewerTask):
         fkername = 'KernelDG[%s, %s, %s]' % (t0, t1, t2)
         fker = self.viewer.get_data(fkername)
         if fker is None:
-            theta0 = 2*numpy.pi*numpy.fft.fftfreq(data.shape[0])
-            theta1 = 2*numpy.pi*numpy.fft.fftfreq(data.shape[1])
-            theta2 = 2*numpy.pi*numpy.fft.fftfreq(data.shape[2])
-            fker0 = numpy.exp((numpy.cos(theta0)-1)*t0).reshape((data.shape[0],1,1))
-            fker1 = numpy.exp((numpy.cos(theta1)-1)*t1).reshape((1,data.shape[1],1))
-            fker2 = numpy.exp((numpy.cos(theta2)-1)*t2).reshape((1,1,data.shape[2]))
+            fker0, fker1, fker2 = get_discrete_gauss_multipliers(data.shape, (t0, t1, t2))
             fker = fker0 * fker1 * fker2
             self.viewer.add_data(fkername, fker)
         ffdata = fdata * fker
@@ -45,10 +45,10 @@ class ScaleSpaceTask(BaseViewerTask):
             data = data[:] # tiffarray
         # compute fft of data
         
-        from iocbio.ops.local_extrema_ext import local_maxima
-        l = local_maxima(data, 0)
-        print len (l)
-        l.sort(reverse=True)
+        from iocbio.ops.local_extrema import find_local_maxima
+        r = find_local_maxima(data, 0)
+        print len (r)
+        l = [(v,) + tuple(i) for v, i in zip(r['value'], r['index'])]
         self.results = numpy.array(l)
         self.viewer.set_point_data(l)
         return
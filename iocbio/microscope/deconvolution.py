@@ -28,17 +28,21 @@ test data that is degraded with Poisson noise::
 """
 
 from __future__ import division
-__autodoc__ = ['deconvolve', 'Deconvolve', 'DeconvolveRLPoisson']
-__all__ = ['deconvolve']
+__autodoc__ = ['deconvolve', 'deconvolve_tiled', 'deconvolve_batch', 'deconvolve_time_lapse',
+               'Deconvolve', 'DeconvolveRLPoisson', 'CheckpointWriter']
+__all__ = ['deconvolve', 'deconvolve_tiled', 'deconvolve_batch', 'deconvolve_time_lapse']
 
 import os
 import sys
+import glob
 from ..io import ImageStack
 from ..utils import ProgressBar, encode, tostr, expand_to_shape, contract_to_shape
-from ..utils import mul_seq, float2dtype, Options, VERBOSE
+from ..utils import mul_seq, float2dtype, Options, VERBOSE, bytes2str
 from .psf import normalize_uint8, discretize
 from ..io import RowFile
 import time
+import Queue
+from threading import Thread
 import numpy
 import numpy as np
 from .dv import dv
@@ -90,11 +94,90 @@ def get_coherent_images(psf, stack, dtype):
     psf_images = expand_to_shape(psf_images, optimal_shape, dtype)
     stack_images = expand_to_shape(stack_images, optimal_shape, dtype)
 
-    psf_images = fftpack.fftshift(psf_images)
+    psf_images = fftpack.ifftshift(psf_images)
     psf_images /= psf_images.sum()
 
     return psf_images, stack_images
 
+def get_psf_margins(psf, stack):
+    """
+    Return the extent of PSF in stack voxel units. This is used as
+    the overlap width of blocks in tiled deconvolution.
+    """
+    zoom_factors = [a/b for a,b in zip(psf.get_voxel_sizes(), stack.get_voxel_sizes())]
+    return tuple([int(numpy.ceil(n*z)) for n,z in zip(psf.images.shape, zoom_factors)])
+
+# Number of float arrays of the task shape that a deconvolution task
+# holds at the same time: real cache, half spectrum cache (1), half
+# spectra of convolve kernel (3x1), data, estimate, two previous
+# estimates, convolved estimate, TV term and temporaries.
+deconvolve_nof_float_arrays = 12
+
+# Estimate history stored in half precision is switched to float
+# type when the stored estimate maximum exceeds this value, the
+# largest finite half precision value is 65504.
+half_storage_max = 2.0**14
+
+def get_deconvolve_memory(shape, float_type='single', half_storage=False):
+    """
+    Return an estimate of peak memory usage in bytes of deconvolving
+    an array with given shape. When half_storage is True then data
+    and previous estimates are assumed to be stored in half
+    precision, see Deconvolve.store_data.
+    """
+    itemsize = numpy.dtype(float2dtype(float_type)).itemsize
+    nof_arrays = deconvolve_nof_float_arrays
+    if half_storage:
+        nof_arrays -= 3 * (1 - 2/itemsize)
+    return int(mul_seq(shape) * itemsize * nof_arrays)
+
+def get_tile_shape(shape, margins, max_voxels):
+    """
+    Return fft-optimal block shape for tiled deconvolution such that
+    the number of block voxels does not exceed max_voxels and each
+    block has margins overlap with its neighbors.
+    """
+    block = list(shape)
+    while 1:
+        optimal_shape = tuple(map(FFTTasks.get_optimal_fft_size, block))
+        if mul_seq(optimal_shape) <= max_voxels:
+            return optimal_shape
+        cores = [b - 2*m for b,m in zip(block, margins)]
+        candidates = [(b, i) for i,(b,c) in enumerate(zip(block, cores)) if c > 1]
+        if not candidates:
+            raise ValueError('Memory budget is too small for PSF margins %s: need at least %s voxels per block'\
+                                 % (margins, mul_seq(optimal_shape)))
+        i = max(candidates)[1]
+        block[i] = min(cores[i]//2 + 2*margins[i], shape[i])
+
+def get_tiles(shape, block_shape, margins):
+    """
+    Return a list of (block, core, inner) tuples of slices for
+    overlap-save tiling of an array with given shape. Here block
+    defines the region of a tile including margins, core defines
+    the region of the result that the tile determines, and inner
+    defines the core region within the block.
+    """
+    axes_tiles = []
+    for n, b, m in zip(shape, block_shape, margins):
+        if b >= n:
+            axes_tiles.append([(slice(0, n), slice(0, n), slice(0, n))])
+            continue
+        core_size = b - 2*m
+        assert core_size > 0,`b, m`
+        l = []
+        start = 0
+        while start < n:
+            end = min(start + core_size, n)
+            b0, b1 = max(0, start - m), min(n, end + m)
+            l.append((slice(b0, b1), slice(start, end), slice(start - b0, end - b0)))
+            start = end
+        axes_tiles.append(l)
+    tiles = [()]
+    for l in axes_tiles:
+        tiles = [t + (item,) for t in tiles for item in l]
+    return [tuple(zip(*t)) for t in tiles]
+
 def fourier_sphere(shape, diameters, eps = 1e-3):
     """ Return a Fourier transform of an ellipsoid with diameters.
     eps is accuracy parameter. The results of this functions will
@@ -119,6 +202,126 @@ def fourier_sphere(shape, diameters, eps = 1e-3):
     ImageStack(images).save (cache_fn)
     return images
 
+# Directory and in-memory cache of prepared PSF spectra, see get_prepared_psf.
+psf_cache_dir = os.environ.get('IOCBIO_PSF_CACHE_DIR', os.path.join('.iocbio','deconvolve'))
+_psf_cache = {}
+_psf_cache_order = []
+
+def get_psf_cache_dir(options):
+    """ Return the directory of prepared PSF files.
+
+    The directory is ``options.psf_cache_dir`` or, when not
+    specified, `iocbio.microscope.deconvolution.psf_cache_dir` that
+    defaults to ``$IOCBIO_PSF_CACHE_DIR`` or ``.iocbio/deconvolve``
+    in the current working directory.
+    """
+    return os.path.expanduser(options.get(psf_cache_dir=None) or psf_cache_dir)
+
+def get_psf_cache_key(psf, stack, dtype):
+    """ Return a key of PSF that is prepared for deconvolving stack,
+    see get_prepared_psf.
+    """
+    psf_angle = psf.get_rotation_angle() or 0
+    stack_angle = stack.get_rotation_angle() or 0
+    return encode('psf=%s, shape=%s, rotation=%s, psf_voxels=%s, stack_voxels=%s, stack_shape=%s, dtype=%s' \
+                      % (hasharr(numpy.ascontiguousarray(psf.images)), psf.images.shape,
+                         psf_angle - stack_angle, tuple(psf.get_voxel_sizes()),
+                         tuple(stack.get_voxel_sizes()), stack.images.shape, numpy.dtype(dtype).name))
+
+def get_prepared_psf(psf, stack, dtype, options):
+    """ Return PSF and stack images as in get_coherent_images but
+    PSF images may be replaced with its Fourier transform (half
+    spectrum) that is found in the cache of prepared PSFs.
+
+    When ``options.psf_cache_size`` (in megabytes) is positive then
+    the Fourier transforms of prepared PSFs are kept in memory and
+    saved to ``prepared_psf_*.npy`` files in the directory returned
+    by `get_psf_cache_dir` that are memory-mapped when reused. The
+    cache is keyed by PSF contents, rotation, voxel sizes, stack
+    shape and float type.
+
+    Returns
+    -------
+    psf_images : :numpy:`ndarray`
+      Real PSF images or complex Fourier transform of PSF images.
+    stack_images : :numpy:`ndarray`
+    key : {None, str}
+      When not None, PSF Fourier transform should be saved to cache
+      with `save_prepared_psf` after a deconvolution task has been
+      constructed.
+
+    See also
+    --------
+    get_coherent_images, save_prepared_psf
+    """
+    cache_size = options.get(psf_cache_size=256)
+    if not cache_size:
+        psf_images, stack_images = get_coherent_images(psf, stack, dtype)
+        return psf_images, stack_images, None
+    key = get_psf_cache_key(psf, stack, dtype)
+    item = _psf_cache.get(key)
+    if item is not None:
+        _add_to_psf_cache(key, item, cache_size)
+    else:
+        for fn in glob.glob(os.path.join(get_psf_cache_dir(options), 'prepared_psf_%s_*.npy' % (key))):
+            shape = tuple(map(int, os.path.splitext(fn)[0].split('_')[-1].split('x')))
+            try:
+                psf_f = numpy.load(fn, mmap_mode='r')
+            except Exception, msg:
+                print 'Failed to load prepared PSF from %r: %s' % (fn, msg)
+                continue
+            print 'Using cached prepared PSF:', fn
+            os.utime(fn, None) # mark as recently used
+            item = shape, psf_f
+            _add_to_psf_cache(key, item, cache_size)
+            break
+    if item is None:
+        psf_images, stack_images = get_coherent_images(psf, stack, dtype)
+        return psf_images, stack_images, key
+    shape, psf_f = item
+    stack_images = expand_to_shape(stack.images, shape, dtype)
+    return psf_f, stack_images, None
+
+def save_prepared_psf(key, task, options):
+    """ Save the Fourier transform of task PSF to the cache of prepared PSFs.
+
+    See also
+    --------
+    get_prepared_psf
+    """
+    if key is None:
+        return
+    cache_size = options.get(psf_cache_size=256)
+    psf_f = task.convolve_kernel_fourier
+    _add_to_psf_cache(key, (task.shape, psf_f), cache_size)
+    cache_dir = get_psf_cache_dir(options)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    fn = os.path.join(cache_dir, 'prepared_psf_%s_%s.npy' % (key, 'x'.join(map(str, task.shape))))
+    tmp_fn = fn + '.%s.tmp' % (os.getpid())
+    f = open(tmp_fn, 'wb')
+    numpy.save(f, psf_f)
+    f.close()
+    os.rename(tmp_fn, fn)
+    # remove least recently used files when cache size is exceeded
+    files = sorted([(os.path.getmtime(fn), fn) for fn in glob.glob(os.path.join(cache_dir, 'prepared_psf_*.npy'))])
+    size = sum([os.path.getsize(fn) for t, fn in files])
+    while files and size > cache_size * 2**20:
+        t, fn = files.pop(0)
+        size -= os.path.getsize(fn)
+        os.remove(fn)
+
+def _add_to_psf_cache(key, item, cache_size):
+    if key in _psf_cache:
+        _psf_cache_order.remove(key)
+        del _psf_cache[key]
+    # remove least recently used items when cache size is exceeded
+    size = item[1].nbytes + sum([_psf_cache[k][1].nbytes for k in _psf_cache_order])
+    while _psf_cache_order and size > cache_size * 2**20:
+        size -= _psf_cache.pop(_psf_cache_order.pop(0))[1].nbytes
+    _psf_cache[key] = item
+    _psf_cache_order.append(key)
+
 def thr(a, b):
     return np.abs(a - b).sum() / abs(float(b.sum()))
 
@@ -129,10 +332,73 @@ def idiv(a, b):
     return (a * numpy.log(a/b) - a + b).mean()
 
 
+# Upper bound of the extrapolation parameter in accelerated
+# Richardson-Lucy iterations. Values close to 1 lead to instability.
+max_acceleration_alpha = 0.95
+
 def hasharr(arr):
     import hashlib
     return hashlib.sha1 (arr).hexdigest()
 
+class CheckpointWriter(Thread):
+    """
+    Background thread that executes write operations of deconvolution
+    results off the iteration loop.
+
+    Write operations are executed in the order of submission. The
+    queue of pending operations is bounded so that submitting blocks
+    when the writer falls behind, this limits the number of estimate
+    snapshots that are kept in memory. When a write operation fails,
+    subsequent operations are skipped and the first error is re-raised
+    by `submit` and `close` in the calling thread.
+
+    See also
+    --------
+    Deconvolve.save_result
+    """
+
+    def __init__(self, queue_size=2):
+        Thread.__init__(self)
+        self.daemon = True
+        self.queue = Queue.Queue(queue_size)
+        self.errors = []    # list of exc_info tuples
+        self.start()
+
+    def raise_error(self):
+        """ Re-raise the first error of write operations.
+        """
+        if self.errors:
+            exc_type, exc_value, exc_tb = self.errors[0]
+            raise exc_type, exc_value, exc_tb
+
+    def submit(self, func, *args):
+        """ Submit ``func(*args)`` for execution.
+        """
+        self.raise_error()
+        self.queue.put((func, args))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            func, args = item
+            if self.errors:
+                continue
+            try:
+                func(*args)
+            except Exception, msg:
+                print 'Checkpoint writer failed: %s' % (msg)
+                self.errors.append(sys.exc_info())
+
+    def close(self):
+        """ Wait until all submitted operations are executed and stop
+        the thread. Re-raise the first error of write operations.
+        """
+        self.queue.put(None)
+        self.join()
+        self.raise_error()
+
 class Deconvolve(FFTTasks):
     """
     Base class for deconvolution worker classes.
@@ -160,15 +426,26 @@ class Deconvolve(FFTTasks):
         --------
         iocbio.ops.FFTTasks
         """
-        FFTTasks.__init__ (self, shape, options = options)
+        FFTTasks.__init__ (self, shape, options = options, real=True)
         self.options = options
         self.convergence_epsilon = options.get(convergence_epsilon=0.05)
 
         self.cache_dir = None
+        self.writer = None
+
+        # data and estimate history can be stored in half precision
+        # as array/storage_scale, see store_data
+        if options.get(half_precision_storage=False):
+            self.storage_dtype = numpy.float16
+        else:
+            self.storage_dtype = self.float_dtype
+        self.storage_scale = 1.0
 
         self.set_save_data(None, shape, self.float_dtype)
         self.lambda_ = options.get(rltv_lambda=0.0)
         self.count = None
+        # (se, kl, count) of the last estimate convolution, see compute_estimate
+        self.model_statistics = None
 
     def get_suffix(self):
         return '_deconvolved'
@@ -189,6 +466,50 @@ class Deconvolve(FFTTasks):
         self.save_data_shape = data_shape
         self.save_data_type = data_type
 
+    def store_data(self, data):
+        """ Store data to be deconvolved.
+
+        When ``options.half_precision_storage`` is True then data is
+        stored in half precision as ``data/storage_scale`` where
+        storage_scale is a power of 2 such that the maximum of stored
+        data is about 16 and the relative accuracy of stored data
+        is reported. The estimate history uses the same scale and it
+        is switched to float type when the estimate maximum exceeds
+        the data maximum about 1000 times, see `half_storage_max`.
+
+        See also
+        --------
+        get_data
+        """
+        if self.storage_dtype == self.float_dtype:
+            self.data = data.astype(self.float_dtype)
+            self.storage_scale = 1.0
+            return
+        mx = abs(data).max()
+        if mx:
+            self.storage_scale = 2.0 ** (numpy.ceil(numpy.log2(mx)) - 4)
+        else:
+            self.storage_scale = 1.0
+        self.data = (data / self.storage_scale).astype(self.storage_dtype)
+        err = abs(self.data * numpy.float32(self.storage_scale) - data).max()
+        print 'Data is stored in half precision: scale=%s, max relative error=%.1e'\
+            % (self.storage_scale, err / (mx or 1))
+
+    def get_data(self):
+        """ Return data to be deconvolved as an array of float type.
+
+        The returned array may share memory with the stored data.
+
+        See also
+        --------
+        store_data
+        """
+        if self.data.dtype == self.float_dtype:
+            return self.data
+        data = self.data.astype(self.float_dtype)
+        data *= self.storage_scale
+        return data
+
     def set_test_data(self):
         """Set test data.
 
@@ -202,7 +523,7 @@ class Deconvolve(FFTTasks):
         options = self.options
         snr = None
         if options.get(degrade_input=False):
-            self.test_data = self.data
+            self.test_data = self.get_data()
 
             degraded_path = os.path.join(self.cache_dir, 'degraded.tif')
 
@@ -223,19 +544,19 @@ class Deconvolve(FFTTasks):
 
             if options.get(first_estimate='input image')=='last result' and os.path.isfile(degraded_path):
                 print 'Loading degraded image.'
-                self.data = ImageStack.load(degraded_path).images
+                self.store_data(ImageStack.load(degraded_path).images)
             else:
                 print 'Degrading image with Poisson noise..',
                 import scipy.stats
-                self.data = scipy.stats.poisson.rvs(data).astype(data.dtype)
+                self.store_data(scipy.stats.poisson.rvs(data).astype(data.dtype))
                 print 'done.'
                 print 'Saving degraded image.'
-                self.save(self.data, 'degraded.tif', True)
-            d4 = ops_ext.kullback_leibler_divergence(self.data.astype(numpy.float64), data.astype (numpy.float64), 5.0)
+                self.save(self.get_data(), 'degraded.tif', True)
+            d4 = ops_ext.kullback_leibler_divergence(self.get_data().astype(numpy.float64), data.astype (numpy.float64), 5.0)
             print 'Kullback-Leibler divergence of degraded image', d4, ' (should be close to 1/2)'
 
         if snr is None:
-            snr = estimate_snr(self.data)
+            snr = estimate_snr(self.get_data())
         print 'Input image has signal-to-noise ratio', snr
         print 'Suggested RLTV regularization parameter: %s[blocky]..%s[honeycomb]' % (43/snr, 60/snr)
         self.snr = snr
@@ -289,8 +610,67 @@ class Deconvolve(FFTTasks):
                    self.save_pathinfo,
                    options = self.options).save(f)
 
-    def deconvolve(self):
+    def save_result(self, estimate, label):
+        """ Save estimate as ``result_<label>`` checkpoint.
+
+        A snapshot of the estimate is taken immediately. When
+        ``options.intermediate_results_format`` is ``'npy'`` then the
+        snapshot is saved as raw numpy array ``result_<label>.npy``
+        that is fast to write and to load when resuming with
+        ``first_estimate='last result'``, otherwise it is saved as
+        ``result_<label>.tif``. When checkpoint writer is running, the
+        file is written in the writer thread.
+
+        Parameters
+        ----------
+        estimate : :numpy:`ndarray`
+        label : str
+
+        See also
+        --------
+        CheckpointWriter, save
+        """
+        if self.cache_dir is None:
+            return
+        snapshot = contract_to_shape(estimate, self.save_data_shape, estimate.dtype)
+        if self.options.get(intermediate_results_format='tif')=='npy':
+            func = numpy.save
+            args = (os.path.join(self.cache_dir, 'result_%s.npy' % (label)), snapshot)
+        else:
+            func = self.save
+            args = (snapshot, 'result_%s.tif' % (label), True)
+        if self.writer is None:
+            func(*args)
+        else:
+            self.writer.submit(func, *args)
+
+    def submit(self, func, *args):
+        """ Execute ``func(*args)`` in checkpoint writer thread when
+        it is running, otherwise execute it immediately.
+        """
+        if self.writer is None:
+            func(*args)
+        else:
+            self.writer.submit(func, *args)
+
+    def deconvolve(self, estimate=None):
         """ Execute deconvolution iteration and return estimate.
+
+        When ``estimate`` is specified then it is used as the first
+        estimate of iteration instead of ``options.first_estimate``.
+
+        When ``options.rltv_acceleration`` is True then Biggs-Andrews
+        vector extrapolation is applied to estimates before each
+        iteration. The extrapolation parameter ``alpha`` and the
+        estimated number of saved iterations, ``sum(alpha/(1-alpha))``,
+        are saved to ``deconvolve_data.txt``.
+
+        When compute_estimate sets ``model_statistics`` then the
+        ``mse`` and ``klic`` values are computed from the convolution
+        that compute_estimate applies to its input estimate, that is,
+        the values correspond to the estimate of the previous
+        iteration (to the extrapolated estimate when acceleration is
+        enabled).
         """
         if VERBOSE>9:
             print 'Entering %s.deconvolve' % (self.__class__.__name__)
@@ -302,11 +682,13 @@ class Deconvolve(FFTTasks):
 
         data_file_name = os.path.join(self.cache_dir, 'deconvolve_data.txt')
 
-        input_data = numpy.array(self.data, dtype=self.float_dtype)
+        input_data = self.get_data()
         count = -1
         append_data_file = False
         first_estimate = options.get(first_estimate='input image')
-        if first_estimate=='input image':
+        if estimate is not None:
+            estimate = numpy.array(estimate, dtype=self.float_dtype)
+        elif first_estimate=='input image':
             estimate = input_data.copy()
         elif first_estimate=='convolved input image':
             estimate = self.convolve(input_data)
@@ -319,14 +701,20 @@ class Deconvolve(FFTTasks):
                 data_file.close()
                 counts = map(int, data['count'])
                 for count in reversed (counts):
-                    fn =os.path.join(self.cache_dir, 'result_%s.tif' % (count))
-                    if os.path.isfile(fn):
-                        append_data_file = True
+                    for ext in ['.npy', '.tif']:
+                        fn =os.path.join(self.cache_dir, 'result_%s%s' % (count, ext))
+                        if os.path.isfile(fn):
+                            append_data_file = True
+                            break
+                    if append_data_file:
                         break
                 if append_data_file:
                     print 'Loading the last result from %r.' % (fn)
-                    stack = ImageStack.load(fn)
-                    estimate = numpy.array(stack.images, dtype=self.float_type)
+                    if ext=='.npy':
+                        estimate = numpy.array(numpy.load(fn, mmap_mode='r'), dtype=self.float_type)
+                    else:
+                        stack = ImageStack.load(fn)
+                        estimate = numpy.array(stack.images, dtype=self.float_type)
                     f = open(os.path.join(self.cache_dir, 'deconvolve_data_%s_%s.txt' % (counts[0],count)), 'w')
                     fi = open(data_file_name)
                     f.write(fi.read())
@@ -346,7 +734,9 @@ class Deconvolve(FFTTasks):
         else:
             raise NotImplementedError(`first_estimate`)
 
-        prev_estimate = estimate.copy()
+        # estimate history is stored as estimate/storage_scale, see store_data
+        prev_estimate = (estimate / self.storage_scale).astype(self.storage_dtype)
+        prev2_estimate = prev_estimate.copy()
         initial_photon_count = input_data.sum()
 
         print 'Initial photon count: %.3f' % (initial_photon_count)
@@ -358,6 +748,9 @@ class Deconvolve(FFTTasks):
         bar = ProgressBar(0, max_count, totalWidth=40, show_percentage=False)
 
         data_norm2 = (input_data**2).sum()
+        if input_data is not self.data:
+            # release float copy of half precision data
+            input_data = None
         if options.get(rltv_estimate_lambda=False) or options.get(rltv_compute_lambda_lsq=False):
             data_to_save += ('lambda_lsq',)
 
@@ -365,6 +758,10 @@ class Deconvolve(FFTTasks):
             data_to_save += ('mseo',)
             test_data_norm2 = (self.test_data**2).sum()
 
+        acceleration = options.get(rltv_acceleration=False)
+        if acceleration:
+            data_to_save += ('alpha', 'saved')
+
         data_file = RowFile(data_file_name,
                             titles = data_to_save,
                             append = append_data_file)
@@ -379,22 +776,45 @@ class Deconvolve(FFTTasks):
             stop_message = 'The number of iterations reached to maximal count: %s' % (max_count)
         else:
             if save_intermediate_results:
-                self.save(estimate, 'result_%sm1.tif' % (count+1))
+                self.save_result(estimate, '%sm1' % (count+1))
+        queue_size = options.get(save_queue_size=2)
+        if queue_size:
+            self.writer = CheckpointWriter(queue_size)
         try:
             min_mse = 1e300
             min_mseo = 1e300
             min_tau = 1e300
             max_lambda = 0.0
+            alpha = 0.0
+            saved = 0.0
+            step = prev_step = None
             while not stop:
                 count += 1
                 self.count = count
                 info_map = {}
                 ittime = time.time()
-                
-                prev2_estimate = prev_estimate.copy()
-                prev_estimate = estimate.copy()
+
+                if acceleration:
+                    if alpha:
+                        # Execute: estimate = prev + alpha * (prev - prev2), the predicted estimate
+                        estimate += (alpha * self.storage_scale) * numpy.subtract(prev_estimate, prev2_estimate,
+                                                                                  dtype=self.float_dtype)
+                        numpy.maximum(estimate, 0, estimate)
+                    step = estimate.copy()
   
                 e,s,u,n = self.compute_estimate(estimate)
+
+                if acceleration:
+                    # Biggs-Andrews acceleration: alpha is the
+                    # correlation of successive RL steps (here
+                    # step is negated RL step, the sign cancels out)
+                    step -= estimate
+                    if prev_step is not None:
+                        alpha = (step * prev_step).sum() / (prev_step * prev_step).sum()
+                        alpha = min(max(alpha, 0.0), max_acceleration_alpha)
+                    saved += alpha / (1.0 - alpha)
+                    prev_step = step
+                    info_map['ALPHA/SAVED=%s/%s'] = alpha, int(saved)
                 
                 info_map['E/S/U/N=%s/%s/%s/%s'] = int(e), int(s), int(u), int(n)
                 photon_leak = 1.0 - (e+s+u)/initial_photon_count
@@ -407,27 +827,38 @@ class Deconvolve(FFTTasks):
                     u_esu = u/(e+s+u)
                     #info_map['U/ESU=%s'] = u_esu
 
-                if 'mn' in data_to_save:
-                    mn, mx = estimate.min(), estimate.max()
-
-                if 'mse' in data_to_save:
+                # Execute: mn, mx, tau1, tau2 and prev2_estimate = prev_estimate, prev_estimate = estimate
+                mn, mx, tau1, tau2 = ops_ext.estimate_statistics_inplace(estimate, prev_estimate, prev2_estimate,
+                                                                    self.nthreads, self.storage_scale)
+                info_map['TAU1/2=%s/%s'] = (tau1, tau2)
+
+                if prev_estimate.dtype==numpy.float16 and mx > half_storage_max * self.storage_scale:
+                    # estimate is close to half precision overflow,
+                    # continue with float history, prev_estimate is
+                    # recovered from estimate as it may be saturated
+                    print 'Warning: estimate maximum %s is close to half precision overflow,'\
+                        ' storing estimate history in float type' % (mx)
+                    prev_estimate = estimate / self.storage_scale
+                    prev2_estimate = prev2_estimate.astype(self.float_dtype)
+
+                if self.model_statistics is not None:
+                    # statistics of the previous estimate that
+                    # compute_estimate obtained from its convolution
+                    se, kl, kl_count = self.model_statistics
+                    mse = se / data_norm2
+                    klic = kl / kl_count if kl_count else 0.0
+                else:
+                    data = input_data if input_data is not None else self.get_data()
                     eh = self.convolve(estimate, inplace=False)
-                    mse = ((eh - input_data)**2).sum() / data_norm2
-                    info_map['MSE=%s'] = mse
-
-                if 'klic' in data_to_save:
-                    klic = ops_ext.kullback_leibler_divergence(input_data, eh, 1.0)
-                    info_map['KLIC=%s'] = klic
+                    mse = ((eh - data)**2).sum() / data_norm2
+                    klic = ops_ext.kullback_leibler_divergence(data, eh, 1.0, self.nthreads)
+                info_map['MSE=%s'] = mse
+                info_map['KLIC=%s'] = klic
 
                 if 'mseo' in data_to_save:
                     mseo = ((estimate - self.test_data)**2).sum() / test_data_norm2
                     info_map['MSEO=%s'] = mseo
 
-                if 'tau1' in data_to_save:
-                    tau1 = abs(estimate - prev_estimate).sum() / abs(prev_estimate).sum()
-                    tau2 = abs(estimate - prev2_estimate).sum() / abs(prev2_estimate).sum()
-                    info_map['TAU1/2=%s/%s'] = (tau1, tau2)
-
                 if 'lambda_lsq' in data_to_save:
                     lambda_lsq = self.lambda_lsq
                     if lambda_lsq > max_lambda:
@@ -452,7 +883,7 @@ class Deconvolve(FFTTasks):
                     #self.save(discretize(estimate), 'deconvolved_%s_min_mseo.tif' % (count))
 
                 if save_intermediate_results:
-                    self.save(estimate, 'result_%s.tif' % (count))
+                    self.save_result(estimate, count)
 
                 # Stopping criteria:
                 stop = True
@@ -467,12 +898,16 @@ class Deconvolve(FFTTasks):
                 else:
                     stop = False
 
-                exec 'data_file.write(%s)' % (', '.join (data_to_save))
+                exec 'self.submit(data_file.write, %s)' % (', '.join (data_to_save))
                 if not save_intermediate_results and stop:
-                    self.save(estimate, 'result_%s.tif' % (count))
+                    self.save_result(estimate, count)
 
         except KeyboardInterrupt:
             stop_message = 'Iteration was interrupted by user.'
+        finally:
+            writer, self.writer = self.writer, None
+            if writer is not None:
+                writer.close()
 
         print
         bar.updateComment (' '+stop_message)
@@ -495,21 +930,37 @@ class DeconvolveRLPoisson (Deconvolve):
     def __init__(self, psf_images, stack_images, voxel_sizes, options):
         if VERBOSE>9:
             print 'Entering %s.__init__' % (self.__class__.__name__)
-        if psf_images is not None:
+        if psf_images is not None and not numpy.iscomplexobj(psf_images):
             assert psf_images.shape==stack_images.shape,`psf_images.shape, stack_images.shape`
 
         Deconvolve.__init__(self, stack_images.shape, options)
 
-        if psf_images is not None:
+        if psf_images is None:
+            pass
+        elif numpy.iscomplexobj(psf_images):
+            # Fourier transform of PSF, see get_prepared_psf
+            self.set_convolve_fourier_kernel(psf_images)
+        else:
             self.set_convolve_kernel(psf_images)
 
+        self.test_data = None
+        self.set_data(stack_images)
+        self.voxel_sizes = [s*1e9 for s in voxel_sizes]
+
+    def set_data(self, stack_images):
+        """Set stack images to be deconvolved.
+
+        The task can be reused for deconvolving another stack of
+        images with the same shape and PSF.
+        """
+        if VERBOSE>9:
+            print 'Entering %s.set_data' % (self.__class__.__name__)
+        assert stack_images.shape==self.shape,`stack_images.shape, self.shape`
         if stack_images.min() < 0:
             print 'Cutting negative values'
             stack_images = numpy.where (stack_images < 0, 0, stack_images)
-
-        self.test_data = None
-        self.data = stack_images.astype(self.float_dtype)
-        self.voxel_sizes = [s*1e9 for s in voxel_sizes]
+        self.store_data(stack_images)
+        self.lambda_ = self.options.get(rltv_lambda=0.0)
         self.lambda_lsq = None
         self.lambda_lsq_coeff = None
 
@@ -524,27 +975,29 @@ class DeconvolveRLPoisson (Deconvolve):
         options = self.options
         psf_f = self.convolve_kernel_fourier
         adj_psf_f = self.convolve_kernel_fourier_conj
-        cache = self._cache
+        cache = self._rcache
+        cache_f = self._cache
 
         # Execute: cache = convolve(PSF, estimate), non-normalized
         cache[:] = estimate
         self._fft_plan.execute()
-        cache *= psf_f
+        cache_f *= psf_f
         self._ifft_plan.execute()
 
-        # Execute: cache = data/cache
-        ops_ext.inverse_division_inplace(cache, self.data)
+        # Execute: cache = data/cache and compute statistics of convolve(PSF, estimate)
+        self.model_statistics = ops_ext.inverse_division_stats_inplace(cache, self.data, 1.0/mul_seq(cache.shape), 1.0,
+                                                                      self.nthreads, self.storage_scale)
 
         # Execute: cache = convolve(PSF(-), cache), inverse of non-normalized
         self._fft_plan.execute()
-        cache *= adj_psf_f
+        cache_f *= adj_psf_f
         self._ifft_plan.execute()
         # note that 1/mul_seq (cache.shape) factor cancels out
 
         dv_estimate = None
         if options.get(rltv_compute_lambda_lsq=False) or options.get(rltv_estimate_lambda=False):
-            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_sizes)
-            lambda_lsq = ((1.0-cache.real)*dv_estimate).sum() / (dv_estimate*dv_estimate).sum()
+            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_sizes, self.nthreads)
+            lambda_lsq = ((1.0-cache)*dv_estimate).sum() / (dv_estimate*dv_estimate).sum()
             if self.lambda_lsq_coeff is None:
                 lambda_lsq_coeff_path = os.path.join(self.cache_dir, 'lambda_lsq_coeff.txt')
                 lambda_lsq_coeff = options.get(rltv_lambda_lsq_coeff=0.0)
@@ -571,7 +1024,7 @@ class DeconvolveRLPoisson (Deconvolve):
             lambda_lsq *= lambda_lsq_coeff
             self.lambda_lsq = lambda_lsq
         elif self.lambda_:
-            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_sizes)
+            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_sizes, self.nthreads)
 
         if options.get(rltv_estimate_lambda=False):
             self.lambda_ = lambda_lsq
@@ -581,8 +1034,8 @@ class DeconvolveRLPoisson (Deconvolve):
         else: # TV is disabled
             pass
 
-        # Execute: estimate *= cache.real
-        result = ops_ext.update_estimate_poisson(estimate, cache, self.convergence_epsilon)
+        # Execute: estimate *= cache
+        result = ops_ext.update_estimate_poisson(estimate, cache, self.convergence_epsilon, self.nthreads)
         return result
 
 class DeconvolveRLGauss (Deconvolve):
@@ -596,28 +1049,48 @@ class DeconvolveRLGauss (Deconvolve):
     """
     def __init__(self, psf_images, stack_images, voxel_sizes, options):
 
-        if psf_images is not None:
+        if psf_images is not None and not numpy.iscomplexobj(psf_images):
             assert psf_images.shape==stack_images.shape,`psf_images.shape, stack_images.shape`
 
         Deconvolve.__init__(self, stack_images.shape, options)
 
-        if psf_images is not None:
+        if psf_images is None:
+            pass
+        elif numpy.iscomplexobj(psf_images):
+            # Fourier transform of PSF, see get_prepared_psf
+            self.set_convolve_fourier_kernel(psf_images)
+        else:
             self.set_convolve_kernel(psf_images)
 
-        self.data = stack_images.astype(self.float_dtype)
         self.voxel_sizes = [s*1e9 for s in voxel_sizes]
         self.alpha = float(options.get(rltv_alpha=1.0))
 
         psf_f = self.convolve_kernel_fourier
         adj_psf_f = self.convolve_kernel_fourier_conj
-        psf_adj_psf_f = self.psf_adj_psf_f = psf_f * adj_psf_f
+        self.psf_adj_psf_f = psf_f * adj_psf_f
+
+        self.test_data = None
+        self.set_data(stack_images)
 
-        cache = self._cache
-        cache[:] = self.data
+    def set_data(self, stack_images):
+        """Set stack images to be deconvolved.
+
+        See also
+        --------
+        DeconvolveRLPoisson.set_data
+        """
+        if VERBOSE>9:
+            print 'Entering %s.set_data' % (self.__class__.__name__)
+        assert stack_images.shape==self.shape,`stack_images.shape, self.shape`
+        self.store_data(stack_images)
+        self.lambda_ = self.options.get(rltv_lambda=0.0)
+        psf_adj_psf_f = self.psf_adj_psf_f
+        cache = self._rcache
+        cache[:] = self.get_data()
         self._fft_plan.execute()
-        cache *= psf_adj_psf_f
+        self._cache *= psf_adj_psf_f
         self._ifft_plan.execute()
-        self.psf_adj_data = cache.real / mul_seq(cache.shape)
+        self.psf_adj_data = cache / mul_seq(cache.shape)
 
     def get_suffix(self):
         if self.options.get(rltv_estimate_lambda=False):
@@ -625,31 +1098,31 @@ class DeconvolveRLGauss (Deconvolve):
         return '_deconvolved_add_l%s_a%s' % (self.lambda_, self.alpha)
 
     def compute_estimate(self, estimate):
-        cache = self._cache    
+        cache = self._rcache
         cache[:] = estimate
         # Execute: cache = convolve(estimate, convolve(PSF, PSF(-)))
         self._fft_plan.execute()
-        cache *= self.psf_adj_psf_f
+        self._cache *= self.psf_adj_psf_f
         self._ifft_plan.execute()
 
         # Execute: cache = convolve(PSF(-), data) - f * cache
-        ops_ext.inverse_subtraction_inplace(cache, self.psf_adj_data, 1.0/mul_seq (cache.shape))
+        ops_ext.inverse_subtraction_inplace(cache, self.psf_adj_data, 1.0/mul_seq (cache.shape), self.nthreads)
 
         # Regularization:
         if self.options.get(rltv_estimate_lambda=False):
-            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_ratios)
-            lambda_ = - (cache.real * dv_estimate).sum () / (dv_estimate*dv_estimate).sum()
+            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_ratios, self.nthreads)
+            lambda_ = - (cache * dv_estimate).sum () / (dv_estimate*dv_estimate).sum()
             lambda_ *= options.get(rltv_lambda_lsq_coeff=1.0)
             self.lambda_ = lambda_
             cache += (lambda_/self.alpha) * dv_estimate
         elif self.lambda_:
-            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_ratios)
+            dv_estimate = ops_ext.div_unit_grad(estimate, self.voxel_ratios, self.nthreads)
             cache += self.lambda_/self.alpha * dv_estimate
         else:
             pass
 
-        # Execute: estimate += alpha * cache.real
-        return ops_ext.update_estimate_gauss(estimate, cache, self.convergence_epsilon, self.alpha)
+        # Execute: estimate += alpha * cache
+        return ops_ext.update_estimate_gauss(estimate, cache, self.convergence_epsilon, self.alpha, self.nthreads)
 
 class DeconvolveRLPoissonSphere(DeconvolveRLPoisson):
     """
@@ -690,7 +1163,10 @@ def deconvolve(psf, stack, working_dir = None, data_type = None,
       See :ref:`iocbio-deconvolve` for information about options.
       The following options attributes are used: 
       float_type, apply_window, rltv_algorithm_type, degrade_data,
-      first_estimate, rltv_stop_tau, save_intermediate_results
+      first_estimate, rltv_stop_tau, save_intermediate_results,
+      intermediate_results_format, save_queue_size,
+      memory_budget, rltv_acceleration, psf_cache_size, psf_cache_dir,
+      time_lapse, half_precision_storage
 
     Returns
     -------
@@ -711,39 +1187,33 @@ def deconvolve(psf, stack, working_dir = None, data_type = None,
     if data_type is None:
         data_type = stack.images.dtype
 
+    if options.get(time_lapse=False) and stack.get_nof_stacks() > 1:
+        return deconvolve_time_lapse(psf, stack, working_dir, data_type=data_type, options=options)
+
     dtype = float2dtype(options.get(float_type='single'))
 
-    phf0, data = get_coherent_images(psf, stack, dtype)
+    memory_budget = options.get(memory_budget=None)
+    if memory_budget:
+        max_shape = [max(a,b) for a,b in zip(psf.images.shape, stack.images.shape)]
+        optimal_shape = tuple(map(FFTTasks.get_optimal_fft_size, max_shape))
+        memory = get_deconvolve_memory(optimal_shape, options.get(float_type='single'),
+                                       options.get(half_precision_storage=False))
+        if memory > memory_budget * 2**20:
+            print 'Estimated memory usage %s exceeds memory budget %s, using tiled deconvolution'\
+                % (bytes2str(memory), bytes2str(int(memory_budget * 2**20)))
+            return deconvolve_tiled(psf, stack, working_dir, data_type=data_type, options=options)
 
-    if options.get(apply_window=False):
-        background = (stack.pathinfo.get_background() or [0,0])[0]
-        voxel_sizes = stack.get_voxel_sizes()
-        smoothness = int(options.get(smoothness=1))
-        window_width = options.get(window_width=None)
-        if window_width is None:
-            dr = stack.get_lateral_resolution()
-            dz = stack.get_axial_resolution()
-            if dr is None or dz is None:
-                window_width = 3.0
-                scales = tuple([s/(window_width*min(voxel_sizes)) for s in voxel_sizes])
-            else:
-                print 'lateral resolution: %.3f um (%.1f x %.1f px^2)' % (1e6*dr, dr/voxel_sizes[1], dr/voxel_sizes[2])
-                print 'axial resolution: %.3f um (%.1fpx)' % (1e6*dz, dz / voxel_sizes[0])
-                vz,vy,vx = voxel_sizes
-                m = 0.3
-                scales = (m*vz/dz, m*vy/dr, m*vx/dr)
-        else:
-            scales = tuple([s/(window_width*min(voxel_sizes)) for s in voxel_sizes])
-        print 'Window size in pixels:', [1/s for s in scales]
-        from iocbio.ops.apply_window_ext import apply_window_inplace
-        apply_window_inplace(data, scales, smoothness, background)
+    phf0, data, psf_key = get_prepared_psf(psf, stack, dtype, options)
 
+    if options.get(apply_window=False):
+        apply_window_to_stack(data, stack, options)
 
     mode = options.get(rltv_algorithm_type='multiplicative').lower()
     Cls = dict(multiplicative=DeconvolveRLPoisson,
                additive = DeconvolveRLGauss)[mode]
 
     task = Cls(phf0, data, stack.get_voxel_sizes(), options)
+    save_prepared_psf(psf_key, task, options)
 
     task.set_cache_dir(working_dir)
     task.set_save_data(stack.pathinfo, data.shape, data_type)
@@ -758,6 +1228,395 @@ def deconvolve(psf, stack, working_dir = None, data_type = None,
     return ImageStack(estimate, stack.pathinfo, suffix=task.get_suffix(),
                       options = options)
 
+def apply_window_to_stack(data, stack, options):
+    """ Apply smooth window in-place to data of a stack as specified
+    by options.
+    """
+    scales, smoothness, background = get_window_parameters(stack, options)
+    from iocbio.ops.window import apply_window
+    apply_window(data, scales, smoothness, background, inplace=True)
+
+def get_window_parameters(stack, options):
+    """ Return scales, smoothness and background of smooth window
+    for a stack as specified by options.
+    """
+    background = (stack.pathinfo.get_background() or [0,0])[0]
+    voxel_sizes = stack.get_voxel_sizes()
+    smoothness = int(options.get(smoothness=1))
+    window_width = options.get(window_width=None)
+    if window_width is None:
+        dr = stack.get_lateral_resolution()
+        dz = stack.get_axial_resolution()
+        if dr is None or dz is None:
+            window_width = 3.0
+            scales = tuple([s/(window_width*min(voxel_sizes)) for s in voxel_sizes])
+        else:
+            print 'lateral resolution: %.3f um (%.1f x %.1f px^2)' % (1e6*dr, dr/voxel_sizes[1], dr/voxel_sizes[2])
+            print 'axial resolution: %.3f um (%.1fpx)' % (1e6*dz, dz / voxel_sizes[0])
+            vz,vy,vx = voxel_sizes
+            m = 0.3
+            scales = (m*vz/dz, m*vy/dr, m*vx/dr)
+    else:
+        scales = tuple([s/(window_width*min(voxel_sizes)) for s in voxel_sizes])
+    print 'Window size in pixels:', [1/s for s in scales]
+    return scales, smoothness, background
+
+def deconvolve_tiled(psf, stack, working_dir = None, data_type = None,
+                     options = None):
+    """Deconvolve stack of images against given PSF block by block.
+
+    The stack is split into overlapping blocks such that the
+    estimated memory usage of deconvolving a block does not exceed
+    ``options.memory_budget`` megabytes. The blocks overlap by the
+    PSF extent, all blocks share the same deconvolution task (and
+    hence the Fourier transform of PSF), and the result is stitched
+    together from the inner parts of block estimates (overlap-save
+    method).
+
+    Parameters
+    ----------
+    psf : `iocbio.io.image_stack.ImageStack`
+      PSF
+    stack : `iocbio.io.image_stack.ImageStack`
+      Scanned images.
+    working_dir : {None, str}
+      Directory name where to save intermediate results. The results
+      of blocks are saved to ``working_dir/tile<index>`` directories.
+    data_type : {None, str}
+      Desired data type of deconvolution estimate to be returned.
+    options : {None, `iocbio.utils.Options`}
+      See `deconvolve`. In addition, ``options.memory_budget``
+      specifies the memory budget in megabytes.
+
+    Returns
+    -------
+    estimate : `iocbio.io.image_stack.ImageStack`
+      The images of estimate are memory mapped to
+      ``working_dir/result.npy`` file.
+
+    Notes
+    -----
+    Only one block of data is converted to floating point type at a
+    time and the result is written to a memory mapped file, so that
+    the memory usage (in addition to the stack images) is bounded by
+    the memory budget.
+
+    Away from the stack boundaries, the result of tiled deconvolution
+    matches the result of whole-volume deconvolution with the same
+    number of iterations: the relative maximum error is about 1e-4
+    after one iteration and grows slowly with the number of
+    iterations (about 5e-3 after 20 iterations) because the region
+    of influence of a voxel grows by the PSF extent in every
+    iteration. Near the stack boundaries the results differ when
+    whole-volume deconvolution treats the stack as periodic while
+    the boundary blocks are padded with background. A PSF with a
+    large background level also increases the error, because the
+    margins cover only the PSF extent. Each block is tested for
+    stopping criteria separately, so use fixed number of iterations
+    to reproduce the whole-volume run.
+
+    See also
+    --------
+    deconvolve, get_tiles
+    """
+    if VERBOSE>9:
+        print 'Entering %s.deconvolve_tiled' % (__file__)
+    options = Options(options)
+    if working_dir is None:
+        import tempfile
+        working_dir = tempfile.mkdtemp('-iocbio.deconvolve')
+
+    if data_type is None:
+        data_type = stack.images.dtype
+
+    float_type = options.get(float_type='single')
+    dtype = float2dtype(float_type)
+    memory_budget = options.get(memory_budget=None)
+
+    shape = stack.images.shape
+    if options.get(apply_window=False):
+        from iocbio.ops.window import get_window_profiles, apply_window_profiles
+        scales, smoothness, background = get_window_parameters(stack, options)
+        window_profiles = get_window_profiles(shape, scales, smoothness)
+    else:
+        window_profiles = None
+
+    margins = get_psf_margins(psf, stack)
+    max_voxels = int(memory_budget * 2**20 // get_deconvolve_memory((1,), float_type,
+                                                                     options.get(half_precision_storage=False)))
+    block_shape = get_tile_shape(shape, margins, max_voxels)
+    tiles = get_tiles(shape, block_shape, margins)
+    print 'Deconvolving %s blocks of shape %s with margins %s' % (len(tiles), block_shape, margins)
+
+    mode = options.get(rltv_algorithm_type='multiplicative').lower()
+    Cls = dict(multiplicative=DeconvolveRLPoisson,
+               additive = DeconvolveRLGauss)[mode]
+
+    if not os.path.isdir(working_dir):
+        os.makedirs(working_dir)
+    result = numpy.lib.format.open_memmap(os.path.join(working_dir, 'result.npy'), mode='w+',
+                                          dtype=data_type, shape=shape)
+    task = None
+    for index, (block, core, inner) in enumerate(tiles):
+        tile_images = stack.images[block].astype(dtype)
+        if window_profiles is not None:
+            # window of the whole stack restricted to the block
+            apply_window_profiles(tile_images, tuple([p[s] for p, s in zip(window_profiles, block)]),
+                                  float(background))
+        print 'Block %s/%s: %s' % (index+1, len(tiles), ', '.join(['%s:%s' % (s.start, s.stop) for s in block]))
+        if task is None:
+            # all blocks share the same task, PSF and its Fourier transform
+            blank = ImageStack(numpy.zeros(block_shape, dtype), stack.pathinfo, options=options)
+            phf0, data, psf_key = get_prepared_psf(psf, blank, dtype, options)
+            task = Cls(phf0, data, stack.get_voxel_sizes(), options)
+            save_prepared_psf(psf_key, task, options)
+        data = expand_to_shape(tile_images, task.shape, dtype)
+        task.set_data(data)
+        task.set_cache_dir(os.path.join(working_dir, 'tile%03d' % (index)))
+        task.set_save_data(stack.pathinfo, data.shape, data_type)
+        task.set_test_data()
+        estimate = task.deconvolve()
+        # offsets of tile images within expanded data, see expand_to_shape
+        offsets = [(s1-s2+1)//2 for s1, s2 in zip(task.shape, tile_images.shape)]
+        result[core] = estimate[tuple([slice(o+i.start, o+i.stop) for o, i in zip(offsets, inner)])]
+    result.flush()
+
+    return ImageStack(result, stack.pathinfo, suffix=task.get_suffix(),
+                      options = options)
+
+def deconvolve_time_lapse(psf, stack, working_dir = None, data_type = None,
+                          options = None):
+    """Deconvolve a time-lapse sequence of stacks against given PSF.
+
+    The stack images contain ``stack.get_nof_stacks()`` stacks of
+    equal size. All stacks are deconvolved with the same
+    deconvolution task (and hence the same FFT plans and Fourier
+    transform of PSF). The first stack is deconvolved starting from
+    ``options.first_estimate``, the subsequent stacks start from the
+    estimate of the previous stack so that for slowly changing
+    samples much fewer iterations are required for convergence.
+    The data of the next stack is prepared in a background thread
+    while the current stack is deconvolved.
+
+    Parameters
+    ----------
+    psf : `iocbio.io.image_stack.ImageStack`
+      PSF
+    stack : `iocbio.io.image_stack.ImageStack`
+      Scanned images of a time-lapse acquisition.
+    working_dir : {None, str}
+      Directory name where to save intermediate results. The results
+      of stacks are saved to ``working_dir/stack<index>`` directories.
+    data_type : {None, str}
+      Desired data type of deconvolution estimate to be returned.
+    options : {None, `iocbio.utils.Options`}
+      See `deconvolve`.
+
+    Returns
+    -------
+    estimate : `iocbio.io.image_stack.ImageStack`
+      Deconvolved stacks in the layout of input stack images.
+
+    See also
+    --------
+    deconvolve
+    """
+    if VERBOSE>9:
+        print 'Entering %s.deconvolve_time_lapse' % (__file__)
+    options = Options(options)
+    if working_dir is None:
+        import tempfile
+        working_dir = tempfile.mkdtemp('-iocbio.deconvolve')
+
+    if data_type is None:
+        data_type = stack.images.dtype
+
+    dtype = float2dtype(options.get(float_type='single'))
+    nof_stacks = stack.get_nof_stacks()
+    images = stack.images
+    stack_shape = (images.shape[0]//nof_stacks,) + images.shape[1:]
+    images = images.reshape((nof_stacks,) + stack_shape)
+
+    mode = options.get(rltv_algorithm_type='multiplicative').lower()
+    Cls = dict(multiplicative=DeconvolveRLPoisson,
+               additive = DeconvolveRLGauss)[mode]
+
+    def get_stack(index):
+        return ImageStack(images[index], stack.pathinfo, options=options)
+
+    def prepare_data(index, shape, result):
+        # result receives (data, None) or (None, exc_info), the
+        # exception is re-raised in the main thread
+        try:
+            frame = get_stack(index)
+            data = expand_to_shape(frame.images, shape, dtype)
+            if options.get(apply_window=False):
+                apply_window_to_stack(data, frame, options)
+        except Exception:
+            result.append((None, sys.exc_info()))
+            return
+        result.append((data, None))
+
+    frame = get_stack(0)
+    phf0, data, psf_key = get_prepared_psf(psf, frame, dtype, options)
+    if options.get(apply_window=False):
+        apply_window_to_stack(data, frame, options)
+    task = Cls(phf0, data, stack.get_voxel_sizes(), options)
+    save_prepared_psf(psf_key, task, options)
+
+    result = numpy.zeros(images.shape, dtype=data_type)
+    estimate = None
+    for index in range(nof_stacks):
+        print 'Stack %s/%s' % (index+1, nof_stacks)
+        if index:
+            prefetch.join()
+            data, exc_info = next_data[0]
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            task.set_data(data)
+        if index + 1 < nof_stacks:
+            next_data = []
+            prefetch = Thread(target=prepare_data, args=(index+1, task.shape, next_data))
+            prefetch.start()
+        task.set_cache_dir(os.path.join(working_dir, 'stack%03d' % (index)))
+        task.set_save_data(stack.pathinfo, task.shape, data_type)
+        task.set_test_data()
+        estimate = task.deconvolve(estimate)
+        result[index] = contract_to_shape(estimate, stack_shape, data_type)
+
+    return ImageStack(result.reshape(stack.images.shape), stack.pathinfo, suffix=task.get_suffix(),
+                      options = options)
+
+# Deconvolution tasks that are kept in a batch worker process,
+# see deconvolve_batch.
+_batch_tasks = []    # list of (key, task), most recently used last
+batch_nof_cached_tasks = 4
+
+def deconvolve_batch(jobs, options = None):
+    """Deconvolve many stacks of images.
+
+    Jobs are sorted by PSF and distributed over a pool of
+    ``options.batch_nof_workers`` worker processes, each using
+    ``options.fftw_threads`` threads for FFT. A worker keeps the
+    deconvolution tasks (FFTW plans and the Fourier transform of
+    PSF) of recent jobs and reuses them for subsequent jobs that
+    have the same PSF and the same padded shape, orientation and
+    voxel sizes of stack images.
+
+    Parameters
+    ----------
+    jobs : list
+      List of ``(psf_path, input_path, output_path, working_dir)``
+      tuples. When ``output_path`` is None then the result is saved
+      next to ``input_path`` with a suffix. When ``working_dir`` is
+      None then a temporary directory will be created.
+    options : {None, `iocbio.utils.Options`}
+      See `deconvolve`. In addition, ``options.batch_nof_workers``
+      specifies the number of worker processes.
+
+    Returns
+    -------
+    output_paths : list
+      Paths of saved results in the order of jobs.
+
+    See also
+    --------
+    deconvolve
+    """
+    if VERBOSE>9:
+        print 'Entering %s.deconvolve_batch' % (__file__)
+    options = Options(options)
+    nof_workers = options.get(batch_nof_workers=1)
+    indices = sorted(range(len(jobs)), key=lambda i: (jobs[i][0], i))
+    args = [tuple(jobs[i]) + (options,) for i in indices]
+    if nof_workers <= 1 or len(args) <= 1:
+        results = map(_deconvolve_batch_job, args)
+    else:
+        import multiprocessing
+        print 'Deconvolving %s stacks using %s workers' % (len(args), nof_workers)
+        pool = multiprocessing.Pool(nof_workers)
+        try:
+            # jobs with the same PSF are sent to workers in chunks
+            chunksize = max(1, len(args) // (2*nof_workers))
+            results = pool.map(_deconvolve_batch_job, args, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    output_paths = [None] * len(jobs)
+    for i, output_path in zip(indices, results):
+        output_paths[i] = output_path
+    return output_paths
+
+def _deconvolve_batch_job(args):
+    """ Deconvolve a job of `deconvolve_batch` and return the path of
+    saved result.
+    """
+    psf_path, input_path, output_path, working_dir, options = args
+    if working_dir is None:
+        import tempfile
+        working_dir = tempfile.mkdtemp('-iocbio.deconvolve')
+    stack = ImageStack.load(input_path, options=options)
+    data_type = stack.images.dtype
+    float_type = options.get(float_type='single')
+    dtype = float2dtype(float_type)
+    mode = options.get(rltv_algorithm_type='multiplicative').lower()
+
+    key = (psf_path, stack.images.shape, tuple(stack.get_voxel_sizes()),
+           stack.get_rotation_angle() or 0, float_type, mode)
+    task = None
+    for i in range(len(_batch_tasks)):
+        if _batch_tasks[i][0]==key:
+            task = _batch_tasks.pop(i)[1]
+            break
+    if task is None:
+        psf = ImageStack.load(psf_path, options=options)
+        memory_budget = options.get(memory_budget=None)
+        if memory_budget:
+            max_shape = [max(a,b) for a,b in zip(psf.images.shape, stack.images.shape)]
+            optimal_shape = tuple(map(FFTTasks.get_optimal_fft_size, max_shape))
+            if get_deconvolve_memory(optimal_shape, float_type,
+                                    options.get(half_precision_storage=False)) > memory_budget * 2**20:
+                result = deconvolve(psf, stack, working_dir, options=options)
+                return _save_batch_result(result, input_path, output_path)
+        phf0, data, psf_key = get_prepared_psf(psf, stack, dtype, options)
+    else:
+        print 'Reusing deconvolution task of shape %s' % (task.shape,)
+        data = expand_to_shape(stack.images, task.shape, dtype)
+
+    if options.get(apply_window=False):
+        apply_window_to_stack(data, stack, options)
+
+    if task is None:
+        Cls = dict(multiplicative=DeconvolveRLPoisson,
+                   additive = DeconvolveRLGauss)[mode]
+        task = Cls(phf0, data, stack.get_voxel_sizes(), options)
+        save_prepared_psf(psf_key, task, options)
+    else:
+        task.set_data(data)
+    # evict least recently used tasks
+    _batch_tasks.append((key, task))
+    while len(_batch_tasks) > batch_nof_cached_tasks:
+        del _batch_tasks[0]
+
+    task.set_cache_dir(working_dir)
+    task.set_save_data(stack.pathinfo, data.shape, data_type)
+    task.set_test_data()
+
+    estimate = task.deconvolve()
+
+    estimate = contract_to_shape(estimate, stack.images.shape, data_type)
+    result = ImageStack(estimate, stack.pathinfo, suffix=task.get_suffix(),
+                        options = options)
+    return _save_batch_result(result, input_path, output_path)
+
+def _save_batch_result(result, input_path, output_path):
+    if output_path is None:
+        b,e = os.path.splitext(input_path)
+        output_path = b + result.pathinfo.suffix + (e or '.tif')
+    print 'Saving result to %r' % (output_path)
+    result.save(output_path)
+    return output_path
+
 def deconvolve_sphere(psf, diameter, deconvolve_dir,
                       data_type = None,
                       options = None,
@@ -812,13 +1671,14 @@ def deconvolve_smooth(psf, stack, deconvolve_dir,
 
     dtype = float2dtype(options.get(float_type='single'))
 
-    phf0, data = get_coherent_images(psf, stack, dtype)
+    phf0, data, psf_key = get_prepared_psf(psf, stack, dtype, options)
 
     task = DeconvolveRLPoisson(phf0, data, stack.get_voxel_sizes(), options)
+    save_prepared_psf(psf_key, task, options)
     task.set_cache_dir (os.path.join(deconvolve_dir,'iocbio.deconvolve_smooth'))
 
     orig_data = data
-    task.data = task.convolve(data)
+    task.store_data(task.convolve(data))
 
     estimate = task.deconvolve()
 
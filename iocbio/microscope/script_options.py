@@ -4,6 +4,7 @@ from iocbio.script_options import set_formatter
 
 __all__ = ['add_psflib_options', 'set_estimate_psf_options',
            'set_deconvolve_options','get_rltv_options_group',
+           'get_batch_options_group',
            'set_deconvolve_with_sphere_options']
 
 def set_clusters_options (parser):
@@ -146,9 +147,45 @@ def set_deconvolve_options(parser):
                       dest = 'save_intermediate_results',
                       action = 'store_false',
                       help = 'See ``--save-intermediate-results`` option.')
+    parser.add_option('--intermediate-results-format',
+                      choices = ['tif', 'npy'], default='tif',
+                      help = 'Specify file format of intermediate results. Use npy for fast saving '\
+                          'and resuming with --first-estimate="last result".')
+    parser.add_option('--save-queue-size',
+                      type = 'int', default=2, metavar='INT',
+                      help = 'Specify the maximal number of pending intermediate results that are '\
+                          'saved in background while iterating. If set to 0, results are saved synchronously.')
+    parser.add_option('--memory-budget',
+                      type = 'float', metavar='MB',
+                      help = 'Specify memory budget in megabytes. When deconvolution of the whole '\
+                          'stack would exceed the budget, the stack is deconvolved in overlapping blocks.')
+    parser.add_option('--time-lapse', dest='time_lapse',
+                      action = 'store_true',
+                      help = 'Deconvolve the stacks of a time-lapse acquisition one by one, '\
+                          'starting each stack from the result of the previous stack.')
+    parser.add_option('--no-time-lapse', dest='time_lapse',
+                      action = 'store_false',
+                      help = 'See ``--time-lapse`` option.')
+    parser.add_option('--half-precision-storage', dest='half_precision_storage',
+                      action = 'store_true',
+                      help = 'Store input data and previous estimates in half precision to reduce memory usage. '\
+                          'The accuracy of stored data is reported.')
+    parser.add_option('--no-half-precision-storage', dest='half_precision_storage',
+                      action = 'store_false',
+                      help = 'See ``--half-precision-storage`` option.')
+    parser.add_option('--psf-cache-size',
+                      type = 'float', default=256, metavar='MB',
+                      help = 'Specify the size of the cache of prepared PSF Fourier transforms in megabytes. '\
+                          'The cache is kept in --psf-cache-dir directory and reused when deconvolving stacks '\
+                          'with the same PSF and geometry. If set to 0, the cache is disabled.')
+    parser.add_option('--psf-cache-dir',
+                      type = 'directory', metavar='DIR',
+                      help = 'Specify directory of the cache of prepared PSF Fourier transforms. '\
+                          'Default is $IOCBIO_PSF_CACHE_DIR or .iocbio/deconvolve in the current directory.')
     from ..ops.script_options import get_apply_window_options_group
     parser.add_option_group(get_apply_window_options_group (parser))
     parser.add_option_group(get_rltv_options_group (parser))
+    parser.add_option_group(get_batch_options_group (parser))
     from ..ops.script_options import get_fft_options_group
     parser.add_option_group(get_fft_options_group (parser))
     from ..script_options import get_runner_options_group
@@ -182,11 +219,32 @@ Specify options for Richardson-Lucy deconvolution algorithm with total variation
     group.add_option ('--rltv-alpha',
                       type = 'float',
                       help = 'Specify additive RLTV regularization parameter.')
+    group.add_option ('--rltv-acceleration', dest='rltv_acceleration',
+                      action='store_true',
+                      help = 'Enable Biggs-Andrews acceleration of iterations.')
+    group.add_option ('--no-rltv-acceleration',
+                      dest='rltv_acceleration', action='store_false',
+                      help = 'See ``--rltv-acceleration`` option.')
     group.add_option ('--rltv-stop-tau',
                       type = 'float',
                       help = 'Specify parameter for tau-stopping criteria.')
     return group
 
+def get_batch_options_group(parser):
+    group = OptionGroup (parser, 'Batch deconvolution options',
+                         description = '''\
+Specify options for deconvolving many stacks of images. Deconvolution
+tasks are reused for stacks with the same PSF and shape.''')
+    group.add_option ('--batch-path',
+                      type = 'file', metavar='PATH',
+                      help = 'Specify PATH to a text file that contains one job per line: '\
+                          'PSF_PATH INPUT_PATH [OUTPUT_PATH]. Use - as PSF_PATH to use --psf-path|--psf-lib. '\
+                          'Lines starting with # are ignored.')
+    group.add_option ('--batch-nof-workers',
+                      type = 'int', default=1,
+                      help = 'Specify the number of worker processes. Each worker uses --fftw-threads threads.')
+    return group
+
 def set_deconvolve_with_sphere_options (parser):
     set_formatter(parser)
     parser.set_usage('%prog [options] [ [-i] INPUT_PATH [ [-o] OUTPUT_PATH ] ]')
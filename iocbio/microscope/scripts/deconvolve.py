@@ -9,7 +9,7 @@ import os
 ### END UPDATE SYS.PATH ###
 
 from iocbio.optparse_gui import OptionParser
-from iocbio.microscope.deconvolution import deconvolve
+from iocbio.microscope.deconvolution import deconvolve, deconvolve_batch
 from iocbio.io import ImageStack
 from iocbio.io.io import fix_path, get_psf_path
 from iocbio.microscope.script_options import set_deconvolve_options
@@ -23,6 +23,9 @@ def runner (parser, options, args):
         options.input_path = None
         options.output_path = None
 
+    if getattr(options, 'batch_path', None):
+        return batch_runner(parser, options, args)
+
     if args:
         if len(args) in [2,3]:
             if options.psf_path:
@@ -60,6 +63,37 @@ def runner (parser, options, args):
         print 'Saving result to %r' % (options.output_path)
     deconvolved_image.save(options.output_path)
 
+def batch_runner (parser, options, args):
+    if args:
+        parser.error("Positional arguments are not supported with --batch-path (got %r)" % ((args)))
+
+    jobs = []
+    f = open(options.batch_path)
+    for line in f.readlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        items = line.split()
+        if len(items) not in [2,3]:
+            parser.error("Incorrect number of items in batch line %r (expected 2 or 3)" % (line))
+        psf_path, input_path = items[:2]
+        if psf_path=='-':
+            psf_path = get_psf_path(options)
+        else:
+            psf_path = fix_path(psf_path)
+        input_path = fix_path(input_path)
+        if len(items)==3:
+            output_path = fix_path(items[2])
+            deconvolve_dir = get_path_dir(output_path, 'iocbio.deconvolve')
+        else:
+            output_path = None
+            deconvolve_dir = get_path_dir(input_path, 'iocbio.deconvolve')
+        jobs.append((psf_path, input_path, output_path, deconvolve_dir))
+    f.close()
+
+    for output_path in deconvolve_batch(jobs, options=options):
+        print 'Saved result to %r' % (output_path)
+
 def get_path_dir(path, suffix):
     """ Return a directory name with suffix that will be used to save data
     related to given path.
@@ -1,8 +1,16 @@
-
 from os.path import join
 
 def configuration(parent_package='',top_path=None):
-    from numpy.distutils.misc_util import Configuration
+    from numpy.distutils.misc_util import Configuration, get_info
     config = Configuration('microscope',parent_package,top_path)
-    config.add_extension('ops_ext', join('src','ops_ext.c'))
+    from iocbio.setup import get_openmp_args
+    # Element-wise kernels are parallelized with OpenMP when the
+    # compiler supports it, set IOCBIO_NO_OPENMP environment variable
+    # to disable.
+    openmp_args = get_openmp_args()
+    config.add_extension('ops_ext', join('src','ops_ext.c'),
+                         extra_compile_args = openmp_args,
+                         extra_link_args = openmp_args,
+                         # npymath provides half precision conversions
+                         extra_info = get_info('npymath'))
     return config
@@ -3,6 +3,12 @@
 #include <Python.h>
 #define PY_ARRAY_UNIQUE_SYMBOL PyArray_API
 #include "numpy/arrayobject.h"
+#include "numpy/halffloat.h"
+#include <stdlib.h>
+
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
 #include <math.h>
 
@@ -23,137 +29,142 @@ void sincos(double x, double *sn, double *cs)
 #define PyMODINIT_FUNC void
 #endif
 
-static PyObject *update_estimate_poisson(PyObject *self, PyObject *args)
+/*
+  Element-wise kernels process arrays in chunks of CHUNK_SIZE items
+  that are distributed over nthreads threads while the GIL is
+  released. Sums are accumulated per chunk and chunk sums are
+  combined in chunk order so that the results do not depend on the
+  number of threads.
+ */
+#define CHUNK_SIZE 32768
+
+typedef void (*chunk_func)(void* args, npy_intp start, npy_intp end, double* sums);
+typedef void (*combine_func)(double* sums, const double* chunk_sums, int nsums, npy_intp ch);
+
+static void combine_sum(double* sums, const double* chunk_sums, int nsums, npy_intp ch)
 {
-  PyObject* a = NULL;
-  PyObject* b = NULL;
-  npy_intp sz = 0, i;
-  double tmp, tmp2;
-  npy_float32* a_data_sp = NULL;
-  npy_float32* b_data_sp = NULL;
-  npy_complex64* b_data_csp = NULL;
-  npy_float64* a_data_dp = NULL;
-  npy_float64* b_data_dp = NULL;
-  npy_complex128* b_data_cdp = NULL;
-  double c, c0, c1, c2;
-  double unstable = 0.0, stable = 0.0, negative = 0.0, exact = 0.0;
-  if (!PyArg_ParseTuple(args, "OOd", &a, &b, &c))
-    return NULL;
-  if (c<0 || c>0.5)
-    {
-      PyErr_SetString(PyExc_TypeError,"third argument must be non-negative and less than 0.5");
-      return NULL;
-    }
-  if (!(PyArray_Check(a) && PyArray_Check(b)))
-    {
-      PyErr_SetString(PyExc_TypeError,"first two arguments must be array objects");
-      return NULL;
-    }
-  sz = PyArray_SIZE(a);
-  if (sz != PyArray_SIZE(b))
-    {
-      PyErr_SetString(PyExc_TypeError,"array argument sizes must be equal");
-      return NULL;
-    }
-  c0 = -c;
-  c1 = 1.0+c;
-  c2 = 1.0-c;
-  if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
-    {
-      a_data_sp = (npy_float32*)PyArray_DATA(a);
-      b_data_sp = (npy_float32*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = b_data_sp[i];
-	  tmp2 = (a_data_sp[i] *= (tmp>0?tmp:0.0));
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
-  else if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_COMPLEX64))
-    {
-      a_data_sp = (npy_float32*)PyArray_DATA(a);
-      b_data_csp = (npy_complex64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = b_data_csp[i].real;
-	  tmp2 = (a_data_sp[i] *= (tmp>0?tmp:0.0));
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
-  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT64))
-    {
-      a_data_dp = (npy_float64*)PyArray_DATA(a);
-      b_data_dp = (npy_float64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = b_data_dp[i];
-	  tmp2 = (a_data_dp[i] *= (tmp>0?tmp:0.0));
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
-  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_COMPLEX128))
+  int k;
+  for (k=0; k<nsums; ++k)
+    sums[k] += chunk_sums[k];
+}
+
+static int run_chunks(chunk_func func, void* args, npy_intp sz, double* sums, int nsums, combine_func combine, int nthreads)
+{
+  npy_intp nchunks = (sz + CHUNK_SIZE - 1) / CHUNK_SIZE;
+  npy_intp ch;
+  double* partial = NULL;
+  if (nthreads<1)
+    nthreads = 1;
+  if (nsums>0 && nchunks>0)
     {
-      a_data_dp = (npy_float64*)PyArray_DATA(a);
-      b_data_cdp = (npy_complex128*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = (b_data_cdp[i]).real;
-	  tmp2 = (a_data_dp[i] *= (tmp>0?tmp:0.0));
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
+      partial = (double*)malloc(nchunks*nsums*sizeof(double));
+      if (partial==NULL)
+	return -1;
     }
-  else
+  Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static) num_threads(nthreads) if(nthreads>1 && nchunks>1)
+#endif
+  for (ch=0; ch<nchunks; ++ch)
+    func(args, ch*CHUNK_SIZE, (ch+1<nchunks?(ch+1)*CHUNK_SIZE:sz), (partial==NULL?NULL:partial+ch*nsums));
+  Py_END_ALLOW_THREADS
+  if (partial!=NULL)
     {
-      PyErr_SetString(PyExc_TypeError,"array argument types must be either float32 or float64");
-      return NULL;
+      for (ch=0; ch<nchunks; ++ch)
+	(combine==NULL?combine_sum:combine)(sums, partial+ch*nsums, nsums, ch);
+      free(partial);
     }
-  return Py_BuildValue("dddd", exact, stable, unstable, negative);
+  return 0;
 }
 
-static PyObject *update_estimate_gauss(PyObject *self, PyObject *args)
+#define REAL_VALUE(x) (x)
+#define COMPLEX_REAL(x) ((x).real)
+
+/* Half precision storage: conversions to double and from double
+   with saturation to the largest finite half value */
+#define HALF_MAX 65504.0
+#define HALF_VALUE(x) npy_half_to_double(x)
+#define HALF_STORE(x) npy_double_to_half((x)<HALF_MAX?(x):HALF_MAX)
+
+typedef struct
+{
+  void* a;
+  void* b;
+  double c, c0, c1, c2, alpha;
+} update_estimate_args;
+
+/* Execute a *= b, count exact, stable, unstable and negative photons */
+#define POISSON_UPDATE(A, B) \
+  tmp = (B); \
+  tmp2 = (A *= (tmp>0?tmp:0.0));
+
+/* Execute a += alpha * b, count exact, stable, unstable and negative photons */
+#define GAUSS_UPDATE(A, B) \
+  tmp = (A); \
+  tmp2 = (A += alpha * (B)); \
+  if (tmp==0.0) \
+    tmp = 2.0; /* force unstable */ \
+  else \
+    tmp = (A) / tmp;
+
+#define DEFINE_UPDATE_ESTIMATE_CHUNK(NAME, ATYPE, BTYPE, BVALUE, UPDATE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  update_estimate_args* args = (update_estimate_args*)args_; \
+  ATYPE* a_data = (ATYPE*)args->a; \
+  BTYPE* b_data = (BTYPE*)args->b; \
+  double c = args->c, c0 = args->c0, c1 = args->c1, c2 = args->c2, alpha = args->alpha; \
+  double tmp, tmp2; \
+  double exact = 0.0, stable = 0.0, unstable = 0.0, negative = 0.0; \
+  npy_intp i; \
+  (void)alpha; \
+  for (i=start; i<end; ++i) \
+    { \
+      UPDATE(a_data[i], BVALUE(b_data[i])) \
+      if (tmp==0.0 || tmp==1.0) \
+	exact += tmp2; \
+      else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2))) \
+	stable += tmp2; \
+      else \
+	unstable += tmp2; \
+      if (tmp2<0) \
+	negative += tmp2; \
+    } \
+  sums[0] = exact; \
+  sums[1] = stable; \
+  sums[2] = unstable; \
+  sums[3] = negative; \
+}
+
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_poisson_sp, npy_float32, npy_float32, REAL_VALUE, POISSON_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_poisson_csp, npy_float32, npy_complex64, COMPLEX_REAL, POISSON_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_poisson_dp, npy_float64, npy_float64, REAL_VALUE, POISSON_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_poisson_cdp, npy_float64, npy_complex128, COMPLEX_REAL, POISSON_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_gauss_sp, npy_float32, npy_float32, REAL_VALUE, GAUSS_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_gauss_csp, npy_float32, npy_complex64, COMPLEX_REAL, GAUSS_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_gauss_dp, npy_float64, npy_float64, REAL_VALUE, GAUSS_UPDATE)
+DEFINE_UPDATE_ESTIMATE_CHUNK(update_estimate_gauss_cdp, npy_float64, npy_complex128, COMPLEX_REAL, GAUSS_UPDATE)
+
+static PyObject *update_estimate(PyObject *args, int gauss)
 {
   PyObject* a = NULL;
   PyObject* b = NULL;
-  npy_intp sz = 0, i;
-  double tmp, tmp2;
-  npy_float32* a_data_sp = NULL;
-  npy_float32* b_data_sp = NULL;
-  npy_complex64* b_data_csp = NULL;
-  npy_float64* a_data_dp = NULL;
-  npy_float64* b_data_dp = NULL;
-  npy_complex128* b_data_cdp = NULL;
-  double c, c0, c1, c2, alpha;
-  double unstable = 0.0, stable = 0.0, negative=0.0, exact=0.0;
-  if (!PyArg_ParseTuple(args, "OOdd", &a, &b, &c, &alpha))
-    return NULL;
+  npy_intp sz = 0;
+  int nthreads = 1;
+  double c, alpha = 0.0;
+  double sums[4] = {0.0, 0.0, 0.0, 0.0};
+  update_estimate_args fargs;
+  chunk_func func = NULL;
+  if (gauss)
+    {
+      if (!PyArg_ParseTuple(args, "OOdd|i", &a, &b, &c, &alpha, &nthreads))
+	return NULL;
+    }
+  else
+    {
+      if (!PyArg_ParseTuple(args, "OOd|i", &a, &b, &c, &nthreads))
+	return NULL;
+    }
   if (c<0 || c>0.5)
     {
       PyErr_SetString(PyExc_TypeError,"third argument must be non-negative and less than 0.5");
@@ -170,103 +181,44 @@ static PyObject *update_estimate_gauss(PyObject *self, PyObject *args)
       PyErr_SetString(PyExc_TypeError,"array argument sizes must be equal");
       return NULL;
     }
-  c0 = -c;
-  c1 = 1.0+c;
-  c2 = 1.0-c;
-  if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+  if (!(PyArray_ISCONTIGUOUS(a) && PyArray_ISCONTIGUOUS(b)))
     {
-      a_data_sp = (npy_float32*)PyArray_DATA(a);
-      b_data_sp = (npy_float32*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = a_data_sp[i];
-	  tmp2 = (a_data_sp[i] += alpha * b_data_sp[i]);
-	  if (tmp==0.0)
-	    tmp = 2.0; // force unstable
-	  else
-	    tmp = a_data_sp[i] / tmp;
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
+      PyErr_SetString(PyExc_TypeError,"array arguments must be contiguous");
+      return NULL;
     }
+  if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+    func = (gauss?update_estimate_gauss_sp:update_estimate_poisson_sp);
   else if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_COMPLEX64))
-    {
-      a_data_sp = (npy_float32*)PyArray_DATA(a);
-      b_data_csp = (npy_complex64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = a_data_sp[i];
-	  tmp2 = (a_data_sp[i] += alpha * b_data_csp[i].real);
-	  if (tmp==0.0)
-	    tmp = 2.0; // force unstable
-	  else
-	    tmp = a_data_sp[i] / tmp;
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
+    func = (gauss?update_estimate_gauss_csp:update_estimate_poisson_csp);
   else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT64))
-    {
-      a_data_dp = (npy_float64*)PyArray_DATA(a);
-      b_data_dp = (npy_float64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = a_data_dp[i];
-	  tmp2 = (a_data_dp[i] += alpha * b_data_dp[i]);
-	  if (tmp==0.0)
-	    tmp = 2.0; // force unstable
-	  else
-	    tmp = a_data_dp[i] / tmp;
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
+    func = (gauss?update_estimate_gauss_dp:update_estimate_poisson_dp);
   else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_COMPLEX128))
-    {
-      a_data_dp = (npy_float64*)PyArray_DATA(a);
-      b_data_cdp = (npy_complex128*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp = a_data_dp[i];
-	  tmp2 = (a_data_dp[i] += alpha * b_data_cdp[i].real);
-	  if (tmp==0.0)
-	    tmp = 2.0; // force unstable
-	  else
-	    tmp = a_data_dp[i] / tmp;
-	  if (tmp==0.0 || tmp==1.0)
-	    exact += tmp2;
-	  else if (((tmp>c0) && (tmp<c)) || ((tmp<c1) && (tmp>c2)))
-	    stable += tmp2;
-	  else
-	    unstable += tmp2;
-	  if (tmp2<0)
-	    negative += tmp2;
-	}
-    }
+    func = (gauss?update_estimate_gauss_cdp:update_estimate_poisson_cdp);
   else
     {
       PyErr_SetString(PyExc_TypeError,"array argument types must be either float32 or float64");
       return NULL;
     }
-  return Py_BuildValue("dddd", exact, stable, unstable, negative);
+  fargs.a = PyArray_DATA(a);
+  fargs.b = PyArray_DATA(b);
+  fargs.c = c;
+  fargs.c0 = -c;
+  fargs.c1 = 1.0+c;
+  fargs.c2 = 1.0-c;
+  fargs.alpha = alpha;
+  if (run_chunks(func, &fargs, sz, sums, 4, NULL, nthreads))
+    return PyErr_NoMemory();
+  return Py_BuildValue("dddd", sums[0], sums[1], sums[2], sums[3]);
+}
+
+static PyObject *update_estimate_poisson(PyObject *self, PyObject *args)
+{
+  return update_estimate(args, 0);
+}
+
+static PyObject *update_estimate_gauss(PyObject *self, PyObject *args)
+{
+  return update_estimate(args, 1);
 }
 
 
@@ -318,75 +270,94 @@ static PyObject *poisson_hist_factor_estimate(PyObject *self, PyObject *args)
   return Py_BuildValue("dd",stable, unstable);
 }
 
-// kldiv(f,f0)=E(f0-f+f*log(f/f0)) f0,f>=level
-static PyObject* kullback_leibler_divergence(PyObject *self, PyObject *args)
+typedef struct
+{
+  void* a;
+  void* b;
+  double c, level, scale;
+} binary_args;
+
+/* Check that a and b are contiguous arrays with equal sizes */
+static int check_binary_arrays(PyObject* a, PyObject* b)
 {
-  PyObject* a = NULL;
-  PyObject* b = NULL;
-  npy_float64 f,f0, level = 1.0;
-  npy_intp sz = 0, i, count=0;
-  if (!PyArg_ParseTuple(args, "OO|f", &a, &b, &level))
-    return NULL; 
   if (!(PyArray_Check(a) && PyArray_Check(b)))
     {
       PyErr_SetString(PyExc_TypeError,"arguments must be array objects");
-      return NULL;
+      return -1;
     }
-  sz = PyArray_SIZE(a);
-
-  if (sz != PyArray_SIZE(b))
+  if (PyArray_SIZE(a) != PyArray_SIZE(b))
     {
       PyErr_SetString(PyExc_TypeError,"argument sizes must be equal");
-      return NULL;
+      return -1;
     }
+  if (!(PyArray_ISCONTIGUOUS(a) && PyArray_ISCONTIGUOUS(b)))
+    {
+      PyErr_SetString(PyExc_TypeError,"array arguments must be contiguous");
+      return -1;
+    }
+  return 0;
+}
+
+#define DEFINE_KLDIV_CHUNK(NAME, TYPE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  binary_args* args = (binary_args*)args_; \
+  TYPE* a_data = (TYPE*)args->a; \
+  TYPE* b_data = (TYPE*)args->b; \
+  double level = args->level, f, f0, result = 0.0; \
+  npy_intp i, count = 0; \
+  for (i=start; i<end; ++i) \
+    { \
+      f = a_data[i]; \
+      f0 = b_data[i]; \
+      if (f0<=level || f<level) \
+	continue; \
+      if (f==0.0) \
+	result += f0; \
+      else \
+	result += f0 - f + f*log(f/f0); \
+      count ++; \
+    } \
+  sums[0] = result; \
+  sums[1] = count; \
+}
+
+DEFINE_KLDIV_CHUNK(kldiv_sp, npy_float32)
+DEFINE_KLDIV_CHUNK(kldiv_dp, npy_float64)
+
+// kldiv(f,f0)=E(f0-f+f*log(f/f0)) f0,f>=level
+static PyObject* kullback_leibler_divergence(PyObject *self, PyObject *args)
+{
+  PyObject* a = NULL;
+  PyObject* b = NULL;
+  npy_float64 level = 1.0;
+  int nthreads = 1;
+  double sums[2] = {0.0, 0.0};
+  binary_args fargs;
+  chunk_func func = NULL;
+  if (!PyArg_ParseTuple(args, "OO|di", &a, &b, &level, &nthreads))
+    return NULL; 
+  if (check_binary_arrays(a, b))
+    return NULL;
   if (PyArray_TYPE(a) != PyArray_TYPE(b))
     {
       PyErr_SetString(PyExc_TypeError,"argument types must be same");
       return NULL;
     }
-  level = (level<0? 0.0 : level);
   switch(PyArray_TYPE(a))
     {
-    case PyArray_FLOAT64:
-      {
-	npy_float64 result=0.0;
-	for (i=0; i<sz; ++i)
-	  {
-	    f = *((npy_float64*)PyArray_DATA(a) + i);
-	    f0 = *((npy_float64*)PyArray_DATA(b) + i);
-	    if (f0<=level || f<level)
-	      continue;
-	    if (f==0.0)
-	      result += f0;
-	    else
-	      result += f0 - f + f*log(f/f0);
-	    count ++;
-	  }
-	return Py_BuildValue("f", result/count);
-      }
-      break;
-    case PyArray_FLOAT32:
-      {
-	npy_float64 result=0.0;
-	for (i=0; i<sz; ++i)
-	  {
-	    f = *((npy_float32*)PyArray_DATA(a) + i);
-	    f0 = *((npy_float32*)PyArray_DATA(b) + i);
-	    if (f0<=level || f<level)
-	      continue;
-	    if (f==0.0)
-	      result += f0;
-	    else
-	      result += f0 - f + f*log(f/f0);
-	    count ++;
-	  }
-	return Py_BuildValue("f", result/count);
-      }
-      break;
+    case PyArray_FLOAT64: func = kldiv_dp; break;
+    case PyArray_FLOAT32: func = kldiv_sp; break;
     default:
       PyErr_SetString(PyExc_TypeError,"argument types must be float64");
       return NULL;
     }
+  fargs.a = PyArray_DATA(a);
+  fargs.b = PyArray_DATA(b);
+  fargs.level = (level<0? 0.0 : level);
+  if (run_chunks(func, &fargs, PyArray_SIZE(a), sums, 2, NULL, nthreads))
+    return PyErr_NoMemory();
+  return Py_BuildValue("f", sums[0]/sums[1]);
 }
 
 static PyObject *zero_if_zero_inplace(PyObject *self, PyObject *args)
@@ -429,133 +400,327 @@ static PyObject *zero_if_zero_inplace(PyObject *self, PyObject *args)
   return Py_BuildValue("");
 }
 
+/* Execute a = b/a (a = 0 if a==0 or b==0), complex a */
+#define DEFINE_INVERSE_DIVISION_COMPLEX_CHUNK(NAME, CTYPE, TYPE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  binary_args* args = (binary_args*)args_; \
+  CTYPE* a_data = (CTYPE*)args->a; \
+  TYPE* b_data = (TYPE*)args->b; \
+  CTYPE* tmp; \
+  TYPE tmp2; \
+  npy_intp i; \
+  for (i=start; i<end; ++i) \
+    { \
+      tmp = a_data + i; \
+      if (tmp->real==0.0 || (b_data[i]==0.0)) \
+	{ \
+	  tmp->real = tmp->imag = 0.0; \
+	} \
+      else \
+	{ \
+	  tmp2 = b_data[i] / (tmp->real * tmp->real + tmp->imag * tmp->imag); \
+	  tmp->real *= tmp2; \
+	  tmp->imag *= -tmp2; \
+	} \
+    } \
+}
+
+/* Execute a = b/a (a = 0 if a==0 or b==0), real a */
+#define DEFINE_INVERSE_DIVISION_CHUNK(NAME, TYPE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  binary_args* args = (binary_args*)args_; \
+  TYPE* a_data = (TYPE*)args->a; \
+  TYPE* b_data = (TYPE*)args->b; \
+  npy_intp i; \
+  for (i=start; i<end; ++i) \
+    { \
+      if (a_data[i]==0.0 || (b_data[i]==0.0)) \
+	a_data[i] = 0.0; \
+      else \
+	a_data[i] = b_data[i] / a_data[i]; \
+    } \
+}
+
+DEFINE_INVERSE_DIVISION_COMPLEX_CHUNK(inverse_division_csp, npy_complex64, npy_float32)
+DEFINE_INVERSE_DIVISION_COMPLEX_CHUNK(inverse_division_cdp, npy_complex128, npy_float64)
+DEFINE_INVERSE_DIVISION_CHUNK(inverse_division_sp, npy_float32)
+DEFINE_INVERSE_DIVISION_CHUNK(inverse_division_dp, npy_float64)
+
 static PyObject *inverse_division_inplace(PyObject *self, PyObject *args)
 {
   PyObject* a = NULL;
   PyObject* b = NULL;
-  npy_intp sz = 0, i;
-  npy_complex64* tmp_sp = NULL;
-  npy_float32 tmp2_sp;
-  npy_complex64* a_data_sp = NULL;
-  npy_float32* b_data_sp = NULL;
-  npy_complex128* tmp_dp = NULL;
-  npy_float64 tmp2_dp;
-  npy_complex128* a_data_dp = NULL;
-  npy_float64* b_data_dp = NULL;
-  if (!PyArg_ParseTuple(args, "OO", &a, &b))
+  int nthreads = 1;
+  binary_args fargs;
+  chunk_func func = NULL;
+  if (!PyArg_ParseTuple(args, "OO|i", &a, &b, &nthreads))
     return NULL;
-  if (!(PyArray_Check(a) && PyArray_Check(b)))
+  if (check_binary_arrays(a, b))
+    return NULL;
+  if ((PyArray_TYPE(a) == PyArray_COMPLEX64) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+    func = inverse_division_csp;
+  else if ((PyArray_TYPE(a) == PyArray_COMPLEX128) && (PyArray_TYPE(b) == PyArray_FLOAT64))
+    func = inverse_division_cdp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+    func = inverse_division_sp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT64))
+    func = inverse_division_dp;
+  else
     {
-      PyErr_SetString(PyExc_TypeError,"arguments must be array objects");
+      PyErr_SetString(PyExc_TypeError,"argument types must be complex64|float32 and float32");
       return NULL;
     }
-  sz = PyArray_SIZE(a);
+  fargs.a = PyArray_DATA(a);
+  fargs.b = PyArray_DATA(b);
+  if (run_chunks(func, &fargs, PyArray_SIZE(a), NULL, 0, NULL, nthreads))
+    return PyErr_NoMemory();
+  return Py_BuildValue("");
+}
 
-  if (sz != PyArray_SIZE(b))
+/*
+  Execute a = b/a (a = 0 if a==0 or b==0) and compute statistics of
+  the model f0 = c*a against data f = b: sum of squared errors and
+  Kullback-Leibler divergence sum and count over voxels with
+  f0>level and f>=level, see kullback_leibler_divergence. Data b
+  may be stored in half precision as b/scale.
+ */
+#define DEFINE_INVERSE_DIVISION_STATS_CHUNK(NAME, TYPE, BTYPE, BVALUE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  binary_args* args = (binary_args*)args_; \
+  TYPE* a_data = (TYPE*)args->a; \
+  BTYPE* b_data = (BTYPE*)args->b; \
+  double c = args->c, level = args->level, scale = args->scale; \
+  double f, f0, se = 0.0, kl = 0.0; \
+  npy_intp i, count = 0; \
+  for (i=start; i<end; ++i) \
+    { \
+      f = BVALUE(b_data[i]) * scale; \
+      f0 = c * a_data[i]; \
+      se += (f0 - f) * (f0 - f); \
+      if (!(f0<=level || f<level)) \
+	{ \
+	  if (f==0.0) \
+	    kl += f0; \
+	  else \
+	    kl += f0 - f + f*log(f/f0); \
+	  count ++; \
+	} \
+      if (a_data[i]==0.0 || f==0.0) \
+	a_data[i] = 0.0; \
+      else \
+	a_data[i] = f / a_data[i]; \
+    } \
+  sums[0] = se; \
+  sums[1] = kl; \
+  sums[2] = count; \
+}
+
+DEFINE_INVERSE_DIVISION_STATS_CHUNK(inverse_division_stats_sp, npy_float32, npy_float32, REAL_VALUE)
+DEFINE_INVERSE_DIVISION_STATS_CHUNK(inverse_division_stats_dp, npy_float64, npy_float64, REAL_VALUE)
+DEFINE_INVERSE_DIVISION_STATS_CHUNK(inverse_division_stats_sp_hp, npy_float32, npy_half, HALF_VALUE)
+DEFINE_INVERSE_DIVISION_STATS_CHUNK(inverse_division_stats_dp_hp, npy_float64, npy_half, HALF_VALUE)
+
+static PyObject *inverse_division_stats_inplace(PyObject *self, PyObject *args)
+{
+  PyObject* a = NULL;
+  PyObject* b = NULL;
+  int nthreads = 1;
+  double c, level, scale = 1.0;
+  double sums[3] = {0.0, 0.0, 0.0};
+  binary_args fargs;
+  chunk_func func = NULL;
+  if (!PyArg_ParseTuple(args, "OOdd|id", &a, &b, &c, &level, &nthreads, &scale))
+    return NULL;
+  if (check_binary_arrays(a, b))
+    return NULL;
+  if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+    func = inverse_division_stats_sp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT64))
+    func = inverse_division_stats_dp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT16))
+    func = inverse_division_stats_sp_hp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT16))
+    func = inverse_division_stats_dp_hp;
+  else
     {
-      PyErr_SetString(PyExc_TypeError,"argument sizes must be equal");
+      PyErr_SetString(PyExc_TypeError,"argument types must be both float32 or float64 or second float16");
       return NULL;
     }
-  if ((PyArray_TYPE(a) == PyArray_COMPLEX64) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+  fargs.a = PyArray_DATA(a);
+  fargs.b = PyArray_DATA(b);
+  fargs.c = c;
+  fargs.level = level;
+  fargs.scale = scale;
+  if (run_chunks(func, &fargs, PyArray_SIZE(a), sums, 3, NULL, nthreads))
+    return PyErr_NoMemory();
+  return Py_BuildValue("ddn", sums[0], sums[1], (Py_ssize_t)sums[2]);
+}
+
+typedef struct
+{
+  void* e;
+  void* p1;
+  void* p2;
+  double scale;
+} estimate_statistics_args;
+
+/*
+  Compute min and max of estimate e, relative changes
+  tau1 = sum|e-p1|/sum|p1|, tau2 = sum|e-p2|/sum|p2|, and rotate
+  estimate history: p2 = p1, p1 = e. Estimate history may be
+  stored in half precision as p/scale.
+ */
+#define DEFINE_ESTIMATE_STATISTICS_CHUNK(NAME, TYPE, PTYPE, PVALUE, PSTORE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  estimate_statistics_args* args = (estimate_statistics_args*)args_; \
+  TYPE* e_data = (TYPE*)args->e; \
+  PTYPE* p1_data = (PTYPE*)args->p1; \
+  PTYPE* p2_data = (PTYPE*)args->p2; \
+  double scale = args->scale; \
+  double v, q1, q2, mn, mx, d1 = 0.0, n1 = 0.0, d2 = 0.0, n2 = 0.0; \
+  npy_intp i; \
+  mn = mx = e_data[start]; \
+  for (i=start; i<end; ++i) \
+    { \
+      v = e_data[i]; \
+      q1 = PVALUE(p1_data[i]) * scale; \
+      q2 = PVALUE(p2_data[i]) * scale; \
+      if (v<mn) mn = v; \
+      if (v>mx) mx = v; \
+      d1 += fabs(v - q1); \
+      n1 += fabs(q1); \
+      d2 += fabs(v - q2); \
+      n2 += fabs(q2); \
+      p2_data[i] = p1_data[i]; \
+      p1_data[i] = PSTORE(v / scale); \
+    } \
+  sums[0] = mn; \
+  sums[1] = mx; \
+  sums[2] = d1; \
+  sums[3] = n1; \
+  sums[4] = d2; \
+  sums[5] = n2; \
+}
+
+DEFINE_ESTIMATE_STATISTICS_CHUNK(estimate_statistics_sp, npy_float32, npy_float32, REAL_VALUE, REAL_VALUE)
+DEFINE_ESTIMATE_STATISTICS_CHUNK(estimate_statistics_dp, npy_float64, npy_float64, REAL_VALUE, REAL_VALUE)
+DEFINE_ESTIMATE_STATISTICS_CHUNK(estimate_statistics_sp_hp, npy_float32, npy_half, HALF_VALUE, HALF_STORE)
+DEFINE_ESTIMATE_STATISTICS_CHUNK(estimate_statistics_dp_hp, npy_float64, npy_half, HALF_VALUE, HALF_STORE)
+
+static void combine_min_max_sum(double* sums, const double* chunk_sums, int nsums, npy_intp ch)
+{
+  if (ch==0 || chunk_sums[0]<sums[0])
+    sums[0] = chunk_sums[0];
+  if (ch==0 || chunk_sums[1]>sums[1])
+    sums[1] = chunk_sums[1];
+  combine_sum(sums+2, chunk_sums+2, nsums-2, ch);
+}
+
+static PyObject *estimate_statistics_inplace(PyObject *self, PyObject *args)
+{
+  PyObject* e = NULL;
+  PyObject* p1 = NULL;
+  PyObject* p2 = NULL;
+  npy_intp sz = 0;
+  int nthreads = 1;
+  double scale = 1.0;
+  double sums[6] = {0.0, 0.0, 0.0, 0.0, 0.0, 0.0};
+  estimate_statistics_args fargs;
+  chunk_func func = NULL;
+  if (!PyArg_ParseTuple(args, "OOO|id", &e, &p1, &p2, &nthreads, &scale))
+    return NULL;
+  if (check_binary_arrays(e, p1) || check_binary_arrays(e, p2))
+    return NULL;
+  sz = PyArray_SIZE(e);
+  if (sz==0)
     {
-      a_data_sp = (npy_complex64*)PyArray_DATA(a);
-      b_data_sp = (npy_float32*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp_sp = a_data_sp + i;
-	  if (tmp_sp->real==0.0 || (b_data_sp[i]==0.0))
-	    {
-	      tmp_sp->real = tmp_sp->imag = 0.0;
-	    }
-	  else
-	    {
-	      tmp2_sp = b_data_sp[i] / (tmp_sp->real * tmp_sp->real + tmp_sp->imag * tmp_sp->imag);
-	      tmp_sp->real *= tmp2_sp;
-	      tmp_sp->imag *= -tmp2_sp;
-	    }
-	}
+      PyErr_SetString(PyExc_TypeError,"argument sizes must be non-zero");
+      return NULL;
     }
-  else if ((PyArray_TYPE(a) == PyArray_COMPLEX128) && (PyArray_TYPE(b) == PyArray_FLOAT64))
+  if (PyArray_TYPE(p1) != PyArray_TYPE(p2))
     {
-      a_data_dp = (npy_complex128*)PyArray_DATA(a);
-      b_data_dp = (npy_float64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp_dp = a_data_dp + i;
-	  if (tmp_dp->real==0.0 || (b_data_dp[i]==0.0))
-	    {
-	      tmp_dp->real = tmp_dp->imag = 0.0;
-	    }
-	  else
-	    {
-	      tmp2_dp = b_data_dp[i] / (tmp_dp->real * tmp_dp->real + tmp_dp->imag * tmp_dp->imag);
-	      tmp_dp->real *= tmp2_dp;
-	      tmp_dp->imag *= -tmp2_dp;
-	    }
-	}
+      PyErr_SetString(PyExc_TypeError,"history argument types must be same");
+      return NULL;
     }
+  if (PyArray_TYPE(e) == PyArray_FLOAT32 && PyArray_TYPE(p1) == PyArray_FLOAT32)
+    func = estimate_statistics_sp;
+  else if (PyArray_TYPE(e) == PyArray_FLOAT64 && PyArray_TYPE(p1) == PyArray_FLOAT64)
+    func = estimate_statistics_dp;
+  else if (PyArray_TYPE(e) == PyArray_FLOAT32 && PyArray_TYPE(p1) == PyArray_FLOAT16)
+    func = estimate_statistics_sp_hp;
+  else if (PyArray_TYPE(e) == PyArray_FLOAT64 && PyArray_TYPE(p1) == PyArray_FLOAT16)
+    func = estimate_statistics_dp_hp;
   else
     {
-      PyErr_SetString(PyExc_TypeError,"argument types must be complex64 and float32");
+      PyErr_SetString(PyExc_TypeError,"argument types must be float32 or float64, history may be float16");
       return NULL;
     }
-  return Py_BuildValue("");
+  fargs.e = PyArray_DATA(e);
+  fargs.p1 = PyArray_DATA(p1);
+  fargs.p2 = PyArray_DATA(p2);
+  fargs.scale = scale;
+  if (run_chunks(func, &fargs, sz, sums, 6, combine_min_max_sum, nthreads))
+    return PyErr_NoMemory();
+  return Py_BuildValue("dddd", sums[0], sums[1],
+		       (sums[3]?sums[2]/sums[3]:0.0), (sums[5]?sums[4]/sums[5]:0.0));
 }
 
+/* Execute a = b - c*a, complex or real a */
+#define DEFINE_INVERSE_SUBTRACTION_CHUNK(NAME, ATYPE, TYPE, AVALUE) \
+static void NAME(void* args_, npy_intp start, npy_intp end, double* sums) \
+{ \
+  binary_args* args = (binary_args*)args_; \
+  ATYPE* a_data = (ATYPE*)args->a; \
+  TYPE* b_data = (TYPE*)args->b; \
+  double c = args->c; \
+  npy_intp i; \
+  for (i=start; i<end; ++i) \
+    AVALUE(a_data[i]) = b_data[i] - AVALUE(a_data[i]) * c; \
+}
+
+DEFINE_INVERSE_SUBTRACTION_CHUNK(inverse_subtraction_csp, npy_complex64, npy_float32, COMPLEX_REAL)
+DEFINE_INVERSE_SUBTRACTION_CHUNK(inverse_subtraction_cdp, npy_complex128, npy_float64, COMPLEX_REAL)
+DEFINE_INVERSE_SUBTRACTION_CHUNK(inverse_subtraction_sp, npy_float32, npy_float32, REAL_VALUE)
+DEFINE_INVERSE_SUBTRACTION_CHUNK(inverse_subtraction_dp, npy_float64, npy_float64, REAL_VALUE)
+
 static PyObject *inverse_subtraction_inplace(PyObject *self, PyObject *args)
 {
   PyObject* a = NULL;
   PyObject* b = NULL;
-  npy_intp sz = 0, i;
-  npy_complex64* tmp_sp = NULL;
-  npy_complex64* a_data_sp = NULL;
-  npy_float32* b_data_sp = NULL;
-  npy_complex128* tmp_dp = NULL;
-  npy_complex128* a_data_dp = NULL;
-  npy_float64* b_data_dp = NULL;
+  int nthreads = 1;
   double c;
-  if (!PyArg_ParseTuple(args, "OOd", &a, &b, &c))
+  binary_args fargs;
+  chunk_func func = NULL;
+  if (!PyArg_ParseTuple(args, "OOd|i", &a, &b, &c, &nthreads))
+    return NULL;
+  if (check_binary_arrays(a, b))
     return NULL;
-  if (!(PyArray_Check(a) && PyArray_Check(b)))
-    {
-      PyErr_SetString(PyExc_TypeError,"arguments must be array objects");
-      return NULL;
-    }
-  sz = PyArray_SIZE(a);
-
-  if (sz != PyArray_SIZE(b))
-    {
-      PyErr_SetString(PyExc_TypeError,"argument sizes must be equal");
-      return NULL;
-    }
   if ((PyArray_TYPE(a) == PyArray_COMPLEX64) && (PyArray_TYPE(b) == PyArray_FLOAT32))
-    {
-      a_data_sp = (npy_complex64*)PyArray_DATA(a);
-      b_data_sp = (npy_float32*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp_sp = a_data_sp + i;
-	  tmp_sp->real = b_data_sp[i] - tmp_sp->real * c; 
-	}
-    }
+    func = inverse_subtraction_csp;
   else if ((PyArray_TYPE(a) == PyArray_COMPLEX128) && (PyArray_TYPE(b) == PyArray_FLOAT64))
-    {
-      a_data_dp = (npy_complex128*)PyArray_DATA(a);
-      b_data_dp = (npy_float64*)PyArray_DATA(b);
-      for (i=0; i<sz; ++i)
-	{
-	  tmp_dp = a_data_dp + i;
-	  tmp_dp->real = b_data_dp[i] - tmp_dp->real * c; 
-	}
-    }
+    func = inverse_subtraction_cdp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT32) && (PyArray_TYPE(b) == PyArray_FLOAT32))
+    func = inverse_subtraction_sp;
+  else if ((PyArray_TYPE(a) == PyArray_FLOAT64) && (PyArray_TYPE(b) == PyArray_FLOAT64))
+    func = inverse_subtraction_dp;
   else
     {
-      PyErr_SetString(PyExc_TypeError,"argument types must be complex64 and float32");
+      PyErr_SetString(PyExc_TypeError,"argument types must be complex64|float32 and float32");
       return NULL;
     }
+  fargs.a = PyArray_DATA(a);
+  fargs.b = PyArray_DATA(b);
+  fargs.c = c;
+  if (run_chunks(func, &fargs, PyArray_SIZE(a), NULL, 0, NULL, nthreads))
+    return PyErr_NoMemory();
   return Py_BuildValue("");
 }
 
+
 static
 double m(double a, double b)
 {
@@ -581,6 +746,13 @@ __inline double hypot3(double a, double b, double c)
 #define FLOAT32_EPS 0.0 //1e-8
 #define FLOAT64_EPS 0.0 //1e-16
 
+/* Variables that are private to a thread when iterating over the first index */
+#define DIV_UNIT_GRAD_PRIVATE j, k, im1, im2, ip1, jm1, jm2, jp1, km1, km2, kp1, \
+    fip, fim, fjp, fjm, fkp, fkm, fijk, \
+    fimkm, fipkm, fjmkm, fjpkm, fimjm, fipjm, fimkp, fjmkp, fimjp, \
+    aim, bjm, ckm, aijk, bijk, cijk, \
+    Dxpf, Dxmf, Dypf, Dymf, Dzpf, Dzmf, Dxma, Dymb, Dzmc
+
 static PyObject *div_unit_grad(PyObject *self, PyObject *args)
 {
   PyObject* f = NULL;
@@ -598,9 +770,12 @@ static PyObject *div_unit_grad(PyObject *self, PyObject *args)
   double aim, bjm, ckm, aijk, bijk, cijk;
   double Dxpf, Dxmf, Dypf, Dymf, Dzpf, Dzmf;
   double Dxma, Dymb, Dzmc;
-  if (!PyArg_ParseTuple(args, "O(ddd)", &f, &hx, &hy, &hz))
+  int nthreads = 1;
+  if (!PyArg_ParseTuple(args, "O(ddd)|i", &f, &hx, &hy, &hz, &nthreads))
     return NULL;
   hx2 = 2*hx;  hy2 = 2*hy;  hz2 = 2*hz;
+  if (nthreads<1)
+    nthreads = 1;
   if (!PyArray_Check(f))
     {
       PyErr_SetString(PyExc_TypeError,"first argument must be array");
@@ -620,6 +795,10 @@ static PyObject *div_unit_grad(PyObject *self, PyObject *args)
     {
       f_data_sp = (npy_float32*)PyArray_DATA(f);
       r_data_sp = (npy_float32*)PyArray_DATA(r);
+      Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static) num_threads(nthreads) if(nthreads>1) private(DIV_UNIT_GRAD_PRIVATE)
+#endif
       for (i=0; i<Nx; ++i)
 	{
 	  im1 = (i?i-1:0);
@@ -709,12 +888,17 @@ static PyObject *div_unit_grad(PyObject *self, PyObject *args)
 		  *((npy_float32*)PyArray_GETPTR3(r, i, j, k)) = Dxma + Dymb + Dzmc;
 		}
 	    }
-	}      
+	}
+      Py_END_ALLOW_THREADS
     }
   else if (PyArray_TYPE(f) == PyArray_FLOAT64)
     {
       f_data_dp = (npy_float64*)PyArray_DATA(f);
       r_data_dp = (npy_float64*)PyArray_DATA(r);
+      Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static) num_threads(nthreads) if(nthreads>1) private(DIV_UNIT_GRAD_PRIVATE)
+#endif
       for (i=0; i<Nx; ++i)
 	{
 	  im1 = (i?i-1:0);
@@ -800,9 +984,11 @@ static PyObject *div_unit_grad(PyObject *self, PyObject *args)
 		}
 	    }
 	}
+      Py_END_ALLOW_THREADS
     }
   else
     {
+      Py_DECREF(r);
       PyErr_SetString(PyExc_TypeError,"array argument type must be float64");
       return NULL;
     }
@@ -1026,14 +1212,16 @@ static PyObject *fourier_sphere(PyObject *self, PyObject *args)
 }
 
 static PyMethodDef module_methods[] = {
-  {"inverse_division_inplace",  inverse_division_inplace, METH_VARARGS, "inverse_division_inplace(a,b) == `a = b/a if a!=0 else 0`"},
-  {"inverse_subtraction_inplace",  inverse_subtraction_inplace, METH_VARARGS, "inverse_subtraction_inplace(a,b,c) == `a = b-c*a`"},
-  {"update_estimate_poisson", update_estimate_poisson, METH_VARARGS, "update_estimate_poisson(a,b,epsilon) -> e,s,u,n == `a *= b, s,u are photon counts`"},
-  {"update_estimate_gauss", update_estimate_gauss, METH_VARARGS, "update_estimate_gauss(a,b,epsilon, alpha) -> e,s,u,n == `a += alpha * b, s,u are photon counts`"},
-  {"div_unit_grad", div_unit_grad, METH_VARARGS, "div_unit_grad(f, (hx,hy,hz)) == `div(grad f/|grad f|)`"},
+  {"inverse_division_inplace",  inverse_division_inplace, METH_VARARGS, "inverse_division_inplace(a,b[,nthreads]) == `a = b/a if a!=0 else 0`"},
+  {"inverse_division_stats_inplace",  inverse_division_stats_inplace, METH_VARARGS, "inverse_division_stats_inplace(a,b,c,level[,nthreads,scale]) -> se,kl,count == `a = b/a if a!=0 else 0`, se=sum((c*a-b)**2), b may be float16 holding b/scale, kl,count are Kullback-Leibler divergence sum and count"},
+  {"estimate_statistics_inplace",  estimate_statistics_inplace, METH_VARARGS, "estimate_statistics_inplace(e,p1,p2[,nthreads,scale]) -> min,max,tau1,tau2 == `tau1=sum|e-p1|/sum|p1|, tau2=sum|e-p2|/sum|p2|, p2=p1, p1=e`, p1,p2 may be float16 holding p/scale"},
+  {"inverse_subtraction_inplace",  inverse_subtraction_inplace, METH_VARARGS, "inverse_subtraction_inplace(a,b,c[,nthreads]) == `a = b-c*a`"},
+  {"update_estimate_poisson", update_estimate_poisson, METH_VARARGS, "update_estimate_poisson(a,b,epsilon[,nthreads]) -> e,s,u,n == `a *= b, s,u are photon counts`"},
+  {"update_estimate_gauss", update_estimate_gauss, METH_VARARGS, "update_estimate_gauss(a,b,epsilon, alpha[,nthreads]) -> e,s,u,n == `a += alpha * b, s,u are photon counts`"},
+  {"div_unit_grad", div_unit_grad, METH_VARARGS, "div_unit_grad(f, (hx,hy,hz)[,nthreads]) == `div(grad f/|grad f|)`"},
   {"div_unit_grad1", div_unit_grad1, METH_VARARGS, "div_unit_grad1(f, hx) == `div(grad f/|grad f|)`"},
   {"fourier_sphere", fourier_sphere, METH_VARARGS, "fourier_sphere((Nx, Ny, Nz), (Dx, Dy, Dz), eps or pcount)"},
-  {"kullback_leibler_divergence", kullback_leibler_divergence, METH_VARARGS, "kullback_leibler_divergence(f, f0) -> float"},
+  {"kullback_leibler_divergence", kullback_leibler_divergence, METH_VARARGS, "kullback_leibler_divergence(f, f0[, level, nthreads]) -> float"},
   //  {"zero_if_zero_inplace", zero_if_zero_inplace, METH_VARARGS, "zero_if_zero_inplace(a,b) == `a = a if b!=0 else 0`"},
   //{"poisson_hist_factor_estimate", poisson_hist_factor_estimate, METH_VARARGS, "poisson_hist_factor_estimate(a,b,c) -> (stable,unstable)"},
 
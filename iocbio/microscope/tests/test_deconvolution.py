@@ -0,0 +1,171 @@
+from __future__ import division
+
+import os
+import shutil
+import tempfile
+import threading
+import numpy
+from iocbio.io import ImageStack
+from iocbio.utils import Options
+from iocbio.microscope import deconvolution
+
+def make_psf_and_stack(shape=(16, 48, 48)):
+    numpy.random.seed(0)
+    z, y, x = numpy.mgrid[-3:4, -3:4, -3:4]
+    kernel = numpy.exp(-(x**2 + y**2 + (z/2)**2)/2)
+    kernel -= kernel.min()
+    data = numpy.random.rand(*shape)*10 + 1
+    psf = ImageStack(kernel, voxel_sizes=(1e-7, 1e-7, 1e-7))
+    stack = ImageStack(data, voxel_sizes=(1e-7, 1e-7, 1e-7))
+    return psf, stack
+
+def test_deconvolve_tiled():
+    # away from stack boundaries, tiled result matches whole-volume
+    # result within relative error about 1e-4 after one iteration,
+    # see Notes of deconvolve_tiled
+    psf, stack = make_psf_and_stack()
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    try:
+        for apply_window in [False, True]:
+            kws = dict(max_nof_iterations=1, float_type='double', psf_cache_size=0,
+                       apply_window=apply_window, window_width=2.0)
+            tiled = deconvolution.deconvolve_tiled(psf, stack, os.path.join(working_dir, 'tiled'),
+                                                   options=Options(memory_budget=2.0, **kws))
+            assert isinstance(tiled.images, numpy.memmap)
+            assert tiled.images.shape==stack.images.shape
+            whole = deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'whole'),
+                                             options=Options(**kws))
+            err = abs(tiled.images - whole.images)[4:-4, 8:-8, 8:-8].max() / abs(whole.images).max()
+            assert err < 5e-4, `apply_window, err`
+    finally:
+        shutil.rmtree(working_dir)
+
+def test_half_precision_storage():
+    psf, stack = make_psf_and_stack()
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    half_storage_max = deconvolution.half_storage_max
+    try:
+        kws = dict(max_nof_iterations=3, float_type='single', apply_window=False,
+                   psf_cache_size=0)
+        expected = deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'float'),
+                                            options=Options(**kws)).images
+        # 0.5 forces switching estimate history to float type
+        for deconvolution.half_storage_max in [half_storage_max, 0.5]:
+            result = deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'half'),
+                                              options=Options(half_precision_storage=True, **kws)).images
+            err = abs(result - expected).max() / abs(expected).max()
+            assert err < 1e-3, `deconvolution.half_storage_max, err`
+    finally:
+        deconvolution.half_storage_max = half_storage_max
+        shutil.rmtree(working_dir)
+
+def test_checkpoint_writer_error():
+    def fail():
+        raise IOError('disk full')
+    written = []
+    writer = deconvolution.CheckpointWriter()
+    writer.submit(written.append, 1)
+    writer.submit(fail)
+    try:
+        writer.close()
+    except IOError:
+        pass
+    else:
+        raise AssertionError('writer error was not re-raised')
+    assert written==[1]
+    try:
+        writer.submit(written.append, 2)
+    except IOError:
+        pass
+    else:
+        raise AssertionError('writer error was not re-raised')
+
+def test_psf_cache_dir():
+    psf, stack = make_psf_and_stack((8, 24, 24))
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    try:
+        cache_dir = os.path.join(working_dir, 'psf_cache')
+        options = Options(max_nof_iterations=1, psf_cache_dir=cache_dir)
+        deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'first'), options=options)
+        files = os.listdir(cache_dir)
+        assert len(files)==1 and files[0].startswith('prepared_psf_'), `files`
+        deconvolution._psf_cache.clear()
+        del deconvolution._psf_cache_order[:]
+        psf_f = deconvolution.get_prepared_psf(psf, stack, numpy.float32, options)[0]
+        assert numpy.iscomplexobj(psf_f)
+    finally:
+        shutil.rmtree(working_dir)
+
+def test_acceleration():
+    from scipy import ndimage
+    psf, truth = make_psf_and_stack()
+    blurred = ndimage.convolve(truth.images, psf.images/psf.images.sum(), mode='wrap')
+    stack = ImageStack(blurred, voxel_sizes=truth.get_voxel_sizes())
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    try:
+        # convergence_epsilon=0 disables early stopping
+        kws = dict(float_type='double', psf_cache_size=0, convergence_epsilon=0)
+        plain = deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'plain'),
+                                         options=Options(max_nof_iterations=16, **kws)).images
+        accelerated = deconvolution.deconvolve(psf, stack, os.path.join(working_dir, 'accelerated'),
+                                               options=Options(max_nof_iterations=8, rltv_acceleration=True,
+                                                               **kws)).images
+        assert accelerated.min() >= 0, `accelerated.min()`
+        plain_mse = ((plain - truth.images)**2).mean()
+        accelerated_mse = ((accelerated - truth.images)**2).mean()
+        assert accelerated_mse < plain_mse, `accelerated_mse, plain_mse`
+    finally:
+        shutil.rmtree(working_dir)
+
+def make_time_lapse(stack):
+    images = numpy.concatenate([stack.images, stack.images])
+    time_lapse = ImageStack(images, voxel_sizes=stack.get_voxel_sizes())
+    time_lapse.get_nof_stacks = lambda: 2
+    return time_lapse
+
+def test_deconvolve_time_lapse():
+    psf, stack = make_psf_and_stack((8, 24, 24))
+    time_lapse = make_time_lapse(stack)
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    Cls = deconvolution.DeconvolveRLPoisson
+    original_deconvolve = Cls.deconvolve
+    calls = []
+    def deconvolve(self, estimate=None):
+        first = None if estimate is None else estimate.copy()
+        result = original_deconvolve(self, estimate)
+        calls.append((first, result.copy()))
+        return result
+    try:
+        Cls.deconvolve = deconvolve
+        result = deconvolution.deconvolve_time_lapse(psf, time_lapse, working_dir,
+                                                     options=Options(max_nof_iterations=2,
+                                                                     psf_cache_size=0))
+    finally:
+        Cls.deconvolve = original_deconvolve
+        shutil.rmtree(working_dir)
+    assert result.images.shape==time_lapse.images.shape
+    assert len(calls)==2 and calls[0][0] is None
+    # the second frame starts from the estimate of the first frame
+    assert (calls[1][0]==calls[0][1]).all()
+
+def test_deconvolve_time_lapse_prefetch_error():
+    psf, stack = make_psf_and_stack((8, 24, 24))
+    time_lapse = make_time_lapse(stack)
+    working_dir = tempfile.mkdtemp('-iocbio.test')
+    expand_to_shape = deconvolution.expand_to_shape
+    def failing_expand_to_shape(data, shape, *args):
+        # the first frame is expanded in the main thread
+        if threading.current_thread().name!='MainThread':
+            raise MemoryError('prefetch failed')
+        return expand_to_shape(data, shape, *args)
+    try:
+        deconvolution.expand_to_shape = failing_expand_to_shape
+        deconvolution.deconvolve_time_lapse(psf, time_lapse, working_dir,
+                                            options=Options(max_nof_iterations=1, psf_cache_size=0))
+    except MemoryError:
+        pass
+    else:
+        raise AssertionError('prefetch error was not re-raised')
+    finally:
+        deconvolution.expand_to_shape = expand_to_shape
+        shutil.rmtree(working_dir)
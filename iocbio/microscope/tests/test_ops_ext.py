@@ -0,0 +1,45 @@
+from __future__ import division
+
+import numpy
+from iocbio.microscope import ops_ext
+
+shape = (10, 96, 100) # several chunks of element-wise kernels
+
+def call(func, arrays, args, nthreads):
+    """ Apply func to copies of arrays, return results and the arrays.
+    """
+    arrays = [a.copy() for a in arrays]
+    result = func(*(arrays + list(args) + [nthreads]))
+    return result, arrays
+
+def check_threads(func, arrays, *args):
+    expected = call(func, arrays, args, 1)
+    for nthreads in [2, 3, 4]:
+        result = call(func, arrays, args, nthreads)
+        assert repr(result[0])==repr(expected[0]), `func.__name__, nthreads, result[0], expected[0]`
+        for a, b in zip(result[1], expected[1]):
+            assert a.tostring()==b.tostring(), `func.__name__, nthreads, a.dtype`
+
+def test_threads():
+    numpy.random.seed(0)
+    for float_dtype, complex_dtype in [(numpy.float32, numpy.complex64), (numpy.float64, numpy.complex128)]:
+        a = numpy.random.rand(*shape).astype(float_dtype)
+        b = numpy.random.rand(*shape).astype(float_dtype)
+        c = (numpy.random.rand(*shape) + 1j*numpy.random.rand(*shape)).astype(complex_dtype)
+        b16 = (b*16).astype(numpy.float16)
+        check_threads(ops_ext.inverse_division_inplace, [a, b])
+        check_threads(ops_ext.inverse_division_inplace, [c, b])
+        check_threads(ops_ext.inverse_division_stats_inplace, [a, b], 1.5, 1.0)
+        check_threads(lambda a, b16, n: ops_ext.inverse_division_stats_inplace(a, b16, 1.5, 1.0, n, 1/16),
+                      [a, b16])
+        check_threads(ops_ext.inverse_subtraction_inplace, [a, b], 0.5)
+        check_threads(ops_ext.inverse_subtraction_inplace, [c, b], 0.5)
+        check_threads(ops_ext.update_estimate_poisson, [a, b], 0.05)
+        check_threads(ops_ext.update_estimate_poisson, [a, c], 0.05)
+        check_threads(ops_ext.update_estimate_gauss, [a, b], 0.05, 0.3)
+        check_threads(ops_ext.update_estimate_gauss, [a, c], 0.05, 0.3)
+        check_threads(ops_ext.estimate_statistics_inplace, [a, b, a[::-1].copy()])
+        check_threads(lambda e, p1, p2, n: ops_ext.estimate_statistics_inplace(e, p1, p2, n, 1/16),
+                      [a, b16, b16[::-1].copy()])
+        check_threads(ops_ext.kullback_leibler_divergence, [a, b], 0.5)
+        check_threads(ops_ext.div_unit_grad, [a], (1.0, 0.5, 0.25))
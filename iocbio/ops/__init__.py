@@ -12,19 +12,23 @@ manipulating microscope images.
   convolution
   window
   fft_tasks
+  fft_backends
   autocorrelation
   filters
+  local_extrema
 
 """
 
 __autodoc__ = ['regression', 'convolution', 'window', 'regress', 'convolve','apply_window',
-               'fft_tasks', 'FFTTasks', 
+               'fft_tasks', 'FFTTasks', 'fft_backends',
                'autocorrelation', 'acf', 'acf_argmax', 'acf_sinefit',
-               'filters', 'convolve_discrete_gauss']
+               'filters', 'convolve_discrete_gauss', 'discrete_gauss_scale_space',
+               'local_extrema', 'find_local_maxima', 'find_local_minima']
 
 from .regression import regress
 from .convolution import convolve
 from .window import apply_window
 from .fft_tasks import FFTTasks
 from .autocorrelation import acf, acf_argmax, acf_sinefit
-from .filters import convolve_discrete_gauss
+from .local_extrema import find_local_maxima, find_local_minima
+from .filters import convolve_discrete_gauss, discrete_gauss_scale_space
@@ -40,6 +40,30 @@ period= 0.695207021807
 >>> print 'frequency=', omega/dx
 frequency= 9.03786226273
 
+FFT algorithm
+-------------
+
+For constant and linear interpolation methods, the ACF polynomials in
+all unit intervals are linear combinations of the ACF values at
+integer lags that are computed with a single zero-padded FFT. This
+reduces the cost of evaluating a dense ACF curve from ``O(N**2)`` to
+``O(N*log(N))``. Use ``enable_fft`` keyword argument of ``acf`` and
+``acf_argmax`` to control the algorithm selection; by default the FFT
+algorithm is used when it is estimated to be faster. The results
+agree with direct evaluation up to floating point rounding errors.
+
+Many signals
+------------
+
+Functions ``acf_many``, ``acf_argmax_many`` and ``acf_sinefit_many``
+process the rows of a 2D array in one call. The rows are processed in
+parallel (when compiled with OpenMP support) without holding the
+Python global interpreter lock::
+
+  f2 = array([f, 2*f, f[::-1]])
+  af2 = acf_many(f2, y, method='linear')        # af2.shape == (3, len(y))
+  y_max = acf_argmax_many(f2, method='linear')  # y_max.shape == (3,)
+
 
 Dominant frequency
 ------------------
@@ -55,14 +79,32 @@ for finding dominant frequency of a signal.
 # Created: September 2010
 
 from __future__ import division
-__all__ = ['acf', 'acf_argmax', 'acf_sinefit', 'acf_sine_power_spectrum']
+__all__ = ['acf', 'acf_argmax', 'acf_sinefit', 'acf_sine_power_spectrum',
+           'acf_many', 'acf_argmax_many', 'acf_sinefit_many']
+
+import numpy
 
 try:
     from . import acf_ext
 except ImportError, msg:
     print msg
 
-def acf(f, y, method='linear', enable_size_reduction=False):
+# ACF polynomial coefficient tables of constant and linear
+# interpolation methods, see src/acf.c. The coefficient of dy**i in
+# interval [iy, iy+1] is sum(coeffs[i][m] * R(iy + indices[m])) where
+# R(j) is the ACF of f at integer lag j.
+acf_fft_tables = {
+    0: ([0, 1],
+        [[1., 0.],
+         [-1., 1.]]),
+    1: ([-1, 0, 1, 2],
+        [[1./6., 2./3., 1./6., 0.],
+         [-0.5, 0., 0.5, 0.],
+         [0.5, -1., 0.5, 0.],
+         [-1./6., 0.5, -0.5, 1./6.]]),
+    }
+
+def acf(f, y, method='linear', enable_size_reduction=False, enable_fft='auto'):
     """ Evaluate autocorrelation function ACF(f(x))(y).
 
     Parameters
@@ -76,6 +118,10 @@ def acf(f, y, method='linear', enable_size_reduction=False):
     method : {'constant', 'linear', 'catmullrom'}
       Name of the interpolation method used to evaluate f(x) in
       between nodal points.
+    enable_fft : {'auto', True, False}
+      When True, use FFT algorithm for constant and linear
+      interpolation methods. When 'auto', use FFT algorithm if it is
+      estimated to be faster than direct evaluation.
 
     Returns
     -------
@@ -86,12 +132,15 @@ def acf(f, y, method='linear', enable_size_reduction=False):
     --------
     iocbio.ops.autocorrelation, acf_argmax, acf_sinefit
     """
-    mth = dict(constant=0, linear=1, catmullrom=2, cubic=2)[method.lower()]
-    if enable_size_reduction:
-        mth += 10
+    mth = _get_method(method, enable_size_reduction)
+    if enable_fft and mth in acf_fft_tables and not isinstance(y, float):
+        fa = numpy.asarray(f, dtype=float)
+        ya = numpy.asarray(y, dtype=float)
+        if ya.ndim==1 and (enable_fft!='auto' or _get_acf_fft_speedup(fa, ya, mth) > 1):
+            return _acf_fft(fa, ya, mth)
     return acf_ext.acf(f, y, mth)
 
-def acf_argmax(f, start_j=1, method='linear', enable_size_reduction=False):
+def acf_argmax(f, start_j=1, method='linear', enable_size_reduction=False, enable_fft='auto'):
     """ Find the local maximum point of the autocorrelation function ACF(f(x)).
 
     Parameters
@@ -105,6 +154,9 @@ def acf_argmax(f, start_j=1, method='linear', enable_size_reduction=False):
     method : {'constant', 'linear', 'catmullrom'}
       Name of the interpolation method used to evaluate f(x) in
       between nodal points.
+    enable_fft : {'auto', True, False}
+      When True, use FFT algorithm for linear interpolation
+      method. When 'auto', use FFT algorithm for long sequences.
 
     Returns
     -------
@@ -115,9 +167,11 @@ def acf_argmax(f, start_j=1, method='linear', enable_size_reduction=False):
     --------
     iocbio.ops.autocorrelation, acf, acf_sinefit
     """
-    mth = dict(constant=0, linear=1, catmullrom=2, cubic=2)[method.lower()]
-    if enable_size_reduction:
-        mth += 10
+    mth = _get_method(method, enable_size_reduction)
+    if enable_fft and mth==1:
+        f = numpy.asarray(f, dtype=float)
+        if enable_fft!='auto' or f.shape[0] >= acf_argmax_fft_size:
+            return _acf_argmax_fft(f, int(start_j))
     return acf_ext.acf_argmax (f, int(start_j), mth)
 
 def acf_sinefit(f, start_j=1, method='linear', enable_size_reduction=False):
@@ -158,6 +212,87 @@ def acf_sinefit(f, start_j=1, method='linear', enable_size_reduction=False):
         mth += 10
     return acf_ext.acf_sinefit(f, start_j, mth)
 
+# sequence length from which acf_argmax uses FFT algorithm by default
+acf_argmax_fft_size = 256
+
+def _get_acf_fft_speedup(f, y, mth):
+    """ Return estimated ratio of direct and FFT evaluation times of ACF.
+    """
+    n = f.shape[0]
+    size = f.size
+    sz = len(acf_fft_tables[mth][0])
+    if not y.size:
+        return 0
+    # direct evaluation computes ACF polynomial coefficients whenever
+    # the interval of y changes
+    iy = numpy.floor(abs(y))
+    nof_intervals = numpy.count_nonzero(numpy.diff(iy)) + 1
+    direct_cost = nof_intervals * size * sz * (sz + 1) + 5 * y.size
+    m = 2**int(numpy.ceil(numpy.log2(max(2*n - 1, 2))))
+    fft_cost = 5 * (size // n) * m * numpy.log2(m) + 50 * y.size + 1.5e5
+    return direct_cost / fft_cost
+
+def _get_acf_integer_lags(f):
+    """ Return ACF of f at integer lags 0,...,N-1 using FFT.
+
+    A 2D f with shape ``(N, rows)`` is treated as in acf_ext: the
+    ACFs of consecutive length-N segments of the flattened f are
+    summed up.
+    """
+    n = f.shape[0]
+    f = numpy.ascontiguousarray(f).reshape((-1, n))
+    m = 2**int(numpy.ceil(numpy.log2(max(2*n - 1, 2))))
+    spectrum = numpy.fft.rfft(f, m, axis=-1)
+    power = (spectrum.real**2 + spectrum.imag**2).sum(axis=0)
+    return numpy.fft.irfft(power, m)[:n]
+
+def _get_acf_fft_data(f, mth):
+    """ Return ACF polynomial coefficients in intervals [iy, iy+1],
+    iy=0,1,..., as an array with shape ``(nof_intervals, sz)``.
+    """
+    indices, coeffs = acf_fft_tables[mth]
+    n = f.shape[0]
+    r = _get_acf_integer_lags(f)
+    # ACF vanishes at lags |j|>=N
+    lags = numpy.abs(numpy.arange(n - indices[0])[:,None] + indices)
+    r = numpy.concatenate((r, numpy.zeros(lags.max() + 1 - n)))
+    return numpy.dot(r[lags], numpy.transpose(coeffs))
+
+def _acf_fft(f, y, mth):
+    """ Evaluate ACF using FFT algorithm, see acf.
+    """
+    data = _get_acf_fft_data(f, mth)
+    iy = numpy.floor(numpy.abs(y))
+    dy = y - iy
+    iy = numpy.minimum(iy, data.shape[0]).astype(int)
+    data = numpy.concatenate((data, numpy.zeros((1, data.shape[1]))))[iy]
+    result = numpy.zeros(y.shape)
+    p = numpy.ones(y.shape)
+    for i in range(data.shape[-1]):
+        result += data[...,i] * p
+        p *= dy
+    return result
+
+def _acf_argmax_fft(f, start_j):
+    """ Find the local maximum point of ACF using FFT algorithm, see acf_argmax.
+    """
+    n = f.shape[0]
+    start_j = max(1, start_j)
+    if start_j >= n - 1:
+        return float(start_j)
+    data = _get_acf_fft_data(f, 1)[start_j:n-1]
+    d, c, b, a = data.T
+    # the same stationary point criteria as in acf_maximum_point of src/acf.c
+    s = b*b - 3.0*a*c
+    flag = (s >= 0) & (a != 0)
+    fy = numpy.zeros_like(a)
+    fy[flag] = -(b[flag] + numpy.sqrt(s[flag])) / (3.0*a[flag])
+    flag &= (-1.1102230246251565e-16 < fy) & (fy < 1.0)
+    j = numpy.flatnonzero(flag)
+    if not j.size:
+        return float(start_j)
+    return float(start_j + j[0] + fy[j[0]])
+
 def acf_sine_power_spectrum(f, omega):
     """ Evaluate sine power spectrum SinePower(f(x))(omega).
 
@@ -190,3 +325,95 @@ def acf_sine_power_spectrum(f, omega):
     method = 'constant'
     mth = dict(constant=0, linear=1, catmullrom=2, cubic=2)[method.lower()]
     return acf_ext.acf_sine_power_spectrum(f, omega, mth)
+
+def _get_method(method, enable_size_reduction):
+    mth = dict(constant=0, linear=1, catmullrom=2, cubic=2)[method.lower()]
+    if enable_size_reduction:
+        mth += 10
+    return mth
+
+def acf_many(f, y, method='linear', enable_size_reduction=False, threads=0):
+    """ Evaluate autocorrelation functions of many signals.
+
+    Parameters
+    ----------
+    f : {numpy.ndarray, sequence}
+      A 2D array where each row contains f(x) values at nodal points
+      x=0,...,N-1.
+    y : {numpy.ndarray, sequence}
+      Arguments to ACF where the values should be evaluated.
+    method : {'constant', 'linear', 'catmullrom'}
+      Name of the interpolation method used to evaluate f(x) in
+      between nodal points.
+    threads : int
+      Number of threads used for processing rows. When 0 then the
+      number of processors is used.
+
+    Returns
+    -------
+    values : numpy.ndarray
+      An array with shape ``(len(f), len(y))`` containing ACF values
+      of the rows of f.
+
+    See also
+    --------
+    iocbio.ops.autocorrelation, acf, acf_argmax_many, acf_sinefit_many
+    """
+    return acf_ext.acf_many(f, y, _get_method(method, enable_size_reduction), int(threads))
+
+def acf_argmax_many(f, start_j=1, method='linear', enable_size_reduction=False, threads=0):
+    """ Find the local maximum points of autocorrelation functions of many signals.
+
+    Parameters
+    ----------
+    f : {numpy.ndarray, sequence}
+      A 2D array where each row contains f(x) values at nodal points
+      x=0,...,N-1.
+    start_j : int
+      Left starting point of the local maximum point search.
+    method : {'constant', 'linear', 'catmullrom'}
+      Name of the interpolation method used to evaluate f(x) in
+      between nodal points.
+    threads : int
+      Number of threads used for processing rows. When 0 then the
+      number of processors is used.
+
+    Returns
+    -------
+    y_max : numpy.ndarray
+      Points where ACFs of the rows of f obtain local maximum.
+
+    See also
+    --------
+    iocbio.ops.autocorrelation, acf_argmax, acf_many, acf_sinefit_many
+    """
+    return acf_ext.acf_argmax_many(f, int(start_j), _get_method(method, enable_size_reduction), int(threads))
+
+def acf_sinefit_many(f, start_j=1, method='linear', enable_size_reduction=False, threads=0):
+    """ Find the parameters omega of sine-fit functions for ACFs of many signals.
+
+    Parameters
+    ----------
+    f : {numpy.ndarray, sequence}
+      A 2D array where each row contains f(x) values at nodal points
+      x=0,...,N-1.
+    start_j : int
+      Left starting point of the local maximum point search, see
+      `acf_sinefit`.
+    method : {'constant', 'linear', 'catmullrom'}
+      Name of the interpolation method used to evaluate f(x) in
+      between nodal points.
+    threads : int
+      Number of threads used for processing rows. When 0 then the
+      number of processors is used.
+
+    Returns
+    -------
+    omega : numpy.ndarray
+      Sine-fit parameters of the rows of f.
+
+    See also
+    --------
+    iocbio.ops.autocorrelation, acf_sinefit, acf_many, acf_argmax_many
+    """
+    return acf_ext.acf_sinefit_many(f, int(start_j), _get_method(method, enable_size_reduction), int(threads))
@@ -21,8 +21,10 @@ The following example illustrates how to convolve data with a kernel::
 
 from __future__ import division
 
-__all__ = ['convolve']
+__all__ = ['convolve', 'get_convolve_method']
 
+import itertools
+import numpy
 from scipy import fftpack
 from . import fft_tasks
 from .. import utils
@@ -45,6 +47,9 @@ def convolve(kernel, data, kernel_background = None, options = None):
     options : {`iocbio.utils.Options`, None}
       options.float_type defines FFT algorithms floating point type:
       ``'float'`` (32-bit float) or ``'double'`` (64-bit float).
+      options.convolve_method defines convolution algorithm:
+      ``'auto'`` (default), ``'fft'``, ``'overlap-add'`` or
+      ``'direct'``. See `get_convolve_method`.
 
     Returns
     -------
@@ -52,14 +57,41 @@ def convolve(kernel, data, kernel_background = None, options = None):
 
     See also
     --------
-    :mod:`iocbio.ops.convolution`
+    :mod:`iocbio.ops.convolution`, get_convolve_method
     """
     if options is None:
         options = utils.Options()
     else:
         options = utils.Options(options)
     float_type = options.get (float_type='double')
-    task = fft_tasks.FFTTasks(data.shape, float_type, options=options)
+    real = not (numpy.iscomplexobj(data) or numpy.iscomplexobj(kernel))
+    method = options.get(convolve_method='auto')
+    if method!='fft' and real:
+        method, fft_shape = get_convolve_method(kernel.shape, data.shape, method)
+    else:
+        method = 'fft'
+
+    if method!='fft':
+        dtype = utils.float2dtype(float_type)
+        if kernel_background is None:
+            kernel_background = kernel.min()
+        # the expanded kernel is kernel_background plus kernel -
+        # kernel_background inside the kernel region, the
+        # background part contributes a constant to the result
+        kernel = kernel.astype(dtype) - dtype(kernel_background)
+        total = kernel.sum() + kernel_background * data.size
+        data = numpy.asarray(data, dtype=dtype)
+        if method=='direct':
+            result = _convolve_direct(kernel, data)
+        else:
+            result = _convolve_overlap_add(kernel, data, fft_shape, float_type, options)
+        result = _fold_periodic(result, data.shape, _get_kernel_offsets(kernel.shape, data.shape))
+        if kernel_background:
+            result += kernel_background * data.sum()
+        result /= total
+        return result
+
+    task = fft_tasks.FFTTasks(data.shape, float_type, options=options, real=real)
     if kernel.shape != data.shape:
         # assuming that kernel has smaller size than data
         kernel = utils.expand_to_shape(kernel, data.shape, float_type, background=kernel_background)
@@ -72,3 +104,132 @@ def convolve(kernel, data, kernel_background = None, options = None):
     result = task.convolve(data)
 
     return result
+
+def get_convolve_method(kernel_shape, data_shape, method='auto'):
+    """ Return convolution method and FFT block shape.
+
+    The cost model compares the number of operations of direct
+    summation (``N*K``), of full FFT convolution (three transforms
+    of data shape) and of block overlap-add convolution (two
+    transforms per block), where ``N`` and ``K`` are the sizes of
+    data and kernel. Overlap-add blocks are chosen so that their FFT
+    size is a power of two that is at least ``4*k`` (but at least
+    32) along axes where the kernel size ``k>1``.
+
+    Parameters
+    ----------
+    kernel_shape, data_shape : tuple
+    method : {'auto', 'fft', 'overlap-add', 'direct'}
+      Specify requested method. Direct and overlap-add methods
+      require that kernel is not larger than data, otherwise full FFT
+      method is used.
+
+    Returns
+    -------
+    method : {'fft', 'overlap-add', 'direct'}
+    fft_shape : {None, tuple}
+      FFT shape of overlap-add blocks.
+
+    See also
+    --------
+    :mod:`iocbio.ops.convolution`, convolve
+    """
+    if method not in ['auto', 'fft', 'overlap-add', 'direct']:
+        raise ValueError('Unknown convolve method %r' % (method))
+    if method=='fft' or len(kernel_shape)!=len(data_shape) or kernel_shape==tuple(data_shape) \
+            or [1 for k, s in zip(kernel_shape, data_shape) if k>s]:
+        return 'fft', None
+    fft_shape = []
+    nof_blocks = 1
+    for k, s in zip(kernel_shape, data_shape):
+        if k==1:
+            l = s
+        else:
+            l = max(32, 2**int(numpy.ceil(numpy.log2(4*k))))
+            if l >= s + k - 1:
+                l = s + k - 1
+        fft_shape.append(l)
+        nof_blocks *= -(-s // (l - k + 1))
+    fft_shape = tuple(fft_shape)
+    if method=='direct':
+        return method, None
+    if method!='auto':
+        return method, fft_shape
+    N = utils.mul_seq(data_shape)
+    K = utils.mul_seq(kernel_shape)
+    M = utils.mul_seq(fft_shape)
+    fft_cost = 3 * 2.5 * N * numpy.log2(max(N, 2))
+    direct_cost = 2 * N * K
+    # per block: forward and backward transform, clearing and adding the block
+    overlap_add_cost = (2*nof_blocks + 1) * 2.5 * M * numpy.log2(max(M, 2)) + 2 * nof_blocks * M + 1e4 * nof_blocks
+    cost, method = min((fft_cost, 'fft'), (overlap_add_cost, 'overlap-add'), (direct_cost, 'direct'))
+    if method!='overlap-add':
+        fft_shape = None
+    return method, fft_shape
+
+def _get_kernel_offsets(kernel_shape, data_shape):
+    """ Return periodic positions of kernel[0,..] in the expanded and
+    shifted kernel that FFT convolution uses.
+    """
+    offsets = []
+    for k, s in zip(kernel_shape, data_shape):
+        offsets.append(((s - k + 1)//2 + s//2) % s)
+    return offsets
+
+def _fold_periodic(arr, shape, offsets):
+    """ Fold linear convolution result to periodic one.
+
+    Element ``p`` of arr along an axis is added to element ``(p +
+    offset) % size`` of the result.
+    """
+    for axis, (size, offset) in enumerate(zip(shape, offsets)):
+        length = arr.shape[axis]
+        if length==size and offset==0:
+            continue
+        result = numpy.zeros(arr.shape[:axis] + (size,) + arr.shape[axis+1:], arr.dtype)
+        index = [slice(None)] * arr.ndim
+        rindex = [slice(None)] * arr.ndim
+        p = 0
+        while p < length:
+            j = (p + offset) % size
+            n = min(length - p, size - j)
+            index[axis] = slice(p, p + n)
+            rindex[axis] = slice(j, j + n)
+            result[tuple(rindex)] += arr[tuple(index)]
+            p += n
+        arr = result
+    return arr
+
+def _convolve_direct(kernel, data):
+    """ Return linear convolution of kernel and data.
+    """
+    result = numpy.zeros([s + k - 1 for k, s in zip(kernel.shape, data.shape)], data.dtype)
+    tmp = numpy.empty_like(data)
+    for index in numpy.ndindex(*kernel.shape):
+        value = kernel[index]
+        if value == 0:
+            continue
+        numpy.multiply(data, value, tmp)
+        result[tuple([slice(i, i + s) for i, s in zip(index, data.shape)])] += tmp
+    return result
+
+def _convolve_overlap_add(kernel, data, fft_shape, float_type, options):
+    """ Return linear convolution of kernel and data using overlap-add method.
+    """
+    task = fft_tasks.FFTTasks(fft_shape, float_type, options=options, real=True)
+    padded_kernel = numpy.zeros(fft_shape, data.dtype)
+    padded_kernel[tuple([slice(0, k) for k in kernel.shape])] = kernel
+    task.set_convolve_kernel(padded_kernel)
+    buf = task.get_buffers()[0]
+    out = numpy.empty(fft_shape, task.float_dtype)
+    result = numpy.zeros([s + k - 1 for k, s in zip(kernel.shape, data.shape)], data.dtype)
+    block_shape = [l - k + 1 for k, l in zip(kernel.shape, fft_shape)]
+    starts = [range(0, s, b) for s, b in zip(data.shape, block_shape)]
+    for start in itertools.product(*starts):
+        block = data[tuple([slice(i, i + b) for i, b in zip(start, block_shape)])]
+        buf[...] = 0
+        buf[tuple([slice(0, n) for n in block.shape])] = block
+        task.convolve(buf, out=out)
+        linear = tuple([slice(0, n + k - 1) for n, k in zip(block.shape, kernel.shape)])
+        result[tuple([slice(i, i + n + k - 1) for i, n, k in zip(start, block.shape, kernel.shape)])] += out[linear]
+    return result
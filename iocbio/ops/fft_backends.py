@@ -0,0 +1,304 @@
+"""Provides FFT backends for FFTTasks.
+
+An FFT backend creates forward and backward plans that transform
+data between the real (or complex) buffer and the complex buffer of
+`iocbio.ops.fft_tasks.FFTTasks`. The plans follow FFTW conventions:
+the ``execute()`` method of a plan computes the transform from the
+input buffer to the output buffer and the backward transform is not
+normalized. Backends that support batched transforms create also
+plans that transform the trailing axes of a stack of arrays in one
+call, see `FFTBackend.make_many_plans`.
+
+The following backends are supported:
+
+  fftw3
+    `PyFFTW3 <https://launchpad.net/pyfftw>`_ bindings to FFTW, uses
+    wisdom store of `iocbio.ops.fft_tasks`.
+  pyfftw
+    `pyFFTW <https://github.com/pyFFTW/pyFFTW>`_ bindings to FFTW.
+  scipy
+    ``scipy.fft`` module (scipy 1.4 or newer), uses ``workers``
+    for threads.
+  numpy
+    ``numpy.fft`` module, always available.
+
+When backend is not specified or is ``'auto'``, the available
+backends are timed on a small transform with the number of threads
+of the task and the fastest one is used. The selection is made once
+per process, float type and number of threads. The
+default backend can be specified with ``IOCBIO_FFT_BACKEND``
+environment variable.
+
+Examples
+--------
+
+  >>> from iocbio.ops.fft_backends import get_fft_backend
+  >>> backend = get_fft_backend('numpy')
+  >>> print backend.name
+  numpy
+
+"""
+
+from __future__ import division
+__all__ = ['FFTBackend', 'get_fft_backend', 'get_fft_backend_names']
+
+import os
+import time
+import numpy
+
+from ..utils import mul_seq, VERBOSE
+
+class FFTBackend(object):
+    """ Base class of FFT backends.
+
+    See also
+    --------
+    iocbio.ops.fft_backends
+    """
+
+    name = None
+    # when True then FFTTasks loads and saves FFTW wisdom
+    uses_wisdom = False
+    # when True then make_many_plans is implemented
+    supports_many = False
+
+    def is_available(self, float_type):
+        """ Return True when backend can be used for float type.
+        """
+        raise NotImplementedError
+
+    def make_plans(self, rcache, cache, flags, threads):
+        """ Return forward and backward plans between rcache and cache.
+
+        Parameters
+        ----------
+        rcache : :numpy:`ndarray`
+          Real or complex buffer. When rcache is real then cache
+          holds its half spectrum.
+        cache : :numpy:`ndarray`
+          Complex buffer, may be the same array as rcache.
+        flags : list
+          FFTW plan flags.
+        threads : int
+          Number of threads.
+
+        Returns
+        -------
+        fft_plan, ifft_plan : object
+          Objects with ``execute()`` method.
+        """
+        raise NotImplementedError
+
+    def make_many_plans(self, rcache, cache, flags, threads):
+        """ Return forward and backward plans of a stack of arrays.
+
+        The plans transform all axes but the first one, that is, the
+        arrays ``rcache[i]`` and ``cache[i]`` are transformed for all
+        ``i`` in one call. Parameters and return values are the
+        same as in `make_plans`.
+        """
+        raise NotImplementedError
+
+class FFTW3Backend(FFTBackend):
+
+    name = 'fftw3'
+    uses_wisdom = True
+
+    def get_module(self, float_type):
+        if float_type=='single':
+            import fftw3f as fftw
+        else:
+            import fftw3 as fftw
+        return fftw
+
+    def is_available(self, float_type):
+        try:
+            self.get_module(float_type)
+        except ImportError:
+            return False
+        return True
+
+    def make_plans(self, rcache, cache, flags, threads):
+        float_type = 'single' if cache.dtype==numpy.complex64 else 'double'
+        fftw = self.get_module(float_type)
+        fft_plan = fftw.Plan(rcache, cache, direction='forward', flags=flags, nthreads=threads)
+        ifft_plan = fftw.Plan(cache, rcache, direction='backward', flags=flags, nthreads=threads)
+        return fft_plan, ifft_plan
+
+class PyFFTWBackend(FFTBackend):
+
+    name = 'pyfftw'
+    supports_many = True
+
+    def is_available(self, float_type):
+        try:
+            import pyfftw
+        except ImportError:
+            return False
+        return True
+
+    def make_plans(self, rcache, cache, flags, threads, axes=None):
+        import pyfftw
+        if axes is None:
+            axes = tuple(range(rcache.ndim))
+        flags = tuple(['FFTW_%s' % (flag.upper()) for flag in flags])
+        fft_plan = pyfftw.FFTW(rcache, cache, axes=axes, direction='FFTW_FORWARD',
+                               flags=flags, threads=threads)
+        ifft_plan = pyfftw.FFTW(cache, rcache, axes=axes, direction='FFTW_BACKWARD',
+                                flags=flags, threads=threads)
+        return fft_plan, ifft_plan
+
+    def make_many_plans(self, rcache, cache, flags, threads):
+        return self.make_plans(rcache, cache, flags, threads, axes=tuple(range(1, rcache.ndim)))
+
+class NumpyPlan(object):
+    """ Plan that stores the result of func(src) in dst.
+    """
+
+    def __init__(self, func, src, dst, scale=None):
+        self.func = func
+        self.src = src
+        self.dst = dst
+        self.scale = scale
+
+    def execute(self):
+        result = self.func(self.src)
+        if self.scale is None:
+            self.dst[...] = result
+        else:
+            numpy.multiply(result, self.scale, self.dst)
+
+class NumpyBackend(FFTBackend):
+
+    name = 'numpy'
+    supports_many = True
+
+    def is_available(self, float_type):
+        return True
+
+    def get_functions(self, shape, threads, axes):
+        fft = numpy.fft
+        return (lambda x: fft.rfftn(x, axes=axes),
+                lambda x: fft.irfftn(x, s=shape, axes=axes),
+                lambda x: fft.fftn(x, axes=axes),
+                lambda x: fft.ifftn(x, axes=axes))
+
+    def make_plans(self, rcache, cache, flags, threads, axes=None):
+        if axes is None:
+            axes = tuple(range(rcache.ndim))
+        shape = tuple([rcache.shape[i] for i in axes])
+        rfftn, irfftn, fftn, ifftn = self.get_functions(shape, threads, axes)
+        # backward transforms are normalized, FFTW convention is not
+        scale = mul_seq(shape)
+        if rcache is cache:
+            return NumpyPlan(fftn, cache, cache), NumpyPlan(ifftn, cache, cache, scale)
+        return NumpyPlan(rfftn, rcache, cache), NumpyPlan(irfftn, cache, rcache, scale)
+
+    def make_many_plans(self, rcache, cache, flags, threads):
+        return self.make_plans(rcache, cache, flags, threads, axes=tuple(range(1, rcache.ndim)))
+
+class ScipyBackend(NumpyBackend):
+
+    name = 'scipy'
+
+    def is_available(self, float_type):
+        try:
+            import scipy.fft
+        except ImportError:
+            return False
+        return True
+
+    def get_functions(self, shape, threads, axes):
+        import scipy.fft as fft
+        return (lambda x: fft.rfftn(x, axes=axes, workers=threads),
+                lambda x: fft.irfftn(x, s=shape, axes=axes, workers=threads),
+                lambda x: fft.fftn(x, axes=axes, workers=threads),
+                lambda x: fft.ifftn(x, axes=axes, workers=threads))
+
+backends = [FFTW3Backend(), PyFFTWBackend(), ScipyBackend(), NumpyBackend()]
+
+# Maps (float_type, threads) to automatically selected backends.
+_auto_backends = {}
+
+def get_fft_backend_names():
+    """ Return the names of supported FFT backends.
+    """
+    return [backend.name for backend in backends]
+
+def time_fft_backend(backend, float_type, threads=1, shape=(32,64,64), repeats=3):
+    """ Return the time of forward and backward real transforms
+    computed with given number of threads.
+    """
+    if float_type=='single':
+        float_dtype, complex_dtype = numpy.float32, numpy.complex64
+    else:
+        float_dtype, complex_dtype = numpy.float64, numpy.complex128
+    rcache = numpy.empty(shape, float_dtype)
+    cache = numpy.empty(shape[:-1] + (shape[-1]//2+1,), complex_dtype)
+    fft_plan, ifft_plan = backend.make_plans(rcache, cache, ['estimate'], threads)
+    rcache[:] = numpy.random.rand(*shape)
+    best = None
+    for i in range(repeats):
+        start = time.time()
+        fft_plan.execute()
+        ifft_plan.execute()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def get_fft_backend(name=None, float_type='single', threads=1):
+    """ Return FFT backend.
+
+    Parameters
+    ----------
+    name : {None, 'auto', 'fftw3', 'pyfftw', 'scipy', 'numpy'}
+      Specify backend name. When None then use
+      ``IOCBIO_FFT_BACKEND`` environment variable value or
+      ``'auto'``.
+    float_type : {'single', 'double'}
+      Specify floating point type.
+    threads : int
+      Number of threads that the transforms use, automatic selection
+      times the backends with this number of threads.
+
+    Returns
+    -------
+    backend : FFTBackend
+
+    See also
+    --------
+    iocbio.ops.fft_backends
+    """
+    if name is None:
+        name = os.environ.get('IOCBIO_FFT_BACKEND', 'auto')
+    if name!='auto':
+        for backend in backends:
+            if backend.name==name:
+                if not backend.is_available(float_type):
+                    raise ImportError('FFT backend %r is not available for %s float type' % (name, float_type))
+                return backend
+        raise ValueError('Unknown FFT backend %r, expected one of %s' % (name, ', '.join(get_fft_backend_names())))
+    backend = _auto_backends.get((float_type, threads))
+    if backend is not None:
+        return backend
+    available = [backend for backend in backends if backend.is_available(float_type)]
+    backend = available[0]
+    if len(available)>1:
+        best = None
+        for candidate in available:
+            try:
+                elapsed = time_fft_backend(candidate, float_type, threads)
+            except Exception, msg:
+                if VERBOSE:
+                    print 'get_fft_backend: timing %s backend failed: %s' % (candidate.name, msg)
+                continue
+            if VERBOSE>1:
+                print 'get_fft_backend: %s backend took %.3g seconds' % (candidate.name, elapsed)
+            if best is None or elapsed < best:
+                best = elapsed
+                backend = candidate
+    if VERBOSE:
+        print 'get_fft_backend: using %s backend for %s float type and %s threads' % (backend.name, float_type, threads)
+    _auto_backends[float_type, threads] = backend
+    return backend
@@ -22,6 +22,42 @@ The following example illustrates the usage of ``convolve`` method:
   >>> print task.convolve([1,1,0,0,0,0,0,0]).round()
   [ 0. -0.  1.  3.  4.  3.  1. -0.]
 
+When the data is real, real-to-complex transforms can be used that
+compute only half of the Fourier spectrum (the last axis has size
+``shape[-1]//2+1``) and that are about two times faster and use about
+two times less memory:
+
+  >>> task = FFTTasks((8,), float_type='double', real=True)
+  >>> task.set_convolve_kernel([0,0,1,2,2,1,0,0])
+  >>> print task.fft([1,1,0,0,0,0,0,0]).shape
+  (5,)
+  >>> print task.convolve([1,1,0,0,0,0,0,0]).round()
+  [ 0. -0.  1.  3.  4.  3.  1. -0.]
+
+FFTW plans and buffers are kept in a process-wide pool
+``fft_plan_pool`` after a task is cleared or deleted, subsequent
+tasks with the same shape, float type, plan flags, number of
+threads and FFT backend reuse them without planning and allocation:
+
+  >>> from iocbio.ops.fft_tasks import fft_plan_pool
+  >>> fft_plan_pool.clear()
+  >>> stats0 = fft_plan_pool.get_statistics()
+  >>> task = FFTTasks((4,))
+  >>> del task
+  >>> task = FFTTasks((4,))
+  >>> stats = fft_plan_pool.get_statistics()
+  >>> print stats['hits'] - stats0['hits'], stats['misses'] - stats0['misses']
+  1 1
+
+Stacks of arrays with the same shape can be transformed and
+convolved at once:
+
+  >>> task = FFTTasks((8,), float_type='double', real=True)
+  >>> task.set_convolve_kernel([0,0,1,2,2,1,0,0])
+  >>> print task.convolve_many([[1,0,0,0,0,0,0,0], [1,1,0,0,0,0,0,0]]).round().astype(int)
+  [[0 0 1 2 2 1 0 0]
+   [0 0 1 3 4 3 1 0]]
+
 The following example illustrates finding optimal FFT sizes with different inputs:
   >>> for sz in [7,13,63,65,129,1023,1025,2049]:
       print '%s -> %s gives speed up %.3fx' % ((sz,)+FFTTasks.get_optimal_fft_size(sz, return_speedup=True, max_nof_tries=100))
@@ -39,54 +75,186 @@ The following example illustrates finding optimal FFT sizes with different input
 """
 
 from __future__ import division
-__all__ = ['FFTTasks']
+__all__ = ['FFTTasks', 'FFTPlanPool', 'fft_plan_pool']
 
 
 import os
 import numpy
+import socket
+from threading import Lock
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 from ..utils import mul_seq, VERBOSE, Options
+from .fft_backends import get_fft_backend
+
+class FFTPlanPool(object):
+    """ Process-wide pool of FFTW plans and their buffers.
+
+    A pool entry holds the real and complex buffers and the forward
+    and backward plans of a FFTTasks instance. An entry is checked
+    out by FFTTasks constructor and returned to the pool when the
+    task is cleared or deleted, so a pooled entry is never shared
+    between live tasks. Returned entries are kept until the total
+    memory of their buffers exceeds ``max_memory`` bytes, then the
+    least recently used entries are evicted.
+
+    See also
+    --------
+    iocbio.ops.fft_tasks, FFTTasks
+    """
+
+    def __init__(self, max_memory = 512*2**20):
+        self.max_memory = max_memory
+        self.entries = []    # list of (key, entry), most recently used last
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def get_entry_memory(entry):
+        rcache, cache = entry[:2]
+        if rcache is cache:
+            return cache.nbytes
+        return rcache.nbytes + cache.nbytes
+
+    def acquire(self, key):
+        """ Check out entry with key from the pool.
+
+        Returns
+        -------
+        entry : {None, tuple}
+          ``(rcache, cache, fft_plan, ifft_plan)`` or None when the
+          pool has no entry with key.
+        """
+        self.lock.acquire()
+        try:
+            for i in range(len(self.entries)-1, -1, -1):
+                if self.entries[i][0]==key:
+                    entry = self.entries.pop(i)[1]
+                    self.memory -= self.get_entry_memory(entry)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+        finally:
+            self.lock.release()
+
+    def release(self, key, entry):
+        """ Return entry with key to the pool.
+        """
+        self.lock.acquire()
+        try:
+            self.entries.append((key, entry))
+            self.memory += self.get_entry_memory(entry)
+            while self.entries and self.memory > self.max_memory:
+                key, entry = self.entries.pop(0)
+                self.memory -= self.get_entry_memory(entry)
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        """ Remove all entries from the pool.
+        """
+        self.lock.acquire()
+        try:
+            del self.entries[:]
+            self.memory = 0
+        finally:
+            self.lock.release()
+
+    def get_statistics(self):
+        """ Return a dictionary of pool hits, misses, evictions, the
+        number of pooled entries and their memory in bytes.
+        """
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    size=len(self.entries), memory=self.memory)
+
+fft_plan_pool = FFTPlanPool()
+
+# Directory of FFTW wisdom store, wisdom files are keyed by host name.
+wisdom_dir = os.environ.get('IOCBIO_FFTW_WISDOM_DIR', os.path.join('~', '.iocbio', 'fft_tasks'))
+# Maps wisdom file names to the wisdom that was last loaded or saved.
+_wisdom_files = {}
 
 class FFTTasks(object):
     """ Optimized cache for Fourier transforms using `FFTW <http://www.fftw.org/>`_ with operations.
 
+    Transforms are computed by a backend from `iocbio.ops.fft_backends`,
+    by default the fastest available one.
+
     See also
     --------
-    iocbio.ops.fft_tasks, __init__
+    iocbio.ops.fft_tasks, iocbio.ops.fft_backends, __init__
     """
 
-    _wisdoms = {}
+    @staticmethod
+    def get_wisdom_file_name(fftw, wisdom_dir=None):
+        """ Return the name of the wisdom file of the current host.
+
+        Parameters
+        ----------
+        fftw : module
+          Specify fftw3 or fftw3f module.
+        wisdom_dir : {None, str}
+          Specify the directory of wisdom store. When None then use
+          `iocbio.ops.fft_tasks.wisdom_dir`.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, load_wisdoms, save_wisdoms
+        """
+        if wisdom_dir is None:
+            wisdom_dir = globals()['wisdom_dir']
+        host = socket.gethostname() or 'localhost'
+        return os.path.join(os.path.expanduser(wisdom_dir), '%s_%s_wisdom_data.txt' % (host, fftw.__name__))
 
     @staticmethod
-    def load_wisdoms(_cache=[]):
-        """Load fftw wisdom from a disk.
+    def get_fftw_modules():
+        """ Return a list of available fftw3 and fftw3f modules.
+        """
+        modules = []
+        for name in ['fftw3', 'fftw3f']:
+            try:
+                modules.append(__import__(name))
+            except ImportError, msg:
+                if VERBOSE:
+                    print 'FFTTasks.get_fftw_modules: %s' % (msg)
+        return modules
+
+    @staticmethod
+    def load_wisdoms(wisdom_dir=None):
+        """Load fftw wisdom of the current host from a disk.
+
+        Wisdom files are loaded once per process and the wisdom
+        accumulated by the process is merged into the files at exit.
+
+        Parameters
+        ----------
+        wisdom_dir : {None, str}
+          Specify the directory of wisdom store. When None then use
+          `iocbio.ops.fft_tasks.wisdom_dir`.
 
         See also
         --------
-        iocbio.ops.fft_tasks, save_wisdom
+        iocbio.ops.fft_tasks, save_wisdoms
         """
-        if _cache:
-            return
         if VERBOSE>9:
             print 'Entering FFTTasks.load_wisdoms'
         if os.name=='nt':
             if VERBOSE:
                 print 'FFTTasks: load_wisdoms is disabled under windows'
             return
-        try:
-            import fftw3
-        except ImportError, msg:
-            fftw3 = None
-            print 'FFTTasks.load_wisdoms: %s' % (msg)
-        try:
-            import fftw3f
-        except ImportError, msg:
-            fftw3f = None
-            print 'FFTTasks.load_wisdoms: %s' % (msg)
-        for fftw in [fftw3, fftw3f]:
-            if fftw is None:
+        import atexit
+        for fftw in FFTTasks.get_fftw_modules():
+            wisdom_file_name = FFTTasks.get_wisdom_file_name(fftw, wisdom_dir)
+            if wisdom_file_name in _wisdom_files:
                 continue
-            wisdom_file_name = os.path.join('.iocbio','fft_tasks','%s_wisdom_data.txt' % (fftw.__name__))
             if os.path.isfile(wisdom_file_name):
                 if VERBOSE:
                     print 'Loading wisdom from file %r' % (wisdom_file_name),
@@ -96,59 +264,71 @@ class FFTTasks(object):
                         print 'ok'
                 except IOError, msg:
                     print '\nFailed to load wisdom from file %r: %s' % (wisdom_file_name, msg)
-                    continue
-                _cache.append(wisdom_file_name)
-                FFTTasks._wisdoms[wisdom_file_name] = fftw.export_wisdom_to_string()
+            _wisdom_files[wisdom_file_name] = fftw.export_wisdom_to_string()
+            atexit.register(FFTTasks.save_wisdom, fftw, wisdom_file_name)
+
     @staticmethod
-    def save_wisdoms(_cache=[]):
-        """Save fftw wisdom to a disk.
+    def save_wisdoms(wisdom_dir=None):
+        """Merge fftw wisdom of the current host to a disk.
+
+        Parameters
+        ----------
+        wisdom_dir : {None, str}
+          Specify the directory of wisdom store. When None then use
+          `iocbio.ops.fft_tasks.wisdom_dir`.
 
         See also
         --------
-        iocbio.ops.fft_tasks, load_wisdom
+        iocbio.ops.fft_tasks, load_wisdoms, save_wisdom
         """
-        if _cache:
-            return
         if VERBOSE>9:
             print 'Entering FFTTasks.save_wisdoms'
         if os.name=='nt':
             if VERBOSE:
                 print 'FFTTasks: save_wisdoms is disabled under windows'
             return
+        for fftw in FFTTasks.get_fftw_modules():
+            FFTTasks.save_wisdom(fftw, FFTTasks.get_wisdom_file_name(fftw, wisdom_dir))
+
+    @staticmethod
+    def save_wisdom(fftw, wisdom_file_name):
+        """Merge wisdom of fftw module to a file.
+
+        The file is locked while the wisdom from the file is merged
+        with the wisdom of the process and the result is written to
+        a temporary file that replaces the wisdom file atomically.
+        So, processes that exit at the same time do not lose each
+        other wisdom.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, save_wisdoms
+        """
+        wisdom = fftw.export_wisdom_to_string()
+        if wisdom==_wisdom_files.get(wisdom_file_name):
+            return
+        dirpath = os.path.dirname(wisdom_file_name)
+        if VERBOSE:
+            print 'Saving wisdom to file %r..' % (wisdom_file_name),
         try:
-            import fftw3
-        except ImportError, msg:
-            fftw3 = None
-            print 'FFTTasks.load_wisdoms: %s' % (msg)
-        try:
-            import fftw3f
-        except ImportError, msg:
-            fftw3f = None
-            print 'FFTTasks.load_wisdoms: %s' % (msg)
-        import atexit
-        for fftw in [fftw3, fftw3f]:
-            if fftw is None:
-                continue
-            wisdom_file_name = os.path.join('.iocbio','fft_tasks','%s_wisdom_data.txt' % (fftw.__name__))
-            dirpath = os.path.dirname(wisdom_file_name)
             if dirpath and not os.path.exists(dirpath):
                 os.makedirs(dirpath)
-            def save_wisdom(fftw=fftw, wisdom_file_name=wisdom_file_name):
-                wisdom = FFTTasks._wisdoms.get(wisdom_file_name)
-                if wisdom is not None and wisdom==fftw.export_wisdom_to_string():
-                    #print 'Wisdom for %s has not changed, saving is not needed.' % (fftw.__name__)
-                    return
-                if VERBOSE:
-                    print 'Saving wisdom to file %r..' % (wisdom_file_name),
-                try:
-                    fftw.export_wisdom_to_file (wisdom_file_name)
-                    if VERBOSE:
-                        print 'ok'
-                except Exception, msg:
-                    print '\nFailed to export wisdom to file %r: %s' % (wisdom_file_name, msg)
-            atexit.register(save_wisdom)
-            _cache.append(wisdom_file_name)
-            save_wisdom()
+            lock_file = open(wisdom_file_name + '.lock', 'w')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.path.isfile(wisdom_file_name):
+                    fftw.import_wisdom_from_file(wisdom_file_name)
+                tmp_file_name = '%s.%s.tmp' % (wisdom_file_name, os.getpid())
+                fftw.export_wisdom_to_file(tmp_file_name)
+                os.rename(tmp_file_name, wisdom_file_name)
+            finally:
+                lock_file.close()
+            _wisdom_files[wisdom_file_name] = fftw.export_wisdom_to_string()
+            if VERBOSE:
+                print 'ok'
+        except Exception, msg:
+            print '\nFailed to export wisdom to file %r: %s' % (wisdom_file_name, msg)
 
     flops_cache = {}
 
@@ -199,8 +379,23 @@ class FFTTasks(object):
             import fftw3f as fftw
             complex_dtype = numpy.complex64
         except ImportError:
-            import fftw3 as fftw
-            complex_dtype = numpy.complex128
+            try:
+                import fftw3 as fftw
+                complex_dtype = numpy.complex128
+            except ImportError:
+                # without FFTW flops, use the next 5-smooth size
+                optimal_size = size
+                while 1:
+                    n = optimal_size
+                    for p in [2, 3, 5]:
+                        while n % p == 0:
+                            n //= p
+                    if n==1:
+                        break
+                    optimal_size += 1
+                if return_speedup:
+                    return optimal_size, 1
+                return optimal_size
         max_size = 2**int(numpy.log2(size)+1)
         if max_nof_tries is not None:
             max_size = min (size+max_nof_tries, max_size)
@@ -224,7 +419,7 @@ class FFTTasks(object):
             return optimal_size, flops_cache[size] / flops_cache[optimal_size]
         return optimal_size
 
-    def __init__(self, shape, float_type=None, options = None):
+    def __init__(self, shape, float_type=None, options = None, real=False):
         """ Construct an instance of FFTTasks.
 
         Parameters
@@ -233,11 +428,19 @@ class FFTTasks(object):
           Specify array shape for FFT.
         float_type : {None, 'single', 'double'}
           Specify floating point type.
+        real : bool
+          When True then use real-to-complex and complex-to-real
+          transforms. Input data of `fft` and `convolve` methods
+          must be real and the Fourier transforms (including
+          convolve kernels) are stored as half spectra with shape
+          ``task.fourier_shape``.
         options : {None, `iocbio.utils.Options`}
           Specify command line options:
             options.float_type
             options.fftw_plan_flags
             options.fftw_threads
+            options.fftw_wisdom_dir
+            options.fft_backend
 
         See also
         --------
@@ -251,61 +454,140 @@ class FFTTasks(object):
         if float_type is None:
             float_type = options.get(float_type='single')
 
-        self.load_wisdoms()
+        if float_type not in ['single', 'double']:
+            raise NotImplementedError (`float_type`)
+        threads = getattr(options, 'fftw_threads', 1)
+        self.backend = backend = get_fft_backend(options.get(fft_backend=None), float_type, threads)
 
-        self.shape = shape
+        wisdom_dir = options.get(fftw_wisdom_dir=None)
+        if backend.uses_wisdom:
+            self.load_wisdoms(wisdom_dir)
+
+        self.shape = shape = tuple(shape)
         self.float_type = float_type
+        self.real = real
+        if real:
+            self.fourier_shape = shape[:-1] + (shape[-1]//2+1,)
+        else:
+            self.fourier_shape = shape
 
-        threads = getattr(options, 'fftw_threads', 1)
+        # number of threads is used also by element-wise kernels
+        self.nthreads = threads
 
         if float_type=='single':
-            import fftw3f as fftw # hint: on failure to import select double float type
-            cache = numpy.empty(shape, numpy.complex64)
             self.float_dtype = numpy.float32
             self.complex_dtype = numpy.complex64
-        elif float_type=='double':
-            import fftw3 as fftw
-            cache = numpy.empty(shape, numpy.complex128)
+        else:
             self.float_dtype = numpy.float64
             self.complex_dtype = numpy.complex128
-        else:
-            raise NotImplementedError (`float_type`)
 
-        self._cache = cache
-        self.fftw = fftw
+        self._wisdom_dir = wisdom_dir
+        self._plan_key = (shape, float_type, tuple(flags), threads, real, backend.name)
+        self._plan_entry = entry = self._acquire_plan_entry()
+        self._rcache, self._cache, self._fft_plan, self._ifft_plan = entry
+
+        self.convolve_kernel_fourier = None
+
+    def _get_plan_key(self, howmany=None):
+        if howmany is None:
+            return self._plan_key
+        return self._plan_key + (howmany,)
+
+    def _acquire_plan_entry(self, howmany=None):
+        """ Return buffers and plans from `fft_plan_pool` or create new ones.
+
+        When howmany is specified then the buffers have additional
+        first axis with length howmany and the plans transform the
+        stack of arrays in one call. The entry must be released to
+        `fft_plan_pool` with ``task._get_plan_key(howmany)`` key.
+        """
+        entry = fft_plan_pool.acquire(self._get_plan_key(howmany))
+        if entry is not None:
+            return entry
+        shape, float_type, flags, threads, real, backend_name = self._plan_key
+        flags = list(flags)
+        fourier_shape = self.fourier_shape
+        if howmany is not None:
+            shape = (howmany,) + shape
+            fourier_shape = (howmany,) + fourier_shape
+        cache = numpy.empty(fourier_shape, self.complex_dtype)
+        if real:
+            # _rcache holds real data, _cache holds its half spectrum
+            rcache = numpy.empty(shape, self.float_dtype)
+        else:
+            # transforms are computed in-place
+            rcache = cache
 
         if VERBOSE:
-            print 'Computing fftw wisdom (flags=%s, threads=%s, shape=%s, float=%s),'\
+            print 'Computing %s plans (flags=%s, threads=%s, shape=%s, float=%s, real=%s),'\
                 ' be patient, it may take a while..'\
-            % (flags, threads, shape, float_type), 
-        self._fft_plan = fftw.Plan(cache, cache, direction='forward', flags=flags, nthreads=threads)
-        self._ifft_plan = fftw.Plan(cache, cache, direction='backward', flags=flags, nthreads=threads)
+            % (backend_name, flags, threads, shape, float_type, real), 
+        if howmany is None:
+            fft_plan, ifft_plan = self.backend.make_plans(rcache, cache, flags, threads)
+        else:
+            fft_plan, ifft_plan = self.backend.make_many_plans(rcache, cache, flags, threads)
         if VERBOSE:
             print 'done'
 
-        self.save_wisdoms()
+        if self.backend.uses_wisdom:
+            self.save_wisdoms(self._wisdom_dir)
+        return (rcache, cache, fft_plan, ifft_plan)
 
-        self.convolve_kernel_fourier = None
+    def get_buffers(self):
+        """ Return the buffers of FFT transforms.
+
+        Data written to the real buffer can be passed to `fft` and
+        `convolve` methods without copying. The buffers are
+        overwritten by subsequent calls of task methods except
+        ``convolve(.., inplace=False)``.
+
+        Returns
+        -------
+        rbuffer, cbuffer : :numpy:`ndarray`
+          Buffers with shapes ``task.shape`` and ``task.fourier_shape``.
+          In complex mode, the buffers are the same array.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, fft, convolve
+        """
+        return self._rcache, self._cache
 
     def clear(self):
+        """ Release FFT plans and buffers to `fft_plan_pool`.
+        """
         if VERBOSE>9:
             print 'Entering %s.clear' % (self.__class__.__name__)
+        entry = self.__dict__.pop('_plan_entry', None)
+        if entry is not None:
+            fft_plan_pool.release(self._plan_key, entry)
         del self._fft_plan
         del self._ifft_plan
         del self._cache
+        del self._rcache
+
+    def __del__(self):
+        if fft_plan_pool is None:
+            return
+        entry = self.__dict__.get('_plan_entry')
+        if entry is not None:
+            fft_plan_pool.release(self._plan_key, entry)
 
-    def fft(self, data):
+    def fft(self, data, out=None):
         """Compute FFT of data.
 
         Parameters
         ----------
         data : :numpy:`ndarray`
           Input data of the same shape as ``task.shape``.
+        out : {None, :numpy:`ndarray`}
+          Array with shape ``task.fourier_shape`` where the result
+          is stored.
 
         Returns
         -------
         data_f : :numpy:`ndarray`
-          Fourier transform of data.
+          Fourier transform of data with shape ``task.fourier_shape``.
 
         See also
         --------
@@ -313,20 +595,26 @@ class FFTTasks(object):
         """
         if VERBOSE>9:
             print 'Entering %s.fft' % (self.__class__.__name__)
-        cache = self._cache
-        cache[:] = data
+        if data is not self._rcache:
+            self._rcache[:] = data
         self._fft_plan.execute()
-        return cache.copy()
+        if out is None:
+            return self._cache.copy()
+        out[...] = self._cache
+        return out
 
-    def ifft(self, data, asreal=False):
+    def ifft(self, data, asreal=False, out=None):
         """Compute inverse FFT of data.
 
         Parameters
         ----------
         data : :numpy:`ndarray`
-          Input data of the same shape as ``task.shape``.
+          Input data of the same shape as ``task.fourier_shape``.
         asreal : bool
-          Return real part of the result.
+          Return real part of the result. In real mode the result
+          is always real.
+        out : {None, :numpy:`ndarray`}
+          Array with shape ``task.shape`` where the result is stored.
 
         Returns
         -------
@@ -339,12 +627,119 @@ class FFTTasks(object):
         """
         if VERBOSE>9:
             print 'Entering %s.ifft' % (self.__class__.__name__)
-        cache = self._cache
-        cache[:] = data
+        if data is not self._cache:
+            self._cache[:] = data
         self._ifft_plan.execute()
+        rcache = self._rcache
+        if asreal or self.real:
+            rcache = rcache.real
+        return numpy.divide(rcache, mul_seq(rcache.shape), out)
+
+    def fft_many(self, data, out=None):
+        """Compute FFT of a stack of arrays.
+
+        When the FFT backend supports batched transforms then the
+        stack is transformed in one call using plans and buffers
+        from `fft_plan_pool`, otherwise the arrays are transformed
+        with the plan of the task one after another.
+
+        Parameters
+        ----------
+        data : :numpy:`ndarray`
+          Input data with shape ``(howmany,) + task.shape``.
+        out : {None, :numpy:`ndarray`}
+          Array with shape ``(howmany,) + task.fourier_shape`` where
+          the result is stored.
+
+        Returns
+        -------
+        data_f : :numpy:`ndarray`
+          Fourier transforms of the arrays in data.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, fft, ifft_many, convolve_many
+        """
+        if VERBOSE>9:
+            print 'Entering %s.fft_many' % (self.__class__.__name__)
+        data = numpy.asarray(data)
+        assert data.shape[1:]==self.shape,`data.shape, self.shape`
+        howmany = data.shape[0]
+        if out is None:
+            out = numpy.empty((howmany,)+self.fourier_shape, self.complex_dtype)
+        if self.backend.supports_many:
+            entry = self._acquire_plan_entry(howmany)
+            rcache, cache, fft_plan, ifft_plan = entry
+            try:
+                rcache[:] = data
+                fft_plan.execute()
+                out[...] = cache
+            finally:
+                fft_plan_pool.release(self._get_plan_key(howmany), entry)
+            return out
+        cache = self._cache
+        rcache = self._rcache
+        execute = self._fft_plan.execute
+        for i in xrange(howmany):
+            rcache[:] = data[i]
+            execute()
+            out[i] = cache
+        return out
+
+    def ifft_many(self, data, asreal=False, out=None):
+        """Compute inverse FFT of a stack of arrays.
+
+        Parameters
+        ----------
+        data : :numpy:`ndarray`
+          Input data with shape ``(howmany,) + task.fourier_shape``.
+        asreal : bool
+          Return real part of the result. In real mode the result
+          is always real.
+        out : {None, :numpy:`ndarray`}
+          Array with shape ``(howmany,) + task.shape`` where the
+          result is stored.
+
+        Returns
+        -------
+        data_if : :numpy:`ndarray`
+          Inverse Fourier transforms of the arrays in data.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, ifft, fft_many
+        """
+        if VERBOSE>9:
+            print 'Entering %s.ifft_many' % (self.__class__.__name__)
+        data = numpy.asarray(data)
+        assert data.shape[1:]==self.fourier_shape,`data.shape, self.fourier_shape`
+        asreal = asreal or self.real
+        howmany = data.shape[0]
+        if out is None:
+            out = numpy.empty((howmany,)+self.shape, self.float_dtype if asreal else self.complex_dtype)
+        if self.backend.supports_many:
+            entry = self._acquire_plan_entry(howmany)
+            rcache, cache, fft_plan, ifft_plan = entry
+            try:
+                cache[:] = data
+                ifft_plan.execute()
+                if asreal:
+                    rcache = rcache.real
+                numpy.divide(rcache, mul_seq(self.shape), out)
+            finally:
+                fft_plan_pool.release(self._get_plan_key(howmany), entry)
+            return out
+        cache = self._cache
+        rcache = self._rcache
         if asreal:
-            return cache.real / mul_seq(cache.shape)
-        return cache / mul_seq(cache.shape)
+            rcache = rcache.real
+        execute = self._ifft_plan.execute
+        for i in xrange(howmany):
+            cache[:] = data[i]
+            execute()
+            out[i] = rcache
+        out /= mul_seq(self.shape)
+        return out
 
     def set_convolve_kernel(self, kernel):
         """ Set convolve kernel.
@@ -360,10 +755,9 @@ class FFTTasks(object):
         """
         if VERBOSE>9:
             print 'Entering %s.set_convolve_kernel' % (self.__class__.__name__)
-        cache = self._cache
-        cache[:] = kernel
+        self._rcache[:] = kernel
         self._fft_plan.execute()
-        self.set_convolve_fourier_kernel(cache.copy())
+        self.set_convolve_fourier_kernel(self._cache.copy())
 
     def set_convolve_fourier_kernel(self, kernel_f):
         """ Set convolve kernel in Fourier transform.
@@ -372,6 +766,9 @@ class FFTTasks(object):
         ----------
         kernel_f : :numpy:`ndarray`
           Specify kernel in Fourier form for the `convolve` method.
+          In real mode, full spectrum with shape ``task.shape`` is
+          accepted as well as half spectrum with shape
+          ``task.fourier_shape``.
 
         See also
         --------
@@ -379,13 +776,15 @@ class FFTTasks(object):
         """
         if VERBOSE>9:
             print 'Entering %s.set_convolve_fourier_kernel' % (self.__class__.__name__)
-        assert kernel_f.shape==self.shape,`kernel_f.shape, self.shape`
+        if self.real and kernel_f.shape==self.shape:
+            kernel_f = kernel_f[...,:self.fourier_shape[-1]]
+        assert kernel_f.shape==self.fourier_shape,`kernel_f.shape, self.fourier_shape`
         kernel_f = kernel_f.astype(self.complex_dtype)
         self.convolve_kernel_fourier = kernel_f
-        self.convolve_kernel_fourier_normal = kernel_f / mul_seq(kernel_f.shape)
+        self.convolve_kernel_fourier_normal = kernel_f / mul_seq(self.shape)
         self.convolve_kernel_fourier_conj = kernel_f.conj()
 
-    def convolve(self, data, inplace=True):
+    def convolve(self, data, inplace=True, out=None):
         """Compute convolution of data and convolve kernel.
 
         Parameters
@@ -393,6 +792,14 @@ class FFTTasks(object):
           data : :numpy:`ndarray`
             Specify data to be convolved with kernel. Kernel must
             be specified with `set_convolve_kernel` methods.
+          inplace : bool
+            When False then the buffers returned by `get_buffers`
+            are preserved, the convolution is computed using a
+            second set of buffers and plans that is taken from
+            `fft_plan_pool` for the duration of the call.
+          out : {None, :numpy:`ndarray`}
+            Array with shape ``task.shape`` where the result is
+            stored.
 
         Returns
         -------
@@ -408,14 +815,79 @@ class FFTTasks(object):
         kernel_f = self.convolve_kernel_fourier_normal
         if kernel_f is None:
             raise TypeError ('Convolve kernel not specified')
+        if inplace:
+            entry = None
+            rcache, cache, fft_plan, ifft_plan = self._rcache, self._cache, self._fft_plan, self._ifft_plan
+        else:
+            entry = self._acquire_plan_entry()
+            rcache, cache, fft_plan, ifft_plan = entry
+        try:
+            if data is not rcache:
+                rcache[:] = data
+            fft_plan.execute()
+            cache *= kernel_f
+            ifft_plan.execute()
+            if out is None:
+                out = rcache.real.copy()
+            else:
+                out[...] = rcache.real
+        finally:
+            if entry is not None:
+                fft_plan_pool.release(self._plan_key, entry)
+        return out
+
+    def convolve_many(self, data, out=None):
+        """Compute convolutions of a stack of arrays and convolve kernel.
+
+        Parameters
+        ----------
+        data : :numpy:`ndarray`
+          Input data with shape ``(howmany,) + task.shape``. Kernel
+          must be specified with `set_convolve_kernel` methods.
+        out : {None, :numpy:`ndarray`}
+          Array with shape ``(howmany,) + task.shape`` where the
+          result is stored.
+
+        Returns
+        -------
+        result : :numpy:`ndarray`
+          The results of convolutions.
+
+        See also
+        --------
+        iocbio.ops.fft_tasks, convolve, fft_many
+        """
+        if VERBOSE>9:
+            print 'Entering %s.convolve_many' % (self.__class__.__name__)
+        kernel_f = self.convolve_kernel_fourier_normal
+        if kernel_f is None:
+            raise TypeError ('Convolve kernel not specified')
+        data = numpy.asarray(data)
+        assert data.shape[1:]==self.shape,`data.shape, self.shape`
+        if out is None:
+            out = numpy.empty(data.shape, self.float_dtype)
+        if self.backend.supports_many:
+            howmany = data.shape[0]
+            entry = self._acquire_plan_entry(howmany)
+            rcache, cache, fft_plan, ifft_plan = entry
+            try:
+                rcache[:] = data
+                fft_plan.execute()
+                cache *= kernel_f
+                ifft_plan.execute()
+                out[...] = rcache.real
+            finally:
+                fft_plan_pool.release(self._get_plan_key(howmany), entry)
+            return out
         cache = self._cache
-        if not inplace:
-            orig_cache = cache.copy()
-        cache[:] = data
-        self._fft_plan.execute()
-        cache *= kernel_f
-        self._ifft_plan.execute()
-        result = cache.real.copy()
-        if not inplace:
-            self._cache[:] = orig_cache
-        return result
+        rcache = self._rcache
+        rcache_real = rcache.real
+        fft_execute = self._fft_plan.execute
+        ifft_execute = self._ifft_plan.execute
+        for i in xrange(data.shape[0]):
+            rcache[:] = data[i]
+            fft_execute()
+            cache *= kernel_f
+            ifft_execute()
+            out[i] = rcache_real
+        return out
@@ -1,16 +1,28 @@
 
-__all__ = ['convolve_discrete_gauss']
+__all__ = ['convolve_discrete_gauss', 'discrete_gauss_scale_space',
+           'get_discrete_gauss_multipliers']
 
 import numpy
 
+from .fft_tasks import FFTTasks
+from .. import utils
+
+try:
+    from . import discrete_gauss_ext
+except ImportError:
+    # requires FFTW3 library
+    discrete_gauss_ext = None
+
 def convolve_discrete_gauss(seq, t):
     """ Return convolved sequence with discrete Gaussian kernel.
 
     Parameters
     ----------
     seq : numpy.ndarray
-    t : float
-      Scale parameter.
+    t : {float, sequence}
+      Scale parameter. When t is a sequence then the result is an
+      array of convolved sequences, one for each scale parameter,
+      that are computed with a single forward FFT.
 
     Notes
     -----
@@ -28,12 +40,126 @@ def convolve_discrete_gauss(seq, t):
     ----------
     http://www.nada.kth.se/~tony/abstracts/Lin90-PAMI.html
     http://en.wikipedia.org/wiki/Scale-space_implementation
+
+    See also
+    --------
+    discrete_gauss_scale_space
+    """
+    seq = numpy.asarray(seq)
+    if numpy.isscalar(t):
+        return discrete_gauss_scale_space(seq, [t]).next()[1]
+    return numpy.array([r for t, r in discrete_gauss_scale_space(seq, t)])
+
+def get_discrete_gauss_multipliers(shape, t, real=False):
+    """ Return Fourier multipliers of N-D discrete Gaussian kernel.
+
+    The Fourier transform of separable discrete Gaussian kernel is
+    ``m[0][k0]*m[1][k1]*..`` where ``m[i][k] = exp((cos(2*pi*k/N)-1)*t[i])``
+    and ``N=shape[i]``.
+
+    Parameters
+    ----------
+    shape : tuple
+      Shape of data.
+    t : {float, tuple}
+      Scale parameter, same for all axes or one for each axis.
+    real : bool
+      When True then the multipliers correspond to the half
+      spectrum of real-to-complex transform.
+
+    Returns
+    -------
+    multipliers : list
+      A list of arrays with shapes ``(N, 1, .., 1)``, ``(1, N, 1, ..)``
+      and so on that can be broadcasted to the shape of Fourier
+      transform.
+
+    See also
+    --------
+    discrete_gauss_scale_space
+    """
+    rank = len(shape)
+    if numpy.isscalar(t):
+        t = (t,) * rank
+    if len(t) != rank:
+        raise ValueError('scale parameter must have %s items, got %s' % (rank, len(t)))
+    multipliers = []
+    for i, (n, ti) in enumerate(zip(shape, t)):
+        theta = 2*numpy.pi*numpy.fft.fftfreq(n)
+        if real and i==rank-1:
+            theta = theta[:n//2+1]
+        m = numpy.exp((numpy.cos(theta)-1)*ti)
+        multipliers.append(m.reshape((1,)*i + (len(m),) + (1,)*(rank-i-1)))
+    return multipliers
+
+def discrete_gauss_scale_space(data, scales, extrema=None, threshold=None,
+                               max_count=None, options=None):
+    """ Iterate over convolutions of data with discrete Gaussian kernels.
+
+    The Fourier transform of data is computed once, the results for
+    different scales are obtained by multiplying it with separable
+    discrete Gaussian multipliers (see `get_discrete_gauss_multipliers`)
+    followed by an inverse transform.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+    scales : sequence
+      Scale parameters. Each item can be float (same scale for all
+      axes) or a tuple with one scale for each axis.
+    extrema : {None, 'maxima', 'minima'}
+      When specified then yield local extrema of the convolutions
+      instead of convolutions, see
+      :func:`iocbio.ops.local_extrema.find_local_maxima`. Periodic
+      boundary conditions are used.
+    threshold, max_count : {None, float}
+      Parameters to local extrema finder.
+    options : {`iocbio.utils.Options`, None}
+      options.float_type defines FFT algorithms floating point type:
+      ``'single'`` (32-bit float) or ``'double'`` (64-bit float).
+
+    Returns
+    -------
+    generator
+      A generator of ``(t, result)`` pairs where t is the item of
+      scales and result is a convolution of data (or its local
+      extrema).
+
+    See also
+    --------
+    convolve_discrete_gauss, get_discrete_gauss_multipliers
     """
-    n = len(seq)
-    fseq = numpy.fft.fft (seq)
-    theta = 2*numpy.pi*numpy.fft.fftfreq(n)
-    fker = numpy.exp((numpy.cos(theta)-1)*t)
-    fres = fseq * fker
-    res = numpy.fft.ifft (fres)
-    res = res.real
-    return res
+    if options is None:
+        options = utils.Options()
+    else:
+        options = utils.Options(options)
+    float_type = options.get(float_type='double')
+    if extrema is not None:
+        from .local_extrema import find_local_maxima, find_local_minima
+        find_extrema = dict(maxima=find_local_maxima, minima=find_local_minima)[extrema]
+    else:
+        find_extrema = None
+    data = numpy.asarray(data)
+    scales = list(scales)
+    real = not numpy.iscomplexobj(data)
+    if real and data.ndim==1 and len(scales)==1 and float_type=='double' \
+            and discrete_gauss_ext is not None and numpy.isscalar(scales[0]):
+        # discrete_gauss_ext avoids FFTTasks overhead for single
+        # scale, it modifies its argument in-situ
+        result = discrete_gauss_ext.convolve(numpy.array(data, dtype=numpy.float64), float(scales[0]))
+        if find_extrema is not None:
+            result = find_extrema(result, threshold, 'periodic', max_count)
+        yield scales[0], result
+        return
+    task = FFTTasks(data.shape, float_type, options=options, real=real)
+    fdata = task.fft(data)
+    cbuffer = task.get_buffers()[1]
+    for t in scales:
+        multipliers = get_discrete_gauss_multipliers(data.shape, t, real=real)
+        numpy.multiply(fdata, multipliers[0], cbuffer)
+        for m in multipliers[1:]:
+            cbuffer *= m
+        result = task.ifft(cbuffer, asreal=True)
+        if find_extrema is not None:
+            result = find_extrema(result, threshold, 'periodic', max_count)
+        yield t, result
@@ -0,0 +1,109 @@
+"""Provides functions for finding local extrema.
+
+A point of an array is a local maximum (minimum) when its value is
+greater (smaller) than a threshold and none of its neighbors in the
+``3**rank`` neighborhood has greater (smaller) value. The functions
+:func:`find_local_maxima` and :func:`find_local_minima` return the
+found extrema as a structured array that is ordered by the values of
+extrema. Arrays with rank up to 4 are supported.
+
+Example
+-------
+
+The following example finds five highest peaks of an image::
+
+  from numpy import *
+  from iocbio.ops.local_extrema import find_local_maxima
+  x, y = ogrid[0:10:100j, 0:10:100j]
+  data = sin(x)*cos(y)
+  peaks = find_local_maxima(data, threshold=0, max_count=5)
+  print peaks['value'], peaks['index']
+
+"""
+# Author: Pearu Peterson
+# Created: December 2010
+
+__all__ = ['find_local_maxima', 'find_local_minima']
+
+import numpy
+
+try:
+    from . import local_extrema_ext
+except ImportError, msg:
+    print msg
+
+boundary_conditions = dict(constant=0, finite=1, periodic=2, reflective=3)
+
+def _find_local_extrema(data, threshold, boundary, max_count, threads, find_minima):
+    if threshold is None:
+        threshold = (numpy.inf if find_minima else -numpy.inf)
+    if max_count is None:
+        max_count = -1
+    if not isinstance(data, numpy.ndarray):
+        data = numpy.asarray(data)
+    values, indices = local_extrema_ext.find_local_extrema(data, float(threshold), boundary_conditions[boundary],
+                                                           int(find_minima), int(max_count), int(threads))
+    result = numpy.empty(len(values), dtype=[('value', numpy.float64), ('index', numpy.intp, (data.ndim,))])
+    result['value'] = values
+    result['index'] = indices
+    return result
+
+def find_local_maxima(data, threshold=None, boundary='constant', max_count=None, threads=0):
+    """ Find local maxima of data.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+    threshold : {None, float}
+      Only points with values greater than threshold are considered.
+    boundary : {'constant', 'finite', 'periodic', 'reflective'}
+      Boundary condition for neighbors of boundary points. With
+      ``'finite'``, boundary points are never extrema.
+    max_count : {None, int}
+      When specified, return at most max_count greatest maxima.
+    threads : int
+      Number of threads used for processing slabs of data. When 0
+      then the number of processors is used.
+
+    Returns
+    -------
+    maxima : numpy.ndarray
+      Structured array with fields ``value`` and ``index`` (with
+      shape ``(len(maxima), data.ndim)``) ordered by decreasing
+      values. Maxima with equal values are in raster order.
+
+    See also
+    --------
+    :mod:`iocbio.ops.local_extrema`, find_local_minima
+    """
+    return _find_local_extrema(data, threshold, boundary, max_count, threads, False)
+
+def find_local_minima(data, threshold=None, boundary='constant', max_count=None, threads=0):
+    """ Find local minima of data.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+    threshold : {None, float}
+      Only points with values smaller than threshold are considered.
+    boundary : {'constant', 'finite', 'periodic', 'reflective'}
+      Boundary condition for neighbors of boundary points. With
+      ``'finite'``, boundary points are never extrema.
+    max_count : {None, int}
+      When specified, return at most max_count smallest minima.
+    threads : int
+      Number of threads used for processing slabs of data. When 0
+      then the number of processors is used.
+
+    Returns
+    -------
+    minima : numpy.ndarray
+      Structured array with fields ``value`` and ``index`` (with
+      shape ``(len(minima), data.ndim)``) ordered by increasing
+      values. Minima with equal values are in raster order.
+
+    See also
+    --------
+    :mod:`iocbio.ops.local_extrema`, find_local_maxima
+    """
+    return _find_local_extrema(data, threshold, boundary, max_count, threads, True)
@@ -67,13 +67,33 @@ to enable the FFT algorithm in regression::
   x = arange(0,2*pi,0.01)
   data = 50+7*sin(x)+5*sin(2*x)  
   data_estimate = regress(data, (0.01, ), method='average',\
-    kernel='tricube', boundary='periodic', enable_fft=True)
+    kernel='tricube', boundary='periodic', enable_fft=True,
+    return_gradient=False)
   # this is approximately 6x faster than with enable_fft=False
 
 Note that such a speed up is effective only when the size of input
 array is relatively large or the kernel is relatively wide (scales are
 very small). Otherwise direct regression (``enable_fft=False``) might
-still be faster.
+still be faster. With ``enable_fft='auto'`` the algorithm is chosen
+by a cost model, see :func:`get_regress_method`. The spectra of
+regression kernels are cached for repeated calls with the same data
+shape.
+
+Fast regression with uniform kernel
+-----------------------------------
+
+With ``kernel='uniform'`` the :func:`regress` function computes
+kernel sums as differences of prefix sums along the last axis, for
+all smoothing methods and boundary conditions. The kernel support is
+split into segments along the last axis, one per offset of the
+leading axes, so the cost per data point is proportional to
+``k**(rank-1)`` where ``k`` is the kernel width; with ellipsoid
+support in 2D and 3D the cost still grows with the kernel width. In
+1D, and for averaging with box support (``support='box'``) in any
+rank, the kernel sums are computed with prefix sums one axis at a
+time and the cost per data point does not depend on the kernel
+width. For example, the background field estimation in
+:func:`iocbio.microscope.psf.spots_to_psf` uses this method.
 
 """
 # Author: Pearu Peterson
@@ -82,8 +102,11 @@ still be faster.
 __all__ = ['regress', 'kernel']
 
 import sys
+import numpy
+from scipy import fftpack
 
 from .. import utils
+from . import fft_tasks
 
 try:
     from . import regress_ext
@@ -94,7 +117,18 @@ kernel_types = dict (epanechnikov=0, uniform=1,
                      triangular = 2, quartic=3,
                      triweight=4, tricube=5, gaussian=6)
 
-def kernel (scales, kernel = 'uniform'):
+smoothing_methods = dict(average=0, 
+                         linear=1)
+
+boundary_conditions = dict(constant=0,   # out of boundary points are equal to closest boundary point
+                           finite = 1,   # ignore out of boundary points
+                           periodic=2,   # periodic boundaries
+                           reflective=3, # boundary is a mirror
+                           )
+
+kernel_supports = ['ellipsoid', 'box']
+
+def kernel (scales, kernel = 'uniform', support = 'ellipsoid'):
     """ Calculate regression kernel.
 
     Parameters
@@ -114,6 +148,12 @@ def kernel (scales, kernel = 'uniform'):
       definitions. Available kernels are visualized also in
       :mod:`iocbio.ops.regression`.
 
+    support : {'ellipsoid', 'box'}
+      Kernel support type. The values of ``'ellipsoid'`` kernel
+      depend on the scaled distance from the kernel center. The
+      ``'box'`` kernel is a product of 1D kernels and it is
+      separable.
+
     Returns
     -------
     kernel_data : numpy.ndarray
@@ -132,15 +172,178 @@ def kernel (scales, kernel = 'uniform'):
     --------
     :mod:`iocbio.ops.regression`, regress
     """
+    if support=='box':
+        return get_box_kernel(scales, kernel)
     return regress_ext.kernel(tuple(scales), kernel_types[kernel])
 
+def get_box_kernel(scales, kernel = 'uniform'):
+    """ Return box support kernel as outer product of 1D kernels.
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, kernel, get_kernels_1d
+    """
+    result = 1
+    for k in get_kernels_1d(scales, kernel):
+        result = numpy.multiply.outer(result, k)
+    return result
+
+def get_kernels_1d(scales, kernel = 'uniform'):
+    """ Return normalized 1D kernels of a separable (box support) kernel.
+
+    Kernel values at node points with scaled distance larger than 1
+    are set to zero, as in `regress`.
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, kernel
+    """
+    kernels = []
+    for scale in scales:
+        k = regress_ext.kernel((scale,), kernel_types[kernel])
+        n = len(k)//2
+        k[abs(numpy.arange(-n, n+1)*scale) > 1] = 0
+        kernels.append(k / k.sum())
+    return kernels
+
+def get_separable_kernel(kernel_data, rtol=1e-10):
+    """ Return 1D factors of a separable kernel.
+
+    Parameters
+    ----------
+    kernel_data : numpy.ndarray
+      Kernel values.
+    rtol : float
+      Relative tolerance of comparing kernel with the outer product
+      of its 1D factors.
+
+    Returns
+    -------
+    kernels : {list, None}
+      List of 1D kernels whose outer product is equal to kernel_data
+      or None when kernel is not separable.
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, regress
+    """
+    kernel_data = numpy.asarray(kernel_data, dtype=numpy.float64)
+    total = kernel_data.sum()
+    if total==0:
+        return None
+    kernels = []
+    product = 1
+    for axis in range(kernel_data.ndim):
+        other_axes = tuple([i for i in range(kernel_data.ndim) if i!=axis])
+        k = kernel_data.sum(axis=other_axes) / total if other_axes else kernel_data / total
+        kernels.append(k)
+        product = numpy.multiply.outer(product, k)
+    if abs(product*total - kernel_data).max() > rtol * abs(kernel_data).max():
+        return None
+    return kernels
+
+def get_regress_kernel(scales, kernel = 'uniform'):
+    """ Return kernel that `regress` uses with ellipsoid support.
+
+    Differs from `kernel` by zero values at node points with scaled
+    distance larger than 1.
+    """
+    kernel_data = regress_ext.kernel(tuple(scales), kernel_types[kernel])
+    r2 = 0
+    for axis, scale in enumerate(scales):
+        n = kernel_data.shape[axis]//2
+        d = numpy.arange(-n, n+1) * scale
+        r2 = numpy.add.outer(r2, d*d)
+    kernel_data[r2 > 1] = 0
+    return kernel_data
+
+def regress_separable(data, kernels, boundary='finite'):
+    """ Average data with a separable kernel, one axis at a time.
+
+    1D kernels that are constant within their support, except for
+    the end points, are applied with prefix sums, the cost per data
+    point does not depend on the kernel width. Other 1D kernels are
+    applied with direct summation.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+    kernels : list
+      1D kernels for each axis of data.
+    boundary : {'constant', 'finite', 'periodic', 'reflective'}
+
+    Returns
+    -------
+    new_data : numpy.ndarray
+      Averaged data with the dtype of input data.
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, regress
+    """
+    result = data
+    for axis, k in enumerate(kernels):
+        uniform = get_uniform_1d(k)
+        if uniform is not None:
+            m, end_weight = uniform
+            result = regress_ext.uniform_1d(result, axis, m, end_weight, boundary_conditions[boundary])
+        else:
+            result = regress_ext.average_1d(result, axis, k, boundary_conditions[boundary])
+    return _astype(result, data.dtype)
+
+def get_uniform_1d(k, rtol=1e-10):
+    """ Return half-width and end point weight of a uniform 1D kernel.
+
+    Parameters
+    ----------
+    k : numpy.ndarray
+      1D kernel with odd size.
+    rtol : float
+      Relative tolerance of comparing kernel values.
+
+    Returns
+    -------
+    m, end_weight : {tuple, None}
+      Kernel is ``k[c+t]/k[c] == 1`` for ``|t|<m`` and ``end_weight``
+      for ``|t|==m`` and zero otherwise, ``c`` is the center of the
+      kernel. None is returned when kernel has other form.
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, regress_separable
+    """
+    k = numpy.asarray(k, dtype=numpy.float64)
+    c = len(k)//2
+    if k[c] <= 0:
+        return None
+    k = k / k[c]
+    nonzero = numpy.nonzero(k)[0]
+    m = c - nonzero[0]
+    if nonzero[-1] != c + m:
+        return None
+    end_weight = k[c - m]
+    expected = numpy.zeros_like(k)
+    expected[c-m:c+m+1] = 1
+    expected[c-m] = expected[c+m] = end_weight
+    if abs(k - expected).max() > rtol:
+        return None
+    return m, end_weight
+
+def _astype(arr, dtype):
+    if arr.dtype==dtype:
+        return arr
+    return arr.astype(dtype)
+
 def regress(data, scales,
             kernel='uniform', 
             method='average',
             boundary='finite',
             verbose = True,
             options = None,
-            enable_fft = False):
+            enable_fft = False,
+            support = 'ellipsoid',
+            threads = None,
+            return_gradient = True):
     """
     Estimate a scalar field from noisy observations (data).
 
@@ -190,17 +393,42 @@ def regress(data, scales,
       | reflective         | data[N + i] = data[N - i], data[-i] = data[i] |
       +--------------------+-----------------------------------------------+
 
-    verbose : bool
+    verbose : {bool, callable}
       When True then show the progress of computations to terminal.
+      When callable then it is called as ``verbose(fmt, *args)`` to
+      report progress, at most twice per second.
 
     options : `iocbio.utils.Options`
       Specify regression parameters from command line. This will override
       parameters specified in function call. The following options attributes
-      are used: ``options.kernel``, ``options.method``, ``options.boundary``.
+      are used: ``options.kernel``, ``options.method``, ``options.boundary``,
+      ``options.kernel_support``, ``options.regress_threads``,
+      ``options.float_type`` (FFT computations).
 
-    enable_fft : bool
+    enable_fft : {False, True, 'auto'}
       When True and with periodic boundary conditions and averaging method use
-      FFT to compute regression data.
+      FFT to compute regression data. When 'auto' then FFT is used when
+      it is estimated to be faster than direct computation, see
+      `get_regress_method`.
+
+    support : {'ellipsoid', 'box'}
+      Kernel support type, see `kernel`. Averaging with separable
+      kernels (box support or kernels that are detected to be
+      products of 1D kernels) is computed one axis at a time, using
+      ``k`` instead of ``k**rank`` operations per data point where
+      ``k`` is the kernel size, for uniform kernel the number of
+      operations does not depend on ``k``. Box support is
+      implemented for averaging method and for uniform kernel.
+
+    threads : {int, None}
+      Specify the number of threads used by the direct regression
+      algorithm. Each thread processes a slab of rows. When 0 then all
+      available processors are used. Default is 1 or
+      ``options.regress_threads``.
+
+    return_gradient : bool
+      When False then gradient is not computed and only regression
+      data is returned.
 
     Returns
     -------
@@ -208,25 +436,20 @@ def regress(data, scales,
       Regression data.
     new_data_grad : numpy.ndarray
       Gradient of regression data only if method=='linear', otherwise
-      None is returned.
+      None is returned. Returned only when return_gradient is True.
 
     See also
     --------
     :mod:`iocbio.ops.regression`, kernel
     """
-    smoothing_methods = dict(average=0, 
-                             linear=1)
-
-    boundary_conditions = dict(constant=0,   # out of boundary points are equal to closest boundary point
-                               finite = 1,   # ignore out of boundary points
-                               periodic=2,   # periodic boundaries
-                               reflective=3, # boundary is a mirror
-                               )
     if options is None:
         options = utils.Options()
     kernel = options.get(kernel=kernel)
     method = options.get(method=method)
     boundary = options.get(boundary=boundary)
+    support = options.get(kernel_support=support)
+    if threads is None:
+        threads = options.get(regress_threads=1)
 
     if kernel not in kernel_types:
         raise ValueError('kernel type must be %s but got %s' \
@@ -236,22 +459,158 @@ def regress(data, scales,
                              % ('|'.join(map (str, smoothing_methods)), method))
     if boundary not in boundary_conditions:
         raise ValueError('boundary condition must be %s but got %s' \
-                             % ('|'.join(map (str, bondary_conditions)), boundary))
-    if verbose:
+                             % ('|'.join(map (str, boundary_conditions)), boundary))
+    if support not in kernel_supports:
+        raise ValueError('kernel support must be %s but got %s' \
+                             % ('|'.join(kernel_supports), support))
+    if support=='box' and method!='average' and kernel!='uniform':
+        raise ValueError('box kernel support is implemented only for average method or uniform kernel')
+    if callable(verbose):
+        write_func = verbose
+    elif verbose:
         def write_func(fmt, *args):
             sys.stdout.write(fmt % args)
             sys.stdout.flush()
     else:
         write_func = None
 
-    if enable_fft and method=='average' and boundary=='periodic':
-        kernel_values = regress_ext.kernel(tuple(scales), kernel_types[kernel])
-        from .convolution import convolve
-        return convolve(kernel_values, data, kernel_background = 0, options=options)
+    regress_method = get_regress_method(data.shape, scales, kernel, method, boundary, support, enable_fft)
+
+    if regress_method=='fft':
+        result = regress_fft(data, scales, kernel, support, options)
+        if enable_fft=='auto':
+            result = _astype(result, data.dtype)
+        grad = None
+    elif regress_method=='uniform':
+        result, grad = regress_ext.regress_uniform(data, tuple(scales),
+                                                   smoothing_methods[method], boundary_conditions[boundary],
+                                                   int(support=='box'), int(return_gradient))
+        result = _astype(result, data.dtype)
+        if grad is not None:
+            grad = _astype(grad, data.dtype)
+    elif regress_method=='separable':
+        if support=='box' or len(scales)==1:
+            kernels = get_kernels_1d(scales, kernel)
+        else:
+            kernels = get_separable_kernel(get_regress_kernel(scales, kernel))
+        result, grad = regress_separable(data, kernels, boundary), None
+    else:
+        result, grad = regress_ext.regress (data, tuple(scales), kernel_types[kernel],
+                                            smoothing_methods[method], boundary_conditions[boundary],
+                                            write_func, threads, int(return_gradient))
+    if return_gradient:
+        return result, grad
+    return result
+
+def get_regress_method(data_shape, scales, kernel='uniform', method='average', boundary='finite',
+                       support='ellipsoid', enable_fft='auto'):
+    """ Return regression algorithm.
+
+    The cost model estimates the time per data point of the available
+    algorithms: direct summation over kernel support points, uniform
+    kernel sums over kernel segments along the last axis (see
+    `regress`), separable averaging with 1D kernels, and FFT
+    convolution that is proportional to ``log2(N)`` where ``N`` is
+    the size of data. The FFT algorithm is used only for averaging
+    method with periodic boundary conditions.
+
+    Parameters
+    ----------
+    data_shape, scales : tuple
+    kernel, method, boundary, support : str
+      See `regress`.
+    enable_fft : {False, True, 'auto'}
+      When True then FFT algorithm is used whenever possible, when
+      'auto' then FFT algorithm is used when it is estimated to be
+      the fastest.
+
+    Returns
+    -------
+    regress_method : {'direct', 'uniform', 'separable', 'fft'}
 
-    result, grad = regress_ext.regress (data, tuple(scales), kernel_types[kernel],
-                                        smoothing_methods[method], boundary_conditions[boundary],
-                                        write_func)
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, regress
+    """
+    rank = len(scales)
+    kdims = [2*int(numpy.ceil(1/s))+1 for s in scales]
+    fft_possible = method=='average' and boundary=='periodic'
+    if enable_fft is True and fft_possible:
+        return 'fft'
+    # time per data point in nanoseconds, measured on 2D and 3D data
+    costs = []
+    volume = {1:2, 2:numpy.pi, 3:4*numpy.pi/3}[rank] / utils.mul_seq(scales)
+    if support=='ellipsoid':
+        costs.append((12 * (volume + 1), 'direct'))
+    if kernel=='uniform':
+        if rank==1:
+            nof_segments = 1
+        else:
+            nof_segments = {2:2, 3:numpy.pi}[rank] / utils.mul_seq(scales[:-1])
+        costs.append((12 * nof_segments + 20, 'uniform'))
     if method=='average':
-        return result, None
-    return result, grad
+        if kernel=='uniform' and (support=='box' or rank==1):
+            # prefix sums along each axis, see regress_separable
+            costs.append((15 * rank, 'separable'))
+        elif support=='box' or rank==1 \
+                or get_separable_kernel(get_regress_kernel(scales, kernel)) is not None:
+            costs.append((2.5 * sum(kdims), 'separable'))
+    if enable_fft=='auto' and fft_possible \
+            and not [1 for k, s in zip(kdims, data_shape) if k>s]:
+        N = utils.mul_seq(data_shape)
+        costs.append((3 * numpy.log2(max(N, 2)) + 10, 'fft'))
+    return min(costs)[1]
+
+# Maps (shape, scales, kernel, support, float_type) to kernel
+# spectra, see regress_fft. The order list holds the keys, most
+# recently used last.
+kernel_spectrum_cache = {}
+kernel_spectrum_cache_order = []
+kernel_spectrum_cache_size = 8
+
+def regress_fft(data, scales, kernel='uniform', support='ellipsoid', options=None):
+    """ Compute averaging regression with periodic boundary conditions
+    using FFT algorithm.
+
+    The spectrum of the regression kernel is cached for repeated calls
+    with the same data shape, scales and kernel.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+    scales : tuple
+    kernel, support : str
+      See `regress`.
+    options : {`iocbio.utils.Options`, None}
+      options.float_type defines FFT algorithms floating point type.
+
+    Returns
+    -------
+    new_data : numpy.ndarray
+
+    See also
+    --------
+    :mod:`iocbio.ops.regression`, regress
+    """
+    if options is None:
+        options = utils.Options()
+    float_type = options.get(float_type='double')
+    task = fft_tasks.FFTTasks(data.shape, float_type, options=options, real=True)
+    key = (data.shape, tuple(scales), kernel, support, float_type)
+    kernel_f = kernel_spectrum_cache.get(key)
+    if kernel_f is None:
+        if support=='box':
+            kernel_values = get_box_kernel(scales, kernel)
+        else:
+            kernel_values = get_regress_kernel(scales, kernel)
+        kernel_values = utils.expand_to_shape(kernel_values, data.shape, float_type, background=0)
+        kernel_values = fftpack.ifftshift(kernel_values)
+        kernel_f = task.fft(kernel_values / kernel_values.sum())
+        while kernel_spectrum_cache_order and len(kernel_spectrum_cache_order) >= kernel_spectrum_cache_size:
+            del kernel_spectrum_cache[kernel_spectrum_cache_order.pop(0)]
+        kernel_spectrum_cache[key] = kernel_f
+    else:
+        kernel_spectrum_cache_order.remove(key)
+    kernel_spectrum_cache_order.append(key)
+    task.set_convolve_fourier_kernel(kernel_f)
+    return task.convolve(data)
@@ -6,7 +6,8 @@ __all__ = ['set_convolve_options',
            'get_apply_window_options_group',
            'set_apply_window_options',
            'set_apply_noise_options',
-           'set_estimate_snr_options']
+           'set_estimate_snr_options',
+           'set_fftw_wisdom_options']
 
 import os
 from optparse import OptionGroup, NO_DEFAULT
@@ -62,6 +63,9 @@ def set_convolve_options(parser):
                        type = 'file', metavar='PATH',
                        help = 'Specify output PATH of 3D images.'
                        )
+    parser.add_option ('--convolve-method',
+                       choices = ['auto', 'fft', 'overlap-add', 'direct'], default = 'auto',
+                       help = 'Specify convolution algorithm. By default, the algorithm is chosen from kernel and data sizes.')
     parser.add_option_group(get_fft_options_group (parser))
 
 def get_regress_options_group(parser, group=None):
@@ -89,6 +93,15 @@ Specify options for applying regression.''')
                       default = 'finite',
                       help="Specify boundary condition.")
 
+    group.add_option ('--kernel-support', dest='kernel_support',
+                      choices = ['ellipsoid', 'box'],
+                      default = 'ellipsoid',
+                      help="Specify kernel support. Box kernels are separable and faster to apply.")
+
+    group.add_option ('--regress-threads', dest='regress_threads',
+                      type=int, default=1,
+                      help="Specify the number of threads for regression. 0 means all processors.")
+
     return group
 
 def get_apply_window_options_group(parser, group=None):
@@ -126,9 +139,41 @@ Specify options for FFT algorithm.''')
     group.add_option ('--fftw-threads',
                       type=int, default=1,
                       help = 'Specify the number of threads for FFTW plan.')
+    group.add_option ('--fftw-wisdom-dir',
+                      type = 'directory', metavar='DIR',
+                      help = 'Specify directory of FFTW wisdom store. Default is $IOCBIO_FFTW_WISDOM_DIR or ~/.iocbio/fft_tasks.')
+    group.add_option ('--fft-backend',
+                      choices = ['auto', 'fftw3', 'pyfftw', 'scipy', 'numpy'],
+                      help = 'Specify FFT backend. By default, $IOCBIO_FFT_BACKEND or the fastest available backend is used.')
 
     return group
 
+def set_fftw_wisdom_options (parser):
+    set_formatter (parser)
+    parser.set_usage ('%prog [options] SHAPE [SHAPE ...]')
+    parser.set_description('Precompute FFTW wisdom for the given array shapes (for example 64x256x256) and merge it to the wisdom store of the current host.')
+    parser.add_option ('--float-types',
+                       default = 'single,double', metavar='TYPES',
+                       help = 'Specify comma separated list of floating point types (single, double).')
+    parser.add_option ('--fftw-plan-flags',
+                       choices = ['patient', 'measure', 'estimate', 'exhaustive'],
+                       default = 'patient',
+                       help = 'Specify FFTW plan flags.')
+    parser.add_option ('--fftw-threads',
+                       default = '1', metavar='THREADS',
+                       help = 'Specify comma separated list of the numbers of threads for FFTW plans.')
+    parser.add_option ('--transforms',
+                       choices = ['real', 'complex', 'both'], default = 'both',
+                       help = 'Specify the type of transforms.')
+    parser.add_option ('--optimal-shape', action='store_true', default=False,
+                       help = 'Round shapes up to optimal FFT sizes as used in deconvolution.')
+    parser.add_option ('--no-optimal-shape', action='store_false',
+                       dest = 'optimal_shape',
+                       help = 'See ``--optimal-shape`` option.')
+    parser.add_option ('--fftw-wisdom-dir',
+                       type = 'directory', metavar='DIR',
+                       help = 'Specify directory of FFTW wisdom store. Default is $IOCBIO_FFTW_WISDOM_DIR or ~/.iocbio/fft_tasks.')
+
 def set_regress_options (parser):
     from ..io.script_options import get_microscope_options_group, get_io_options_group
     set_formatter (parser)
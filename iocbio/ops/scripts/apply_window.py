@@ -12,7 +12,7 @@ import os
 import numpy
 from iocbio.optparse_gui import OptionParser
 from iocbio.io import ImageStack
-from iocbio.ops.apply_window_ext import apply_window_inplace
+from iocbio.ops.window import apply_window
 from iocbio.io.io import fix_path
 from iocbio import utils
 from iocbio.ops.script_options import set_apply_window_options
@@ -66,7 +66,7 @@ def runner(parser, options, args):
         scales = tuple([s/(window_width*min(voxel_sizes)) for s in voxel_sizes])
 
     print 'Window size in pixels:', [1/s for s in scales]
-    apply_window_inplace (new_images, scales, smoothness, background)
+    apply_window (new_images, scales, smoothness, background, inplace=True)
 
     if options.output_path is None:
         b,e = os.path.splitext(options.input_path)
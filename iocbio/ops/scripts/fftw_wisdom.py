@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- python-mode -*-
+"""
+Front end script for precomputing FFTW wisdom.
+Execute this script with --help for usage information.
+"""
+
+from __future__ import division
+import sys
+
+### START UPDATE SYS.PATH ###
+### END UPDATE SYS.PATH ###
+
+from iocbio.optparse_gui import OptionParser
+from iocbio.ops.fft_tasks import FFTTasks
+from iocbio.ops.fft_backends import get_fft_backend
+from iocbio.utils import Options
+from iocbio.ops.script_options import set_fftw_wisdom_options
+
+def runner(parser, options, args):
+
+    if not args:
+        parser.error("no shapes specified")
+
+    shapes = []
+    for arg in args:
+        try:
+            shape = tuple(map(int, arg.lower().split('x')))
+        except ValueError:
+            parser.error("invalid shape %r, expected for example 64x256x256" % (arg))
+        if options.optimal_shape:
+            shape = tuple(map(FFTTasks.get_optimal_fft_size, shape))
+        shapes.append(shape)
+
+    float_types = [t.strip() for t in options.float_types.split(',') if t.strip()]
+    for float_type in float_types:
+        if float_type not in ['single', 'double']:
+            parser.error("invalid float type %r, expected single or double" % (float_type))
+        # only fftw3 backend uses wisdom
+        try:
+            get_fft_backend('fftw3', float_type)
+        except ImportError, msg:
+            parser.error(str(msg))
+    threads_list = map(int, options.fftw_threads.split(','))
+    reals = dict(real=[True], complex=[False], both=[True, False])[options.transforms]
+
+    for shape in shapes:
+        for float_type in float_types:
+            for threads in threads_list:
+                for real in reals:
+                    print 'Planning shape=%s, float_type=%s, threads=%s, real=%s' % (shape, float_type, threads, real)
+                    task_options = Options(fft_backend = 'fftw3',
+                                           fftw_plan_flags = options.fftw_plan_flags,
+                                           fftw_threads = threads,
+                                           fftw_wisdom_dir = options.fftw_wisdom_dir)
+                    task = FFTTasks(shape, float_type, options=task_options, real=real)
+                    task.clear()
+    FFTTasks.save_wisdoms(options.fftw_wisdom_dir)
+
+def main ():
+    parser = OptionParser()
+    set_fftw_wisdom_options (parser)
+    if hasattr(parser, 'runner'):
+        parser.runner = runner
+    options, args = parser.parse_args()
+    runner(parser, options, args)
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,17 @@ def configuration(parent_package='',top_path=None):
     from numpy.distutils.misc_util import Configuration
     from numpy.distutils.system_info import get_info, NotFoundError
     config = Configuration('ops',parent_package,top_path)
-    config.add_extension('apply_window_ext', join('src','apply_window_ext.c'))
-    config.add_extension('local_extrema_ext', join('src','local_extrema_ext.c'))
+    from iocbio.setup import get_openmp_args
+    # regress_ext, acf_ext, apply_window_ext and local_extrema_ext are
+    # parallelized with OpenMP when the compiler supports it, set
+    # IOCBIO_NO_OPENMP environment variable to disable.
+    openmp_args = get_openmp_args()
+    config.add_extension('apply_window_ext', join('src','apply_window_ext.c'),
+                         extra_compile_args = openmp_args,
+                         extra_link_args = openmp_args)
+    config.add_extension('local_extrema_ext', join('src','local_extrema_ext.c'),
+                         extra_compile_args = openmp_args,
+                         extra_link_args = openmp_args)
 
     config.add_library('fminpack',
                        sources = [join ('src', 'minpack', '*.f'),
@@ -16,11 +25,15 @@ def configuration(parent_package='',top_path=None):
     config.add_extension('regress_ext', 
                          sources = [join('src','regress_ext.c'),
                                     ],
+                         extra_compile_args = openmp_args,
+                         extra_link_args = openmp_args,
                          )
     config.add_extension('acf_ext', 
                          sources = [join('src','acf_ext.c'),
                                     join('src','acf.c')],
-                         libraries = ['fminpack'])
+                         libraries = ['fminpack'],
+                         extra_compile_args = openmp_args,
+                         extra_link_args = openmp_args)
 
     
     fftw3_info = get_info('fftw3')
@@ -46,7 +46,6 @@ static double acf_coeffs_Constant[2*2] = {
   1., 0.,
   -1.,1.
 };
-static double acf_data_Constant[2] = {0,0};
 
 /* Linear: f(x) is piecewise linear */
 static int acf_coeff_indices_Linear[4] = {-1,0,1,2};
@@ -56,7 +55,6 @@ static double acf_coeffs_Linear[4*4] = {
   0.5,-1.,0.5,0.,
   -1./6.,0.5,-0.5,1./6.
 };
-static double acf_data_Linear[4] = {0,0,0,0};
 
 /* CatmullRom: f(x) is piecewise cubic */
 static int acf_coeff_indices_CatmullRom[8] = {-3,-2,-1,0,1,2,3,4};
@@ -70,17 +68,6 @@ static double acf_coeffs_CatmullRom[8*8] = {
   1./240., -1./30.,  9./80.,  -5./24., 11./48.,  -3./20., 13./240.,-1./120.,
   -1./560., 1./80., -3./80.,   1./16., -1./16.,   3./80., -1./80.,  1./560.
 };
-static double acf_data_CatmullRom[8] = {0,0,0,0,0,0,0,0};
-
-typedef struct {
-  ACFInterpolationMethod mth;
-  int iy;
-  double* f;
-  double* data;
-  int sz;
-} ACFStateType;
-
-static ACFStateType acf_state = {ACFUnspecified, 0, NULL, NULL, 0};
 
 static
 int acf_find_size_reduction(double *f, int n, int max_dn)
@@ -101,28 +88,21 @@ int acf_find_size_reduction(double *f, int n, int max_dn)
   return 0;
 }
 
+/*
+  Compute the coefficients of ACF polynomial in [iy, iy+1] to data
+  that must have space for ACF_MAX_DATA_SIZE items. When append is
+  non-zero, the coefficients are added to data.
+ */
 static
 int acf_calculate_data(double* f, int n, int iy, 
 		       ACFInterpolationMethod mth,
-		       double** data, int* sz, int append)
+		       double* data, int* sz, int append)
 {
   int start, end, i, j, k, m, k1, mi;
   int nn;
   int* coeff_indices;
   double d, fk0, fk1;
   double* coeffs = NULL;
-  if (append==0 &&
-      mth==acf_state.mth &&
-      iy==acf_state.iy &&
-      f==acf_state.f &&
-      acf_state.data != NULL &&
-      acf_state.sz > 0
-      )
-    {
-      *data = acf_state.data;
-      *sz = acf_state.sz;
-      return 0;
-    }
   nn = n;
   switch (mth)
     {
@@ -132,7 +112,6 @@ int acf_calculate_data(double* f, int n, int iy,
       *sz = 2;
       coeff_indices = acf_coeff_indices_Constant;
       coeffs = acf_coeffs_Constant;
-      *data = acf_data_Constant;
       break;
     case ACFInterpolationLinearWithSizeReduction:
       nn -= acf_find_size_reduction(f, n, n/3);
@@ -140,7 +119,6 @@ int acf_calculate_data(double* f, int n, int iy,
       *sz = 4;
       coeff_indices = acf_coeff_indices_Linear;
       coeffs = acf_coeffs_Linear;
-      *data = acf_data_Linear;
       break;
     case ACFInterpolationCatmullRomWithSizeReduction:
       nn -= acf_find_size_reduction(f, n, n/3);
@@ -148,15 +126,13 @@ int acf_calculate_data(double* f, int n, int iy,
       *sz = 8;
       coeff_indices = acf_coeff_indices_CatmullRom;
       coeffs = acf_coeffs_CatmullRom;
-      *data = acf_data_CatmullRom;
       break;
     default: 
       *sz = 0;
-      *data = NULL;
       return -1;
     }
   if (append==0)
-    for (j=0; j<*sz; ++j) (*data)[j] = 0.0;
+    for (j=0; j<*sz; ++j) data[j] = 0.0;
   start = -coeff_indices[0]-2;
   start = MAX(iy, start);
   end = nn + coeff_indices[*sz-1];
@@ -173,46 +149,57 @@ int acf_calculate_data(double* f, int n, int iy,
 	      fk1 = GET_NODE_VALUE(f, nn, k1);
 	      d += coeffs[mi] * fk1;
 	    }
-	  (*data)[i] += fk0 * d;
+	  data[i] += fk0 * d;
 	}
     }
-  acf_state.mth = mth;
-  acf_state.iy = iy;
-  acf_state.f = f;
-  acf_state.data = *data;
-  acf_state.sz = *sz;
   return 0;
 }
 
 double acf_evaluate(double* f, int n, int rows, double y, ACFInterpolationMethod mth)
 {
-  int iy = floor((y<0?-y:y));
-  double dy = y - iy;
-  int sz, i;
-  double *data = NULL;
-  double result = 0.0;
-  double p = 1.0;
-  for (i=0; i<rows; ++i)
-    acf_calculate_data(f + i*n, n, iy, mth, &data, &sz, i);
-  assert(data!=NULL);
-  for (i=0; i<sz; ++i, p *= dy)
-    result += data[i] * p;
+  double result;
+  acf_evaluate_many(f, n, rows, &y, 1, mth, &result);
   return result;
 }
 
+void acf_evaluate_many(double* f, int n, int rows, double* y, int ny, ACFInterpolationMethod mth, double* result)
+{
+  int iy, k, i, sz = 0;
+  int last_iy = -1;
+  double dy, p, r;
+  double data[ACF_MAX_DATA_SIZE];
+  for (k=0; k<ny; ++k)
+    {
+      iy = floor((y[k]<0?-y[k]:y[k]));
+      dy = y[k] - iy;
+      if (iy!=last_iy)
+	{
+	  /* coefficients are reused for arguments in the same interval */
+	  for (i=0; i<rows; ++i)
+	    acf_calculate_data(f + i*n, n, iy, mth, data, &sz, i);
+	  last_iy = iy;
+	}
+      r = 0.0;
+      p = 1.0;
+      for (i=0; i<sz; ++i, p *= dy)
+	r += data[i] * p;
+      result[k] = r;
+    }
+}
+
 double acf_evaluate_int(double* f, int n, int rows, int y, ACFInterpolationMethod mth)
 {
   int sz, i;
-  double *data = NULL;
+  double data[ACF_MAX_DATA_SIZE];
   for (i=0; i<rows; ++i)
-    acf_calculate_data(f + i*n, n, (y<0?-y:y), mth, &data, &sz, i);
+    acf_calculate_data(f + i*n, n, (y<0?-y:y), mth, data, &sz, i);
   return data[0];
 }
 
 double acf_maximum_point(double* f, int n, int rows, int start_j, ACFInterpolationMethod mth)
 {
   int j, i, sz;
-  double *data = NULL;
+  double data[ACF_MAX_DATA_SIZE];
   double a,b,c,d;
   double s;
   double fy;
@@ -223,7 +210,7 @@ double acf_maximum_point(double* f, int n, int rows, int start_j, ACFInterpolati
 	for (j=MAX(1,start_j); j<n-1; ++j)
 	  {
 	    for (i=0; i<rows; ++i)
-	      acf_calculate_data(f + i*n, n, j, mth, &data, &sz, i);
+	      acf_calculate_data(f + i*n, n, j, mth, data, &sz, i);
 	    a = data[3];
 	    b = data[2];
 	    c = data[1];
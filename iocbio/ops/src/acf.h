@@ -5,6 +5,7 @@
      double acf_evaluate(double* f, int n, double y, InterpolationMethod mth)
      double acf_maximum_point(double* f, int n, int start_j, InterpolationMethod mth)
      double acf_sine_fit(double* f, int n, int start_j, ACFInterpolationMethod mth)
+     void acf_evaluate_many(double* f, int n, int rows, double* y, int ny, ACFInterpolationMethod mth, double* result)
      
    * acf_evaluate computes the value of an analytic autocorrelation
    function ACF(f)(y) of a piecewice polynomial function f(x). The
@@ -30,6 +31,13 @@
      acf_maximum_point as initial guess for omega = 2*pi/max_point,
      hence the start_j argument.
 
+   * acf_evaluate_many evaluates ACF(f)(y[k]), k=0,...,ny-1, and
+   reuses the ACF polynomial coefficients for consecutive arguments
+   in the same unit interval.
+
+   The functions do not use global state and can be called from
+   multiple threads.
+
 Auhtor: Pearu Peterson
 Created: September 2010
  */
@@ -50,7 +58,11 @@ typedef enum {\
   ACFInterpolationCatmullRomWithSizeReduction=12, 
   ACFUnspecified=999} ACFInterpolationMethod;
 
+/* maximal number of ACF polynomial coefficients */
+#define ACF_MAX_DATA_SIZE 8
+
 extern double acf_evaluate(double* f, int n, int rows, double y, ACFInterpolationMethod mth);
+extern void acf_evaluate_many(double* f, int n, int rows, double* y, int ny, ACFInterpolationMethod mth, double* result);
 extern double acf_maximum_point(double* f, int n, int rows, int start_j, ACFInterpolationMethod mth);
 #ifndef DISABLE_SINFIT
 extern double acf_sine_fit(double* f, int n, int rows, int start_j, ACFInterpolationMethod mth);
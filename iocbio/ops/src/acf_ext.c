@@ -18,9 +18,43 @@
 
 #include "acf.h"
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+static int check_method(ACFInterpolationMethod mth)
+{
+  switch (mth)
+    {
+    case ACFInterpolationConstant: ;
+    case ACFInterpolationLinear: ;
+    case ACFInterpolationCatmullRom: ;
+    case ACFInterpolationConstantWithSizeReduction: ;
+    case ACFInterpolationLinearWithSizeReduction: ;
+    case ACFInterpolationCatmullRomWithSizeReduction: ;
+      return 0;
+    default:
+      PyErr_SetString(PyExc_TypeError,"method argument must be 0, 1, 2, 10, 11, or 12");
+    }
+  return -1;
+}
+
+static int get_nthreads(int nthreads)
+{
+  if (nthreads<1)
+    {
+#ifdef _OPENMP
+      nthreads = omp_get_max_threads();
+#else
+      nthreads = 1;
+#endif
+    }
+  return nthreads;
+}
+
 static PyObject *py_acf_evaluate(PyObject *self, PyObject *args)
 {
-  int i, n, rows;
+  int n, rows;
   PyObject* f_py = NULL;
   PyObject* f1_py = NULL;
   PyObject* y_py = NULL;
@@ -78,12 +112,8 @@ static PyObject *py_acf_evaluate(PyObject *self, PyObject *args)
   r_py =  PyArray_SimpleNew(PyArray_NDIM(y_py), 
 			    PyArray_DIMS(y_py),
 			    PyArray_DOUBLE);
-  for (i=0; i<PyArray_SIZE(y_py); ++i)
-    {
-      y = *((double*)PyArray_GETPTR1(y_py, i));
-      r = acf_evaluate(f, n, rows, y, mth);
-      *(double*)PyArray_GETPTR1(r_py, i) = r;
-    }
+  acf_evaluate_many(f, n, rows, (double*)PyArray_DATA(y_py), PyArray_SIZE(y_py), mth,
+		    (double*)PyArray_DATA(r_py));
   if (y1_py != y_py)
     {
       Py_DECREF(y_py);
@@ -269,12 +299,114 @@ static PyObject *py_acf_sine_power_spectrum(PyObject *self, PyObject *args)
   return r_py;
 }
 
+/*
+  Batched functions take (nrows, N) array and process its rows in
+  parallel with released GIL.
+ */
+
+static PyObject *py_acf_evaluate_many(PyObject *self, PyObject *args)
+{
+  npy_intp i, nrows, n, ny;
+  npy_intp dims[2];
+  PyObject* f_py = NULL;
+  PyObject* f1_py = NULL;
+  PyObject* y_py = NULL;
+  PyObject* y1_py = NULL;
+  PyObject* r_py = NULL;
+  ACFInterpolationMethod mth = ACFUnspecified;
+  int nthreads = 0;
+  double *f = NULL, *y = NULL, *r = NULL;
+  if (!PyArg_ParseTuple(args, "OOi|i", &f1_py, &y1_py, &mth, &nthreads))
+    return NULL;
+  if (check_method(mth))
+    return NULL;
+  f_py = PyArray_ContiguousFromAny(f1_py, PyArray_DOUBLE, 2, 2);
+  if (f_py==NULL)
+    return NULL;
+  y_py = PyArray_ContiguousFromAny(y1_py, PyArray_DOUBLE, 1, 1);
+  if (y_py==NULL)
+    {
+      Py_DECREF(f_py);
+      return NULL;
+    }
+  nrows = PyArray_DIMS(f_py)[0];
+  n = PyArray_DIMS(f_py)[1];
+  ny = PyArray_SIZE(y_py);
+  dims[0] = nrows;
+  dims[1] = ny;
+  r_py = PyArray_SimpleNew(2, dims, PyArray_DOUBLE);
+  if (r_py!=NULL)
+    {
+      f = (double*)PyArray_DATA(f_py);
+      y = (double*)PyArray_DATA(y_py);
+      r = (double*)PyArray_DATA(r_py);
+      nthreads = get_nthreads(nthreads);
+      Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(nthreads) if(nthreads>1)
+#endif
+      for (i=0; i<nrows; ++i)
+	acf_evaluate_many(f + i*n, n, 1, y, ny, mth, r + i*ny);
+      Py_END_ALLOW_THREADS
+    }
+  Py_DECREF(f_py);
+  Py_DECREF(y_py);
+  return r_py;
+}
+
+#define DEFINE_ACF_ROWS_FUNCTION(NAME, FUNC)				\
+  static PyObject *NAME(PyObject *self, PyObject *args)			\
+  {									\
+    npy_intp i, nrows, n;						\
+    PyObject* f_py = NULL;						\
+    PyObject* f1_py = NULL;						\
+    PyObject* r_py = NULL;						\
+    ACFInterpolationMethod mth = ACFUnspecified;			\
+    int nthreads = 0;							\
+    int start_j = 0;							\
+    double *f = NULL, *r = NULL;					\
+    if (!PyArg_ParseTuple(args, "Oii|i", &f1_py, &start_j, &mth, &nthreads)) \
+      return NULL;							\
+    if (check_method(mth))						\
+      return NULL;							\
+    f_py = PyArray_ContiguousFromAny(f1_py, PyArray_DOUBLE, 2, 2);	\
+    if (f_py==NULL)							\
+      return NULL;							\
+    nrows = PyArray_DIMS(f_py)[0];					\
+    n = PyArray_DIMS(f_py)[1];						\
+    r_py = PyArray_SimpleNew(1, &nrows, PyArray_DOUBLE);		\
+    if (r_py!=NULL)							\
+      {									\
+	f = (double*)PyArray_DATA(f_py);				\
+	r = (double*)PyArray_DATA(r_py);				\
+	nthreads = get_nthreads(nthreads);				\
+	Py_BEGIN_ALLOW_THREADS						\
+	  ACF_PARALLEL_FOR						\
+	  for (i=0; i<nrows; ++i)					\
+	    r[i] = FUNC(f + i*n, n, 1, start_j, mth);			\
+	Py_END_ALLOW_THREADS						\
+      }									\
+    Py_DECREF(f_py);							\
+    return r_py;							\
+  }
+
+#ifdef _OPENMP
+#define ACF_PARALLEL_FOR _Pragma("omp parallel for schedule(dynamic) num_threads(nthreads) if(nthreads>1)")
+#else
+#define ACF_PARALLEL_FOR
+#endif
+
+DEFINE_ACF_ROWS_FUNCTION(py_acf_maximum_point_many, acf_maximum_point)
+DEFINE_ACF_ROWS_FUNCTION(py_acf_sine_fit_many, acf_sine_fit)
 
 static PyMethodDef module_methods[] = {
   {"acf", py_acf_evaluate, METH_VARARGS, "acf(f, y, mth)"},
   {"acf_argmax", py_acf_maximum_point, METH_VARARGS, "acf_argmax(f, start_j, mth)"},
   {"acf_sinefit", py_acf_sine_fit, METH_VARARGS, "acf_sinefit(f, start_j, mth)"},
   {"acf_sine_power_spectrum", py_acf_sine_power_spectrum, METH_VARARGS, "acf_sine_power_spectrum(f, omega, mth)"},
+  {"acf_many", py_acf_evaluate_many, METH_VARARGS, "acf_many(f, y, mth[, nthreads])"},
+  {"acf_argmax_many", py_acf_maximum_point_many, METH_VARARGS, "acf_argmax_many(f, start_j, mth[, nthreads])"},
+  {"acf_sinefit_many", py_acf_sine_fit_many, METH_VARARGS, "acf_sinefit_many(f, start_j, mth[, nthreads])"},
   {NULL}  /* Sentinel */
 };
 
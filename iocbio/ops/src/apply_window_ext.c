@@ -16,6 +16,10 @@
 #define M_PI 3.1415926535897932384626433832795
 #endif
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 static npy_float64 g(npy_float64 x)
 {
   npy_float64 r = sin(x*0.5*M_PI);
@@ -207,8 +211,190 @@ static PyObject *apply_window_inplace(PyObject *self, PyObject *args)
   return Py_BuildValue("");
 }
 
+/*
+  Window is a product of 1D profiles d[k][i] = 1 - f(scales[k]*min(i, dims[k]-i-1), n).
+ */
+static PyObject *window_profile(PyObject *self, PyObject *args)
+{
+  int n=0;
+  npy_intp size=0, i;
+  npy_float64 scale = 0.0;
+  npy_float64* d = NULL;
+  PyObject* r = NULL;
+  if (!PyArg_ParseTuple(args, "ndi", &size, &scale, &n))
+    return NULL;
+  if (size<0)
+    {
+      PyErr_SetString(PyExc_ValueError,"first argument must be non-negative");
+      return NULL;
+    }
+  r = PyArray_SimpleNew(1, &size, PyArray_FLOAT64);
+  if (r==NULL)
+    return NULL;
+  d = (npy_float64*)PyArray_DATA(r);
+  for (i=0; i<size; ++i)
+    d[i] = 1.0 - f(scale * (2*i<=size?i:size-i-1), n);
+  return r;
+}
+
+#define APPLY_PROFILES_LOOP(TYPE)					\
+  for (q=0; q<nouter; ++q)						\
+    {									\
+      npy_intp i0 = q / dims[1], i1 = q % dims[1], i2, i3;		\
+      npy_float64 r1 = d[0][i0] * d[1][i1], r2, r;			\
+      char* ptr1 = data + i0*strides[0] + i1*strides[1];		\
+      char* ptr2 = NULL;						\
+      for (i2=0; i2<dims[2]; ++i2)					\
+	{								\
+	  r2 = r1 * d[2][i2];						\
+	  ptr2 = ptr1 + i2*strides[2];					\
+	  for (i3=0; i3<dims[3]; ++i3)					\
+	    {								\
+	      if (r2 == 1.0 && i3 == lo3)				\
+		{							\
+		  /* window is 1 in [lo3, hi3) */			\
+		  i3 = hi3 - 1;						\
+		  continue;						\
+		}							\
+	      r = r2 * d[3][i3];					\
+	      if (r != 1.0)						\
+		{							\
+		  TYPE* ptr = (TYPE*)(ptr2 + i3*strides[3]);		\
+		  *ptr = (*ptr) * r + background*(1.0-r);		\
+		}							\
+	    }								\
+	}								\
+    }
+
+#ifdef _OPENMP
+#define APPLY_PROFILES_CASE(NPY_TYPE, TYPE)				\
+  case NPY_TYPE:							\
+    _Pragma("omp parallel for schedule(static) num_threads(nthreads) if(nthreads>1)") \
+    APPLY_PROFILES_LOOP(TYPE)						\
+    break;
+#else
+#define APPLY_PROFILES_CASE(NPY_TYPE, TYPE)	\
+  case NPY_TYPE:				\
+    APPLY_PROFILES_LOOP(TYPE)			\
+    break;
+#endif
+
+/*
+  Multiply array in-place with a window given by 1D profiles. The
+  array is processed as 4D array (leading axes have size 1) and the
+  outer two axes are distributed between threads.
+ */
+static PyObject *apply_window_profiles(PyObject *self, PyObject *args)
+{
+  int nthreads = 1;
+  PyObject* a = NULL;
+  PyObject* profiles_obj = NULL;
+  PyObject* profiles[4] = {NULL, NULL, NULL, NULL};
+  npy_intp i, k, q, nouter, lo3, hi3, rank=0;
+  npy_intp dims[4] = {1, 1, 1, 1};
+  npy_intp strides[4] = {0, 0, 0, 0};
+  npy_float64 one = 1.0;
+  npy_float64* d[4] = {&one, &one, &one, &one};
+  npy_float64 background = 0.0;
+  char* data = NULL;
+  int type_num;
+  if (!PyArg_ParseTuple(args, "OOd|i", &a, &profiles_obj, &background, &nthreads))
+    return NULL;
+  if (!PyArray_Check(a))
+    {
+      PyErr_SetString(PyExc_TypeError,"first argument must be array object");
+      return NULL;
+    }
+  if (!PyTuple_Check(profiles_obj))
+    {
+      PyErr_SetString(PyExc_TypeError,"second argument must be tuple object");
+      return NULL;
+    }
+  rank = PyArray_NDIM(a);
+  if (rank > 4)
+    {
+      PyErr_SetString(PyExc_NotImplementedError,"only rank <=4 arrays are supported");
+      return NULL;
+    }
+  if (PyTuple_Size(profiles_obj) != rank)
+    {
+      PyErr_SetString(PyExc_TypeError,"second argument must have size equal to the rank of the first argument");
+      return NULL;
+    }
+  type_num = PyArray_TYPE(a);
+  switch (type_num)
+    {
+    case PyArray_FLOAT32: ;
+    case PyArray_FLOAT64: ;
+    case PyArray_INT8: ;
+    case PyArray_INT16: ;
+    case PyArray_INT32: ;
+    case PyArray_INT64: ;
+    case PyArray_UINT8: ;
+    case PyArray_UINT16: ;
+    case PyArray_UINT32: ;
+    case PyArray_UINT64: ;
+      break;
+    default:
+      PyErr_SetString(PyExc_TypeError,"unsupported array dtype");
+      return NULL;
+    }
+  for (i=0; i<rank; ++i)
+    {
+      k = 4 - rank + i;
+      profiles[i] = PyArray_ContiguousFromAny(PyTuple_GET_ITEM(profiles_obj, i), PyArray_FLOAT64, 1, 1);
+      if (profiles[i]==NULL)
+	goto fail;
+      if (PyArray_SIZE(profiles[i]) != PyArray_DIMS(a)[i])
+	{
+	  PyErr_SetString(PyExc_ValueError,"profile sizes must match with array shape");
+	  goto fail;
+	}
+      dims[k] = PyArray_DIMS(a)[i];
+      strides[k] = PyArray_STRIDES(a)[i];
+      d[k] = (npy_float64*)PyArray_DATA(profiles[i]);
+    }
+  if (nthreads<1)
+    {
+#ifdef _OPENMP
+      nthreads = omp_get_max_threads();
+#else
+      nthreads = 1;
+#endif
+    }
+  for (lo3=0; lo3<dims[3] && d[3][lo3] != 1.0; ++lo3) ;
+  for (hi3=lo3; hi3<dims[3] && d[3][hi3] == 1.0; ++hi3) ;
+  nouter = dims[0] * dims[1];
+  data = PyArray_BYTES(a);
+  Py_BEGIN_ALLOW_THREADS
+  switch (type_num)
+    {
+      APPLY_PROFILES_CASE(PyArray_FLOAT32, npy_float32);
+      APPLY_PROFILES_CASE(PyArray_FLOAT64, npy_float64);
+      APPLY_PROFILES_CASE(PyArray_INT8, npy_int8);
+      APPLY_PROFILES_CASE(PyArray_INT16, npy_int16);
+      APPLY_PROFILES_CASE(PyArray_INT32, npy_int32);
+      APPLY_PROFILES_CASE(PyArray_INT64, npy_int64);
+      APPLY_PROFILES_CASE(PyArray_UINT8, npy_uint8);
+      APPLY_PROFILES_CASE(PyArray_UINT16, npy_uint16);
+      APPLY_PROFILES_CASE(PyArray_UINT32, npy_uint32);
+      APPLY_PROFILES_CASE(PyArray_UINT64, npy_uint64);
+    default: ;
+    }
+  Py_END_ALLOW_THREADS
+  for (i=0; i<rank; ++i)
+    Py_DECREF(profiles[i]);
+  return Py_BuildValue("");
+ fail:
+  for (i=0; i<rank; ++i)
+    Py_XDECREF(profiles[i]);
+  return NULL;
+}
+
 static PyMethodDef module_methods[] = {
   {"apply_window_inplace", apply_window_inplace, METH_VARARGS, "apply_window_inplace(a,scales,smoothness,background)"},
+  {"window_profile", window_profile, METH_VARARGS, "window_profile(size,scale,smoothness)"},
+  {"apply_window_profiles", apply_window_profiles, METH_VARARGS, "apply_window_profiles(a,profiles,background[,nthreads])"},
   {NULL}  /* Sentinel */
 };
 
@@ -219,5 +405,5 @@ initapply_window_ext(void)
   import_array();
   if (PyErr_Occurred())
     {PyErr_SetString(PyExc_ImportError, "can't initialize module apply_window_ext (failed to import numpy)"); return;}
-  m = Py_InitModule3("apply_window_ext", module_methods, "Provides apply_window_inplace function.");
+  m = Py_InitModule3("apply_window_ext", module_methods, "Provides apply_window_inplace, window_profile, and apply_window_profiles functions.");
 }
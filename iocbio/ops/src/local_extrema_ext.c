@@ -12,6 +12,10 @@
 #define PyMODINIT_FUNC void
 #endif
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
 #define LOOP(index)				\
   for (i##index=0;i##index<dims[index];++i##index)	\
     {
@@ -416,10 +420,338 @@ fail:
   return NULL;
 }
 
+/*
+  find_local_extrema collects extrema to arrays. Each thread processes
+  a slab of outer indices and collects extrema to its own list that
+  is a heap of the best max_count extrema when max_count>=0. Extrema
+  are ordered by key (value for maxima, -value for minima) and then
+  by raster index.
+ */
+
+typedef struct
+{
+  double key;
+  npy_intp index;
+} Extremum;
+
+typedef struct
+{
+  Extremum* items;
+  npy_intp size;
+  npy_intp capacity;
+  int failed;
+} ExtremumList;
+
+static int extremum_better(const Extremum* a, const Extremum* b)
+{
+  return (a->key > b->key || (a->key == b->key && a->index < b->index));
+}
+
+static int extremum_compare(const void* a, const void* b)
+{
+  if (extremum_better((const Extremum*)a, (const Extremum*)b))
+    return -1;
+  if (extremum_better((const Extremum*)b, (const Extremum*)a))
+    return 1;
+  return 0;
+}
+
+static void extremum_push(ExtremumList* lst, npy_intp max_count, double key, npy_intp index)
+{
+  Extremum item, tmp;
+  npy_intp i, c;
+  item.key = key;
+  item.index = index;
+  if (lst->failed || max_count==0)
+    return;
+  if (max_count>0 && lst->size==max_count)
+    {
+      /* replace the worst item in the heap and sift down */
+      if (!extremum_better(&item, lst->items))
+	return;
+      lst->items[0] = item;
+      i = 0;
+      while ((c = 2*i+1) < lst->size)
+	{
+	  if (c+1 < lst->size && extremum_better(lst->items + c, lst->items + c + 1))
+	    c++;
+	  if (!extremum_better(lst->items + i, lst->items + c))
+	    break;
+	  tmp = lst->items[i]; lst->items[i] = lst->items[c]; lst->items[c] = tmp;
+	  i = c;
+	}
+      return;
+    }
+  if (lst->size==lst->capacity)
+    {
+      npy_intp capacity = (lst->capacity ? 2*lst->capacity : 1024);
+      Extremum* items = NULL;
+      if (max_count>0 && capacity>max_count)
+	capacity = max_count;
+      items = (Extremum*)realloc(lst->items, sizeof(Extremum)*capacity);
+      if (items==NULL)
+	{
+	  lst->failed = 1;
+	  return;
+	}
+      lst->items = items;
+      lst->capacity = capacity;
+    }
+  i = lst->size++;
+  lst->items[i] = item;
+  if (max_count>0)
+    /* sift up, the worst item is at the root */
+    while (i>0 && extremum_better(lst->items + (i-1)/2, lst->items + i))
+      {
+	c = (i-1)/2;
+	tmp = lst->items[i]; lst->items[i] = lst->items[c]; lst->items[c] = tmp;
+	i = c;
+      }
+}
+
+typedef void (*FindExtremaFunc)(char*, npy_intp*, npy_intp*, int*, BoundaryCondition, double, npy_intp, npy_intp, npy_intp, ExtremumList*);
+
+/*
+  Define a function that finds extrema of 4D array in the slab of
+  outer indices [qstart, qend). Axes with real[d]==0 are padding axes
+  of size 1. CMP is > for maxima and < for minima.
+ */
+#define DEFINE_FIND_EXTREMA(NAME, TYPE, CMP, SIGN)			\
+  static void NAME(char* data, npy_intp* dims, npy_intp* strides, int* real, \
+		   BoundaryCondition boundary, double level, npy_intp max_count, \
+		   npy_intp qstart, npy_intp qend, ExtremumList* lst)	\
+  {									\
+    npy_intp i[4], j[4], k[4], jlo[4], jhi[4], offsets[80];		\
+    npy_intp q, d, n, noffsets = 0, offset;				\
+    int is_extremum, interior;						\
+    char* ptr = NULL;							\
+    TYPE value;								\
+    for (d=0; d<4; ++d)							\
+      {									\
+	jlo[d] = (real[d] && dims[d]>1 ? -1 : 0);			\
+	jhi[d] = -jlo[d];						\
+      }									\
+    for (j[0]=jlo[0]; j[0]<=jhi[0]; ++j[0])				\
+      for (j[1]=jlo[1]; j[1]<=jhi[1]; ++j[1])				\
+	for (j[2]=jlo[2]; j[2]<=jhi[2]; ++j[2])				\
+	  for (j[3]=jlo[3]; j[3]<=jhi[3]; ++j[3])			\
+	    if (j[0] || j[1] || j[2] || j[3])				\
+	      offsets[noffsets++] = j[0]*strides[0] + j[1]*strides[1] + j[2]*strides[2] + j[3]*strides[3]; \
+    for (q=qstart; q<qend; ++q)						\
+      {									\
+	i[2] = q % dims[2];						\
+	i[1] = (q / dims[2]) % dims[1];					\
+	i[0] = q / (dims[2] * dims[1]);					\
+	for (i[3]=0; i[3]<dims[3]; ++i[3])				\
+	  {								\
+	    interior = 1;						\
+	    for (d=0; d<4; ++d)						\
+	      if (jlo[d] && (i[d]<=0 || i[d]>=dims[d]-1))		\
+		interior = 0;						\
+	    if (boundary==BC_FINITE && !interior)			\
+	      continue;							\
+	    ptr = data + i[0]*strides[0] + i[1]*strides[1] + i[2]*strides[2] + i[3]*strides[3]; \
+	    value = *(TYPE*)ptr;					\
+	    if (!((double)value CMP level))				\
+	      continue;							\
+	    is_extremum = 1;						\
+	    if (interior)						\
+	      {								\
+		for (n=0; n<noffsets; ++n)				\
+		  if (*(TYPE*)(ptr + offsets[n]) CMP value)		\
+		    {							\
+		      is_extremum = 0;					\
+		      break;						\
+		    }							\
+	      }								\
+	    else							\
+	      {								\
+		for (n=0; n<noffsets && is_extremum; ++n)		\
+		  {							\
+		    /* decode neighbor n from offsets ordering */	\
+		    npy_intp m = n + (n >= noffsets/2);			\
+		    offset = 0;						\
+		    for (d=3; d>=0; --d)				\
+		      {							\
+			npy_intp w = jhi[d] - jlo[d] + 1;		\
+			j[d] = m % w + jlo[d];				\
+			m /= w;						\
+			k[d] = i[d] + j[d];				\
+			switch (boundary)				\
+			  {						\
+			  case BC_CONSTANT: k[d] = (k[d]>=dims[d]?dims[d]-1:(k[d]<0?0:k[d])); break; \
+			  case BC_PERIODIC: k[d] = (k[d]>=dims[d]?k[d] - dims[d]:(k[d]<0?k[d] + dims[d]:k[d])); break; \
+			  case BC_REFLECTIVE: k[d] = (k[d]>=dims[d]?2*dims[d]-k[d]-2:(k[d]<0?-k[d]:k[d])); break; \
+			  default: ;					\
+			  }						\
+			offset += (k[d] - i[d]) * strides[d];		\
+		      }							\
+		    if (*(TYPE*)(ptr + offset) CMP value)		\
+		      is_extremum = 0;					\
+		  }							\
+	      }								\
+	    if (is_extremum)						\
+	      extremum_push(lst, max_count, (SIGN)*(double)value, q*dims[3] + i[3]); \
+	  }								\
+      }									\
+  }
+
+#define DEFINE_FIND_EXTREMA_TYPE(SUFFIX, TYPE)				\
+  DEFINE_FIND_EXTREMA(find_maxima_##SUFFIX, TYPE, >, 1.0)		\
+  DEFINE_FIND_EXTREMA(find_minima_##SUFFIX, TYPE, <, -1.0)
+
+DEFINE_FIND_EXTREMA_TYPE(float64, npy_float64)
+DEFINE_FIND_EXTREMA_TYPE(float32, npy_float32)
+DEFINE_FIND_EXTREMA_TYPE(int64, npy_int64)
+DEFINE_FIND_EXTREMA_TYPE(int32, npy_int32)
+DEFINE_FIND_EXTREMA_TYPE(int16, npy_int16)
+DEFINE_FIND_EXTREMA_TYPE(int8, npy_int8)
+DEFINE_FIND_EXTREMA_TYPE(uint64, npy_uint64)
+DEFINE_FIND_EXTREMA_TYPE(uint32, npy_uint32)
+DEFINE_FIND_EXTREMA_TYPE(uint16, npy_uint16)
+DEFINE_FIND_EXTREMA_TYPE(uint8, npy_uint8)
+
+#define FIND_EXTREMA_CASE(NPY_TYPE, SUFFIX)				\
+  case NPY_TYPE: func = (find_minima ? find_minima_##SUFFIX : find_maxima_##SUFFIX); break;
+
+static PyObject *find_local_extrema(PyObject *self, PyObject *args)
+{
+  PyObject* a = NULL;
+  PyObject* values = NULL;
+  PyObject* indices = NULL;
+  npy_intp rank = 0, nouter, total, n, d, index;
+  npy_intp dims[4] = {1, 1, 1, 1};
+  npy_intp strides[4] = {0, 0, 0, 0};
+  npy_intp odims[2];
+  int real[4] = {0, 0, 0, 0};
+  int find_minima = 0, nthreads = 1, t;
+  int failed = 0;
+  double level;
+  double sign;
+  npy_intp max_count = -1;
+  BoundaryCondition boundary;
+  FindExtremaFunc func = NULL;
+  ExtremumList* lists = NULL;
+  ExtremumList result = {NULL, 0, 0, 0};
+  if (!PyArg_ParseTuple(args, "Odii|ni", &a, &level, &boundary, &find_minima, &max_count, &nthreads))
+    return NULL;
+  if (!PyArray_Check(a))
+    {
+      PyErr_SetString(PyExc_TypeError,"first argument must be array object");
+      return NULL;
+    }
+  if (boundary<0 || boundary>3)
+    {
+      PyErr_SetString(PyExc_ValueError,"third argument must be 0, 1, 2, or 3");
+      return NULL;
+    }
+  rank = PyArray_NDIM(a);
+  if (rank > 4 || rank < 1)
+    {
+      PyErr_SetString(PyExc_NotImplementedError,"only 1 <= rank <= 4 arrays are supported");
+      return NULL;
+    }
+  switch (PyArray_TYPE(a))
+    {
+      FIND_EXTREMA_CASE(PyArray_FLOAT64, float64);
+      FIND_EXTREMA_CASE(PyArray_FLOAT32, float32);
+      FIND_EXTREMA_CASE(PyArray_INT64, int64);
+      FIND_EXTREMA_CASE(PyArray_INT32, int32);
+      FIND_EXTREMA_CASE(PyArray_INT16, int16);
+      FIND_EXTREMA_CASE(PyArray_INT8, int8);
+      FIND_EXTREMA_CASE(PyArray_UINT64, uint64);
+      FIND_EXTREMA_CASE(PyArray_UINT32, uint32);
+      FIND_EXTREMA_CASE(PyArray_UINT16, uint16);
+      FIND_EXTREMA_CASE(PyArray_UINT8, uint8);
+    default:
+      PyErr_SetString(PyExc_TypeError,"find_local_extrema: unsupported array dtype");
+      return NULL;
+    }
+  sign = (find_minima ? -1.0 : 1.0);
+  for (d=0; d<rank; ++d)
+    {
+      dims[4-rank+d] = PyArray_DIMS(a)[d];
+      strides[4-rank+d] = PyArray_STRIDES(a)[d];
+      real[4-rank+d] = 1;
+    }
+  if (nthreads<1)
+    {
+#ifdef _OPENMP
+      nthreads = omp_get_max_threads();
+#else
+      nthreads = 1;
+#endif
+    }
+  lists = (ExtremumList*)calloc(nthreads, sizeof(ExtremumList));
+  if (lists==NULL)
+    return PyErr_NoMemory();
+  nouter = dims[0] * dims[1] * dims[2];
+  if (boundary==BC_FINITE)
+    for (d=0; d<4; ++d)
+      if (real[d] && dims[d]==1)
+	/* all points are at boundary */
+	nouter = 0;
+  Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel num_threads(nthreads) if(nthreads>1 && nouter>1)
+  {
+    npy_intp tid = omp_get_thread_num();
+    npy_intp nt = omp_get_num_threads();
+    func(PyArray_BYTES(a), dims, strides, real, boundary, level, max_count,
+	 nouter*tid/nt, nouter*(tid+1)/nt, lists + tid);
+  }
+#else
+  func(PyArray_BYTES(a), dims, strides, real, boundary, level, max_count,
+       0, nouter, lists);
+#endif
+  /* merge thread lists in slab order */
+  for (t=0; t<nthreads; ++t)
+    {
+      failed |= lists[t].failed;
+      for (n=0; n<lists[t].size; ++n)
+	extremum_push(&result, max_count, lists[t].items[n].key, lists[t].items[n].index);
+      free(lists[t].items);
+    }
+  failed |= result.failed;
+  if (!failed && result.size>1)
+    qsort(result.items, result.size, sizeof(Extremum), extremum_compare);
+  Py_END_ALLOW_THREADS
+  free(lists);
+  if (failed)
+    {
+      free(result.items);
+      return PyErr_NoMemory();
+    }
+  total = result.size;
+  odims[0] = total;
+  odims[1] = rank;
+  values = PyArray_SimpleNew(1, odims, PyArray_FLOAT64);
+  indices = PyArray_SimpleNew(2, odims, NPY_INTP);
+  if (values==NULL || indices==NULL)
+    {
+      Py_XDECREF(values);
+      Py_XDECREF(indices);
+      free(result.items);
+      return NULL;
+    }
+  for (n=0; n<total; ++n)
+    {
+      ((npy_float64*)PyArray_DATA(values))[n] = sign * result.items[n].key;
+      index = result.items[n].index;
+      for (d=rank-1; d>=0; --d)
+	{
+	  ((npy_intp*)PyArray_DATA(indices))[n*rank+d] = index % dims[4-rank+d];
+	  index /= dims[4-rank+d];
+	}
+    }
+  free(result.items);
+  return Py_BuildValue("NN", values, indices);
+}
 
 static PyMethodDef module_methods[] = {
   {"local_maxima", local_maxima , METH_VARARGS, "local_maxima(a)->value_indices"},
   {"local_minima", local_minima , METH_VARARGS, "local_minima(a)->value_indices"},
+  {"find_local_extrema", find_local_extrema , METH_VARARGS, "find_local_extrema(a, level, boundary, find_minima[, max_count, nthreads])->(values, indices)"},
   {NULL}  /* Sentinel */
 };
 
@@ -16,6 +16,12 @@
 #include <Python.h>
 #define PY_ARRAY_UNIQUE_SYMBOL PyArray_API
 #include "numpy/arrayobject.h"
+#include "numpy/npy_math.h"
+#include <time.h>
+
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
 #ifndef PyMODINIT_FUNC	/* declarations for DLL import/export */
 #define PyMODINIT_FUNC void
@@ -98,27 +104,6 @@ int get_array_type_num(ARR)
       goto fail;							\
     }
 
-#define REGRESS_GET_VALUE(ARR, PTR, value)				\
-  switch (PyArray_TYPE(ARR))						\
-    {									\
-    case PyArray_FLOAT64: value = *(npy_float64*)(PTR); break;		\
-    case PyArray_FLOAT32: value = *(npy_float32*)(PTR); break;		\
-    case PyArray_INT64: value = *(npy_int64*)(PTR); break;		\
-    case PyArray_INT32: value = *(npy_int32*)(PTR); break;		\
-    case PyArray_INT16: value = *(npy_int16*)(PTR); break;		\
-    case PyArray_INT8: value = *(npy_int8*)(PTR); break;		\
-    case PyArray_UINT64: value = *(npy_uint64*)(PTR); break;		\
-    case PyArray_UINT32: value = *(npy_uint32*)(PTR); break;		\
-    case PyArray_UINT16: value = *(npy_uint16*)(PTR); break;		\
-    case PyArray_UINT8: value = *(npy_uint8*)(PTR); break;		\
-    default:								\
-      PyErr_SetObject(PyExc_TypeError,					\
-		      PyString_FromFormat(				\
-					  "regress:get_value: unsupported array dtype %s", \
-					  PyString_AsString(PyObject_Repr((PyObject*)PyArray_DESCR(ARR)->typeobj)))); \
-      goto fail;							\
-    }
-
 
 /* 
    Notes
@@ -160,12 +145,12 @@ int get_array_type_num(ARR)
 	mat[i+1][i+1] = 1;			\
       }
 
-#define CALL_WRITE(ARGS) \
-  if (verbose && PyObject_CallFunctionObjArgs ARGS == NULL) return NULL;
-
 double compute_dot2(double a[2][2], double b[2], double y[2], int i0);
 double compute_dot3(double a[3][3], double b[3], double y[3], int i0, int i1);
 double compute_dot4(double a[4][4], double b[4], double y[4], int i0, int i1, int i2);
+void compute_solution2(double x[2], double a[2][2], double b[2]);
+void compute_solution3(double x[3], double a[3][3], double b[3]);
+void compute_solution4(double x[4], double a[4][4], double b[4]);
 
 typedef enum {KT_EPANECHNIKOV=0, KT_UNIFORM=1, KT_TRIANGULAR=2, KT_QUARTIC=3, KT_TRIWEIGHT=4, KT_TRICUBE=5,
               KT_GAUSSIAN=6 } KernelType;
@@ -307,41 +292,235 @@ static PyObject *kernel(PyObject *self, PyObject *args)
   return NULL;
 }
 
+/*
+  Arguments of regress_rows. Data and results are contiguous float64
+  arrays.
+ */
+typedef struct {
+  npy_float64* x;
+  npy_float64* y;
+  npy_float64* g;
+  npy_intp rank;
+  npy_intp sz;
+  npy_intp dims[3];
+  npy_float64 scales[3];
+  npy_intp di[3];
+  KernelType kernel_type;
+  SmoothingMethod smoothing_method;
+  BoundaryCondition boundary_condition;
+  double kernel_sum;
+} RegressArgs;
+
+/*
+  Compute regression for the rows [start, end) of the leading axes
+  (for rank 1, for the points [start, end)). Does not use Python API
+  so that it can be called with released GIL. The arguments are
+  validated by regress, so the error branches of the macros are never
+  reached.
+ */
+static void regress_rows(RegressArgs* args, npy_intp start, npy_intp end)
+{
+  npy_intp i, j, row, im1;
+  npy_intp rank = args->rank;
+  npy_intp* dims = args->dims;
+  npy_float64* scales = args->scales;
+  npy_intp* di = args->di;
+  npy_float64* x = args->x;
+  KernelType kernel_type = args->kernel_type;
+  SmoothingMethod smoothing_method = args->smoothing_method;
+  BoundaryCondition boundary_condition = args->boundary_condition;
+  double kernel_sum = args->kernel_sum;
+  int i0, i1, i2;
+  int j0, j1, j2;
+  int ki0, ki1, ki2;
+  double d0, d1, d2;
+  double r2, kv, value = 0;
+  npy_intp index;
+  for (row=start; row<end; ++row)
+    switch (rank)
+      {
+      case 1:
+	{
+	  double mat[2][2] = {{0,0},{0,0}};
+	  double rhs[2] = {0,0};
+	  double solution[2];
+	  int kkdims[1] = {-1};
+	  i0 = row;
+	  REGRESS_INIT_KERNEL_LOOP;
+	  REGRESS_KERNEL_LOOP(0);
+	  r2 = d0*d0;
+	  if (r2 <= 1.0)
+	    {
+	      value = x[j0];
+	      REGRESS_EVAL_KERNEL;
+	      kv /= kernel_sum;
+	      REGRESS_UPDATE_KKDIMS(0);
+	      rhs[0] += kv * value;
+	      mat[0][0] += kv;
+	      if (smoothing_method==SM_LINEAR)
+		{
+		  rhs[1] += kv * value * ki0;
+		  mat[0][1] += kv * ki0;
+		  mat[1][1] += kv * ki0 * ki0;
+		}
+	    }
+	  REGRESS_KERNEL_LOOP_END;
+	  /* interpolating */
+	  if (smoothing_method==SM_LINEAR)
+	    {
+	      REGRESS_APPLY_KKDIMS;
+	      value = compute_dot2(mat, rhs, solution, i0);
+	      if (args->g!=NULL)
+		for (im1=0;im1<rank;im1++)
+		  args->g[im1*args->sz + i0] = solution[im1+1];
+	    }
+	  else
+	    value = rhs[0] / mat[0][0];
+	  args->y[i0] = value;
+	}
+	break;
+      case 2:
+	{
+	  i0 = row;
+	  for (i1=0; i1<dims[1]; ++i1)
+	    {
+	      double mat[3][3] = {{0,0,0},{0,0,0},{0,0,0}};
+	      double rhs[3] = {0,0,0};
+	      double solution[3];
+	      int kkdims[2] = {-1, -1};
+	      REGRESS_INIT_KERNEL_LOOP;
+	      REGRESS_KERNEL_LOOP(0);
+	      REGRESS_KERNEL_LOOP(1);
+	      r2 = d0*d0 + d1*d1;
+	      if (r2 <= 1.0)
+		{
+		  REGRESS_EVAL_KERNEL;
+		  kv /= kernel_sum;
+		  value = x[j0*dims[1] + j1];
+		  REGRESS_UPDATE_KKDIMS(0);
+		  REGRESS_UPDATE_KKDIMS(1);
+		  rhs[0] += kv * value;
+		  mat[0][0] += kv;
+		  if (smoothing_method==SM_LINEAR)
+		    {
+		      rhs[1] += kv * value * ki0; rhs[2] += kv * value * ki1;
+		      mat[0][1] += kv * ki0; mat[0][2] += kv * ki1;
+		      mat[1][1] += kv * ki0 * ki0; mat[1][2] += kv * ki0 * ki1;
+		      mat[2][2] += kv * ki1 * ki1;
+		    }
+		}
+	      REGRESS_KERNEL_LOOP_END;
+	      REGRESS_KERNEL_LOOP_END;
+	      /* interpolating */
+	      index = i0*dims[1] + i1;
+	      if (smoothing_method==SM_LINEAR)
+		{
+		  REGRESS_APPLY_KKDIMS;
+		  value = compute_dot3(mat, rhs, solution, i0, i1);
+		  if (args->g!=NULL)
+		    for (im1=0;im1<rank;im1++)
+		      args->g[im1*args->sz + index] = solution[im1+1];
+		}
+	      else
+		value = rhs[0] / mat[0][0];
+	      args->y[index] = value;
+	    }
+	}
+	break;
+      case 3:
+	{
+	  i0 = row / dims[1];
+	  i1 = row % dims[1];
+	  for (i2=0; i2<dims[2]; ++i2)
+	    {
+	      double mat[4][4] = {{0,0,0,0},{0,0,0,0},{0,0,0,0},{0,0,0,0}};
+	      double rhs[4] = {0,0,0,0};
+	      double solution[4];
+	      int kkdims[3] = {-1, -1, -1};
+	      REGRESS_INIT_KERNEL_LOOP;
+	      REGRESS_KERNEL_LOOP(0);
+	      REGRESS_KERNEL_LOOP(1);
+	      REGRESS_KERNEL_LOOP(2);
+	      r2 = d0*d0 + d1*d1 + d2*d2;
+	      if (r2 <= 1.0)
+		{
+		  REGRESS_EVAL_KERNEL;
+		  kv /= kernel_sum;
+		  value = x[(j0*dims[1] + j1)*dims[2] + j2];
+		  REGRESS_UPDATE_KKDIMS(0);
+		  REGRESS_UPDATE_KKDIMS(1);
+		  REGRESS_UPDATE_KKDIMS(2);
+		  rhs[0] += kv * value;
+		  mat[0][0] += kv;
+		  if (smoothing_method==SM_LINEAR)
+		    {
+		      rhs[1] += kv * value * ki0; rhs[2] += kv * value * ki1; rhs[3] += kv * value * ki2;
+		      mat[0][1] += kv * ki0; mat[0][2] += kv * ki1; mat[0][3] += kv * ki2;
+		      mat[1][1] += kv * ki0 * ki0; mat[1][2] += kv * ki0 * ki1; mat[1][3] += kv * ki0 * ki2;
+		      mat[2][2] += kv * ki1 * ki1; mat[2][3] += kv * ki1 * ki2; mat[3][3] += kv * ki2 * ki2;
+		    }
+		}
+	      REGRESS_KERNEL_LOOP_END;
+	      REGRESS_KERNEL_LOOP_END;
+	      REGRESS_KERNEL_LOOP_END;
+	      /* interpolating */
+	      index = (i0*dims[1] + i1)*dims[2] + i2;
+	      if (smoothing_method==SM_LINEAR)
+		{
+		  REGRESS_APPLY_KKDIMS;
+		  value = compute_dot4(mat, rhs, solution, i0, i1, i2);
+		  if (args->g!=NULL)
+		    for (im1=0;im1<rank;im1++)
+		      args->g[im1*args->sz + index] = solution[im1+1];
+		}
+	      else
+		value = rhs[0] / mat[0][0];
+	      args->y[index] = value;
+	    }
+	}
+	break;
+      }
+  return;
+ fail:
+  return;
+}
+
+static double wall_time(void)
+{
+#ifdef _OPENMP
+  return omp_get_wtime();
+#else
+  return ((double)clock()) / CLOCKS_PER_SEC;
+#endif
+}
+
+/* Minimal interval between progress reports in seconds. */
+#define REGRESS_PROGRESS_INTERVAL 0.5
+
 static PyObject *regress(PyObject *self, PyObject *args)
 {
-  PyObject* a = NULL;
-  npy_intp sz = 0, i, j, rank=0;
-  npy_intp *dims = NULL;
+  PyObject* a_obj = NULL;
+  PyArrayObject* a = NULL;
+  npy_intp i, rank=0, nrows, start, end, batch, row;
   PyObject* scales_obj = NULL;
-  npy_float64* scales = NULL;
   PyObject* r=NULL;
   PyObject* grad=NULL;
-  int *kdims = NULL;
-  npy_intp *gdims = NULL;
-  npy_intp* di = NULL;
-  double eta;
-  int count;
-  int kn;
-  int im1, i0, i1, i2;
-  int j0, j1, j2;
+  PyObject* result=NULL;
+  npy_intp gdims[4];
   int ki0, ki1, ki2;
-  double d0, d1, d2;
-  double r2, kv, value = 0;
-  double kernel_sum;
+  int kn = 0;
+  double d0, d1, d2, r2;
   int verbose;
+  int nthreads = 1;
+  int return_gradient = 1;
   PyObject* write_func = NULL;
-  clock_t start_clock = clock();
-
-  KernelType kernel_type;
-  SmoothingMethod smoothing_method;
-  BoundaryCondition boundary_condition;
+  double start_time, last_time, now, eta;
+  RegressArgs rargs;
 
-  if (!PyArg_ParseTuple(args, "OOiiiO", &a, &scales_obj, &kernel_type, &smoothing_method, &boundary_condition, &write_func))
+  if (!PyArg_ParseTuple(args, "OOiiiO|ii", &a_obj, &scales_obj, &rargs.kernel_type, &rargs.smoothing_method,
+			&rargs.boundary_condition, &write_func, &nthreads, &return_gradient))
     return NULL;
-  //printf("kernel_type=%d\n", kernel_type);
-  //printf("smoothing_method=%d\n", smoothing_method);
-  //printf("boundary_condition=%d\n", boundary_condition);
-  if (!PyArray_Check(a))
+  if (!PyArray_Check(a_obj))
     {
       PyErr_SetString(PyExc_TypeError,"first argument must be array object");
       return NULL;
@@ -360,311 +539,801 @@ static PyObject *regress(PyObject *self, PyObject *args)
       PyErr_SetString(PyExc_TypeError,"sixth argument must be None or callable object");
       return NULL;
     }
-  sz = PyArray_SIZE(a);
-  dims = PyArray_DIMS(a);
-  rank = PyArray_NDIM(a);
+  if (rargs.smoothing_method!=SM_AVERAGE && rargs.smoothing_method!=SM_LINEAR)
+    {
+      PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
+      return NULL;
+    }
+  if (rargs.boundary_condition<BC_CONSTANT || rargs.boundary_condition>BC_REFLECTIVE)
+    {
+      PyErr_SetString(PyExc_ValueError,"regress: unknown boundary condition");
+      return NULL;
+    }
+  rank = PyArray_NDIM(a_obj);
   if (rank > 3)
     {
       PyErr_SetString(PyExc_NotImplementedError,"only rank <=3 arrays are supported");
       return NULL;
     }
+  if (rank < 1)
+    {
+      PyErr_SetString(PyExc_ValueError,"regress: unsupported array rank");
+      return NULL;
+    }
   if (PyTuple_Size(scales_obj) != rank)
     {
       PyErr_SetString(PyExc_TypeError,"second argument must have size equal to the rank of the first argument");
       return NULL;
     }
-  scales = (npy_float64*)malloc(sizeof(npy_float64)*rank);
-  kdims = (int*)malloc(sizeof(int)*rank);
-  di = (npy_intp*)malloc(sizeof(npy_intp)*rank);
-
+  switch (PyArray_TYPE(a_obj))
+    {
+    case PyArray_FLOAT64: case PyArray_FLOAT32:
+    case PyArray_INT64: case PyArray_INT32: case PyArray_INT16: case PyArray_INT8:
+    case PyArray_UINT64: case PyArray_UINT32: case PyArray_UINT16: case PyArray_UINT8:
+      break;
+    default:
+      PyErr_SetObject(PyExc_TypeError,
+		      PyString_FromFormat("regress: unsupported array dtype %s",
+					  PyString_AsString(PyObject_Repr((PyObject*)PyArray_DESCR(a_obj)->typeobj))));
+      return NULL;
+    }
+  rargs.rank = rank;
+  rargs.sz = PyArray_SIZE(a_obj);
   for (i=0; i<rank; ++i)
     {
-      scales[i] = PyFloat_AsDouble(PyTuple_GET_ITEM(scales_obj, i));
-      di[i] = (npy_intp)(ceil(1 / scales[i]));
-      kdims[i] = 2*di[i]+1;
-      //printf("kdims[%d]=%d\n",(int)i,(int)kdims[i]);
+      rargs.dims[i] = PyArray_DIMS(a_obj)[i];
+      rargs.scales[i] = PyFloat_AsDouble(PyTuple_GET_ITEM(scales_obj, i));
+      rargs.di[i] = (npy_intp)(ceil(1 / rargs.scales[i]));
+      gdims[i+1] = rargs.dims[i];
     }
-  if (smoothing_method==SM_LINEAR)
+  gdims[0] = rank;
+  rargs.kernel_sum = calc_kernel_sum(rargs.kernel_type, rank, rargs.scales, rargs.di);
+  if (rargs.kernel_sum==0.0)
+    return NULL;
+
+  a = (PyArrayObject*)PyArray_ContiguousFromAny(a_obj, PyArray_FLOAT64, rank, rank);
+  if (a==NULL)
+    return NULL;
+  r = PyArray_SimpleNew(rank, rargs.dims, PyArray_FLOAT64);
+  if (r==NULL)
+    goto fail;
+  if (rargs.smoothing_method==SM_LINEAR && return_gradient)
     {
-      gdims = (npy_intp*)malloc(sizeof(npy_intp)*(rank+1));
-      gdims[0] = rank;
-      for (i=0; i<rank; ++i)
-	gdims[i+1] = PyArray_DIMS(a)[i];
+      grad = PyArray_SimpleNew(rank+1, gdims, PyArray_FLOAT64);
+      if (grad==NULL)
+	goto fail;
     }
+  rargs.x = (npy_float64*)PyArray_DATA(a);
+  rargs.y = (npy_float64*)PyArray_DATA(r);
+  rargs.g = (grad==NULL ? NULL : (npy_float64*)PyArray_DATA(grad));
 
-  r = PyArray_SimpleNew(rank, PyArray_DIMS(a), PyArray_TYPE(a));
-  if (smoothing_method==SM_LINEAR)
-    grad = PyArray_SimpleNew(rank+1, gdims, PyArray_TYPE(a));
-  else
+  if (nthreads<1)
+    {
+#ifdef _OPENMP
+      nthreads = omp_get_max_threads();
+#else
+      nthreads = 1;
+#endif
+    }
+  nrows = (rank==1 ? rargs.dims[0] : rargs.sz / rargs.dims[rank-1]);
+  if (rargs.sz==0)
+    nrows = 0;
+  /* rows are processed in batches, between the batches the progress
+     is reported and signals are checked */
+  batch = nrows / 100;
+  if (batch < nthreads)
+    batch = nthreads;
+  if (verbose)
+    {
+      /* number of kernel points, used in progress report */
+      for (ki0=-rargs.di[0]; ki0<=rargs.di[0]; ++ki0)
+	for (ki1=(rank>1?-rargs.di[1]:0); ki1<=(rank>1?rargs.di[1]:0); ++ki1)
+	  for (ki2=(rank>2?-rargs.di[2]:0); ki2<=(rank>2?rargs.di[2]:0); ++ki2)
+	    {
+	      d0 = rargs.scales[0] * ki0;
+	      d1 = (rank>1 ? rargs.scales[1] * ki1 : 0.0);
+	      d2 = (rank>2 ? rargs.scales[2] * ki2 : 0.0);
+	      r2 = d0*d0 + d1*d1 + d2*d2;
+	      if (r2 <= 1.0)
+		kn++;
+	    }
+      if (rank>1 && PyObject_CallFunction(write_func, "s", "\n")==NULL)
+	goto fail;
+    }
+  start_time = last_time = wall_time();
+  for (start=0; start<nrows; start=end)
+    {
+      end = (start + batch < nrows ? start + batch : nrows);
+      Py_BEGIN_ALLOW_THREADS
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(nthreads) if(nthreads>1)
+#endif
+      for (row=start; row<end; ++row)
+	regress_rows(&rargs, row, row+1);
+      Py_END_ALLOW_THREADS
+      if (PyErr_CheckSignals())
+	goto fail;
+      now = wall_time();
+      if (verbose && rank>1 && (now - last_time >= REGRESS_PROGRESS_INTERVAL || end==nrows))
+	{
+	  last_time = now;
+	  eta = (now - start_time) * (nrows/((double)end)-1.0);
+	  if (PyObject_CallFunction(write_func, "sdid",
+				    "\rComputing regression: %6.2f%% done, #kernel points:%d, ETA:%4.1fs  ",
+				    (end*100.0)/nrows, kn, eta)==NULL)
+	    goto fail;
+	}
+    }
+  if (verbose && rank>1 && PyObject_CallFunction(write_func, "s", "\n")==NULL)
+    goto fail;
+
+  /* results have the type of input array */
+  if (PyArray_TYPE(a_obj)!=PyArray_FLOAT64)
+    {
+      result = PyArray_Cast((PyArrayObject*)r, PyArray_TYPE(a_obj));
+      Py_DECREF(r);
+      r = result;
+      if (r==NULL)
+	goto fail;
+      if (grad!=NULL)
+	{
+	  result = PyArray_Cast((PyArrayObject*)grad, PyArray_TYPE(a_obj));
+	  Py_DECREF(grad);
+	  grad = result;
+	  if (grad==NULL)
+	    goto fail;
+	}
+    }
+  if (grad==NULL)
     {
       grad = Py_None;
       Py_INCREF(grad);
     }
-  kernel_sum = calc_kernel_sum(kernel_type, rank, scales, di);
-  if (kernel_sum==0.0)
-    goto fail;
+  Py_DECREF(a);
+  return Py_BuildValue("NN", r, grad);
+ fail:
+  Py_XDECREF(a);
+  Py_XDECREF(r);
+  Py_XDECREF(grad);
+  return NULL;
+}
 
-  kn = 0;
-  count = 0;
-  switch (rank)
+static npy_intp map_index(npy_intp j, npy_intp n, BoundaryCondition boundary_condition)
+{
+  switch (boundary_condition)
     {
-    case 1:
+    case BC_CONSTANT: return (j>=n ? n-1 : (j<0 ? 0 : j));
+    case BC_FINITE: return ((j>=n || j<0) ? -1 : j);
+    case BC_PERIODIC:
+      while (j<0) j += n;
+      while (j>=n) j -= n;
+      return j;
+    case BC_REFLECTIVE:
+      if (n==1) return 0;
+      while (j<0 || j>=n)
+	{
+	  if (j<0) j = -j;
+	  if (j>=n) j = 2*n-j-2;
+	}
+      return j;
+    }
+  return -1;
+}
+
+/*
+  Apply 1D averaging kernel along given axis of a contiguous float64
+  array. The result is normalized with the sum of kernel values that
+  are used for given point, so applying 1D averaging along all axes
+  gives the same result as averaging with a separable kernel.
+ */
+static PyObject *average_1d(PyObject *self, PyObject *args)
+{
+  PyObject* a_obj = NULL;
+  PyObject* k_obj = NULL;
+  PyArrayObject* a = NULL;
+  PyArrayObject* k = NULL;
+  PyObject* r = NULL;
+  int axis;
+  BoundaryCondition boundary_condition;
+  npy_intp outer=1, n, inner=1, kn, di, i, j, o, q, m, rank;
+  npy_float64 *x, *w, *y, *yrow, *xrow;
+  double den;
+  if (!PyArg_ParseTuple(args, "OiOi", &a_obj, &axis, &k_obj, &boundary_condition))
+    return NULL;
+  a = (PyArrayObject*)PyArray_ContiguousFromAny(a_obj, PyArray_FLOAT64, 1, 0);
+  if (a==NULL)
+    return NULL;
+  k = (PyArrayObject*)PyArray_ContiguousFromAny(k_obj, PyArray_FLOAT64, 1, 1);
+  if (k==NULL)
+    goto fail;
+  rank = PyArray_NDIM(a);
+  if (axis<0 || axis>=rank)
+    {
+      PyErr_SetString(PyExc_ValueError,"average_1d: axis out of range");
+      goto fail;
+    }
+  kn = PyArray_DIMS(k)[0];
+  if (kn%2==0)
+    {
+      PyErr_SetString(PyExc_ValueError,"average_1d: kernel size must be odd");
+      goto fail;
+    }
+  di = kn/2;
+  for (i=0; i<axis; ++i)
+    outer *= PyArray_DIMS(a)[i];
+  n = PyArray_DIMS(a)[axis];
+  for (i=axis+1; i<rank; ++i)
+    inner *= PyArray_DIMS(a)[i];
+  r = PyArray_SimpleNew(rank, PyArray_DIMS(a), PyArray_FLOAT64);
+  if (r==NULL)
+    goto fail;
+  x = (npy_float64*)PyArray_DATA(a);
+  w = (npy_float64*)PyArray_DATA(k);
+  y = (npy_float64*)PyArray_DATA(r);
+  Py_BEGIN_ALLOW_THREADS
+  for (o=0; o<outer; ++o)
+    for (i=0; i<n; ++i)
       {
-	double mat[2][2] = {{0,0},{0,0}};
-	double rhs[2] = {0,0};
-	double solution[2];
-	int kkdims[1] = {-1};
-	REGRESS_LOOP(0);
-	REGRESS_INIT_KERNEL_LOOP;
-	REGRESS_KERNEL_LOOP(0);
-	r2 = d0*d0;
-	if (r2 <= 1.0)
-	  {
-	    REGRESS_GET_VALUE(a, PyArray_GETPTR1(a, j0), value);
-	    REGRESS_EVAL_KERNEL;
-	    kv /= kernel_sum;
-	    kn++;			
-	    REGRESS_UPDATE_KKDIMS(0);
-	    switch (smoothing_method)
-	      {
-	      case SM_AVERAGE:
-		rhs[0] += kv * value;
-		mat[0][0] += kv;
-		break;
-	      case SM_LINEAR:
-		rhs[0] += kv * value; rhs[1] += kv * value * ki0;
-		mat[0][0] += kv; mat[0][1] += kv * ki0;
-		mat[1][1] += kv * ki0 * ki0;
-		break;
-	      default:
-		PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-		goto fail;
-	      }
-	    //printf("i0=%d, ki0=%d, j0=%d, kv=%f, value=%f\n",i0,ki0,j0,kv,value);
-	  }
-	REGRESS_KERNEL_LOOP_END;
-	/* interpolating */
-	switch (smoothing_method)
+	yrow = y + (o*n + i)*inner;
+	for (q=0; q<inner; ++q)
+	  yrow[q] = 0.0;
+	den = 0.0;
+	for (m=0; m<kn; ++m)
 	  {
-	  case SM_AVERAGE:
-	    value = rhs[0] / mat[0][0];
-	    break;
-	  case SM_LINEAR:
-	    REGRESS_APPLY_KKDIMS;
-	    value = compute_dot2(mat, rhs, solution, i0);
-	    break;
-	  default: 
-	    PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-	    goto fail;
+	    j = map_index(i+m-di, n, boundary_condition);
+	    if (j<0)
+	      continue;
+	    den += w[m];
+	    xrow = x + (o*n + j)*inner;
+	    for (q=0; q<inner; ++q)
+	      yrow[q] += w[m] * xrow[q];
 	  }
-	REGRESS_SET_VALUE(r, PyArray_GETPTR1(r, i0), value);
-	if (smoothing_method==SM_LINEAR)
-	  for (im1=0;im1<rank;im1++)
-	    REGRESS_SET_VALUE(grad, PyArray_GETPTR2(grad, im1, i0), solution[im1+1]);
-	//printf("r[%d] = %f\n",i0, value);
-	count ++;
-	REGRESS_LOOP_END;
+	for (q=0; q<inner; ++q)
+	  yrow[q] /= den;
       }
-      break;
+  Py_END_ALLOW_THREADS
+  Py_DECREF(a);
+  Py_DECREF(k);
+  return r;
+ fail:
+  Py_XDECREF(a);
+  Py_XDECREF(k);
+  Py_XDECREF(r);
+  return NULL;
+}
 
-    case 2:
-      {	
-	double mat[3][3] = {{0,0,0},{0,0,0},{0,0,0}};
-	double rhs[3] = {0,0,0};
-	double solution[3];
-	int kkdims[2] = {-1, -1};
-	if (verbose)
-	  {
-	    if (PyObject_CallFunctionObjArgs(write_func,
-					     PyString_FromString("\n"),
-					     NULL)==NULL)
-	      goto fail;
-	  }
-	REGRESS_LOOP(0);
-	REGRESS_LOOP(1);
-	/* computing neighborhood indices and kernel values
-	 */
-	REGRESS_INIT_KERNEL_LOOP;
-	kn = 0;
-	REGRESS_KERNEL_LOOP(0);
-	REGRESS_KERNEL_LOOP(1);
-	r2 = d0*d0 + d1*d1;
-	if (r2 <= 1.0)
+/*
+  Apply 1D uniform averaging kernel along given axis of a contiguous
+  float64 array using prefix sums. The kernel has weight 1 at
+  offsets |t|<m and end_weight at offsets |t|==m, so the cost per
+  point does not depend on m. The result is normalized as in
+  average_1d. Columns of the inner axes are processed in blocks of
+  UNIFORM_1D_BLOCK so that prefix sums fit into cache.
+
+  Non-finite data values are excluded from prefix sums and the
+  windows that contain them are summed directly, so that they
+  propagate as in average_1d.
+ */
+#define UNIFORM_1D_BLOCK 256
+
+static PyObject *uniform_1d(PyObject *self, PyObject *args)
+{
+  PyObject* a_obj = NULL;
+  PyArrayObject* a = NULL;
+  PyObject* r = NULL;
+  int axis;
+  BoundaryCondition boundary_condition;
+  npy_intp outer=1, n, inner=1, m, ne, i, j, o, q, q0, nq, s, t, lo, hi, rank;
+  npy_float64 *x, *y, *xrow, *yrow, *P = NULL, *Pr, *Pl;
+  npy_intp *C = NULL, *NF = NULL;
+  double end_weight, v, den, full, part;
+  int has_nonfinite = 0;
+  if (!PyArg_ParseTuple(args, "Oindi", &a_obj, &axis, &m, &end_weight, &boundary_condition))
+    return NULL;
+  a = (PyArrayObject*)PyArray_ContiguousFromAny(a_obj, PyArray_FLOAT64, 1, 0);
+  if (a==NULL)
+    return NULL;
+  rank = PyArray_NDIM(a);
+  if (axis<0 || axis>=rank)
+    {
+      PyErr_SetString(PyExc_ValueError,"uniform_1d: axis out of range");
+      goto fail;
+    }
+  if (m<0)
+    {
+      PyErr_SetString(PyExc_ValueError,"uniform_1d: kernel half-width must be non-negative");
+      goto fail;
+    }
+  if (m==0)
+    end_weight = 1.0;
+  for (i=0; i<axis; ++i)
+    outer *= PyArray_DIMS(a)[i];
+  n = PyArray_DIMS(a)[axis];
+  for (i=axis+1; i<rank; ++i)
+    inner *= PyArray_DIMS(a)[i];
+  ne = n + 2*m;
+  r = PyArray_SimpleNew(rank, PyArray_DIMS(a), PyArray_FLOAT64);
+  if (r==NULL)
+    goto fail;
+  x = (npy_float64*)PyArray_DATA(a);
+  y = (npy_float64*)PyArray_DATA(r);
+  for (i=0; i<PyArray_SIZE(a); ++i)
+    if (!npy_isfinite(x[i]))
+      {
+	has_nonfinite = 1;
+	break;
+      }
+  P = (npy_float64*)malloc(sizeof(npy_float64)*(ne+1)*UNIFORM_1D_BLOCK);
+  C = (npy_intp*)malloc(sizeof(npy_intp)*(ne+1));
+  if (has_nonfinite)
+    NF = (npy_intp*)malloc(sizeof(npy_intp)*(ne+1)*UNIFORM_1D_BLOCK);
+  if (P==NULL || C==NULL || (has_nonfinite && NF==NULL))
+    {
+      PyErr_NoMemory();
+      goto fail;
+    }
+  Py_BEGIN_ALLOW_THREADS
+  /* prefix counts of points within boundaries, index s is for t=s-m */
+  C[0] = 0;
+  for (s=0; s<ne; ++s)
+    C[s+1] = C[s] + (map_index(s-m, n, boundary_condition)>=0);
+  for (o=0; o<outer; ++o)
+    for (q0=0; q0<inner; q0+=UNIFORM_1D_BLOCK)
+      {
+	nq = (inner-q0<UNIFORM_1D_BLOCK ? inner-q0 : UNIFORM_1D_BLOCK);
+	for (q=0; q<nq; ++q)
+	  P[q] = 0.0;
+	if (NF!=NULL)
+	  for (q=0; q<nq; ++q)
+	    NF[q] = 0;
+	for (s=0; s<ne; ++s)
 	  {
-	    REGRESS_EVAL_KERNEL;
-	    kv /= kernel_sum;
-	    kn++;			
-	    REGRESS_GET_VALUE(a, PyArray_GETPTR2(a, j0, j1), value);
-	    REGRESS_UPDATE_KKDIMS(0);
-	    REGRESS_UPDATE_KKDIMS(1);
-	    switch (smoothing_method)
+	    j = map_index(s-m, n, boundary_condition);
+	    Pl = P + s*nq;
+	    Pr = Pl + nq;
+	    if (j<0)
 	      {
-	      case SM_AVERAGE:
-		rhs[0] += kv * value;
-		mat[0][0] += kv;
-		break;
-	      case SM_LINEAR:
-		rhs[0] += kv * value; rhs[1] += kv * value * ki0; rhs[2] += kv * value * ki1;
-		mat[0][0] += kv; mat[0][1] += kv * ki0; mat[0][2] += kv * ki1;
-		mat[1][1] += kv * ki0 * ki0; mat[1][2] += kv * ki0 * ki1;
-		mat[2][2] += kv * ki1 * ki1;
-		break;
-	      default:
-		PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-		goto fail;
+		for (q=0; q<nq; ++q)
+		  Pr[q] = Pl[q];
+		if (NF!=NULL)
+		  for (q=0; q<nq; ++q)
+		    NF[(s+1)*nq+q] = NF[s*nq+q];
+		continue;
 	      }
+	    xrow = x + (o*n + j)*inner + q0;
+	    if (NF==NULL)
+	      for (q=0; q<nq; ++q)
+		Pr[q] = Pl[q] + xrow[q];
+	    else
+	      for (q=0; q<nq; ++q)
+		{
+		  v = xrow[q];
+		  NF[(s+1)*nq+q] = NF[s*nq+q];
+		  if (!npy_isfinite(v))
+		    {
+		      NF[(s+1)*nq+q]++;
+		      v = 0.0;
+		    }
+		  Pr[q] = Pl[q] + v;
+		}
 	  }
-	REGRESS_KERNEL_LOOP_END;
-	REGRESS_KERNEL_LOOP_END;
-
-	/* interpolating */
-	switch (smoothing_method)
+	for (i=0; i<n; ++i)
 	  {
-	  case SM_AVERAGE:
-	    value = rhs[0] / mat[0][0];
-	    break;
-	  case SM_LINEAR:
-	    REGRESS_APPLY_KKDIMS;
-	    value = compute_dot3(mat, rhs, solution, i0, i1);
-	    break;
-	  default: 
-	    PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-	    goto fail;
+	    /* window [i-m, i+m] corresponds to prefix indices [i, i+2m+1) */
+	    lo = i;
+	    hi = i + 2*m + 1;
+	    den = end_weight * (C[hi] - C[lo]);
+	    if (m>0)
+	      den += (1.0 - end_weight) * (C[hi-1] - C[lo+1]);
+	    yrow = y + (o*n + i)*inner + q0;
+	    for (q=0; q<nq; ++q)
+	      {
+		full = P[hi*nq+q] - P[lo*nq+q];
+		part = (m>0 ? P[(hi-1)*nq+q] - P[(lo+1)*nq+q] : 0.0);
+		if (NF!=NULL && NF[hi*nq+q] > NF[lo*nq+q])
+		  {
+		    full = part = 0.0;
+		    for (t=-m; t<=m; ++t)
+		      {
+			j = map_index(i+t, n, boundary_condition);
+			if (j<0)
+			  continue;
+			v = x[(o*n + j)*inner + q0 + q];
+			full += v;
+			if (t>-m && t<m)
+			  part += v;
+		      }
+		  }
+		yrow[q] = (end_weight * full + (1.0 - end_weight) * part) / den;
+	      }
 	  }
-	REGRESS_SET_VALUE(r, PyArray_GETPTR2(r, i0, i1), value);
-	if (smoothing_method==SM_LINEAR)
-	  for (im1=0;im1<rank;im1++)
-	    REGRESS_SET_VALUE(grad, PyArray_GETPTR3(grad, im1, i0, i1), solution[im1+1]);
-	count ++;
       }
-      if (verbose)
+  Py_END_ALLOW_THREADS
+  free(P);
+  free(C);
+  if (NF!=NULL) free(NF);
+  Py_DECREF(a);
+  return r;
+ fail:
+  if (P!=NULL) free(P);
+  if (C!=NULL) free(C);
+  if (NF!=NULL) free(NF);
+  Py_XDECREF(a);
+  Py_XDECREF(r);
+  return NULL;
+}
+
+/*
+  Uniform kernel regression using prefix sums along the last axis.
+
+  The kernel support (ellipsoid or box) is split into segments along
+  the last axis, one segment per offset of the leading axes. Window
+  sums of data values (and of data values times position, for linear
+  regression) over a segment are differences of prefix sums, so the
+  cost per point is proportional to the number of segments, that is,
+  it does not depend on the kernel width along the last axis but it
+  grows as k**(rank-1) with the kernel width k along the leading
+  axes. In 1D the cost does not depend on the kernel width at all.
+  Averaging with box support is separable, see uniform_1d.
+
+  Non-finite data values are excluded from prefix sums and are added
+  directly to the windows that contain them, so that they propagate
+  as in the direct summation of the regress function.
+ */
+
+typedef struct {
+  npy_intp offset[3]; /* offsets of leading axes */
+  npy_intp m;         /* half-width of segment along the last axis */
+  int h;              /* when 1, end points of segment have half weight */
+  double weight;
+} RegressSegment;
+
+static double uniform_box_weight(double d)
+{
+  double r2 = d*d;
+  return (r2 < 1.0 ? 1.0 : (r2 == 1.0 ? 0.5 : 0.0));
+}
+
+static int make_uniform_segments(RegressSegment* segments, npy_intp rank, double* scales, npy_intp* di, int box)
+{
+  npy_intp o[3] = {0, 0, 0};
+  npy_intp a, k, nseg = 0, lrank = rank - 1;
+  double p, w, d;
+  for (a=0; a<lrank; ++a)
+    o[a] = -di[a];
+  while (1)
+    {
+      p = 0.0;
+      w = 1.0;
+      for (a=0; a<lrank; ++a)
 	{
-	  eta = (clock() - start_clock) * (sz/((double)count)-1.0) / CLOCKS_PER_SEC;
-	  CALL_WRITE((write_func,
-		      PyString_FromString("\rComputing regression: %6.2f%% done, #kernel points:%d, ETA:%4.1fs  "),
-		      PyFloat_FromDouble((count*100.0)/sz),
-		      PyInt_FromLong(kn),
-		      PyFloat_FromDouble(eta),
-		      NULL));
+	  d = scales[a] * o[a];
+	  if (box)
+	    w *= uniform_box_weight(d);
+	  else
+	    p = p + d*d;
 	}
-      REGRESS_LOOP_END;
-      REGRESS_LOOP_END;
-      CALL_WRITE((write_func, PyString_FromString("\n"), NULL));
-      break;
-    case 3:
+      if (w > 0.0 && p <= 1.0)
+	{
+	  for (k=0; k<di[lrank]; ++k)
+	    {
+	      d = scales[lrank] * (k+1);
+	      if (p + d*d > 1.0)
+		break;
+	    }
+	  d = scales[lrank] * k;
+	  for (a=0; a<lrank; ++a)
+	    segments[nseg].offset[a] = o[a];
+	  segments[nseg].m = k;
+	  segments[nseg].h = (p + d*d == 1.0);
+	  segments[nseg].weight = w;
+	  nseg++;
+	}
+      for (a=lrank-1; a>=0; --a)
+	{
+	  if (o[a] < di[a])
+	    {
+	      o[a]++;
+	      break;
+	    }
+	  o[a] = -di[a];
+	}
+      if (a<0)
+	break;
+    }
+  return nseg;
+}
+
+/* Sums of 1, u, u*u over integers u in [lo, hi]. */
+static void range_moments(npy_intp lo, npy_intp hi, double* s0, double* s1, double* s2)
+{
+  double l = lo - 1, h = hi;
+  if (hi < lo)
+    {
+      *s0 = *s1 = *s2 = 0.0;
+      return;
+    }
+  *s0 = h - l;
+  *s1 = 0.5 * (h*(h+1) - l*(l+1));
+  *s2 = (h*(h+1)*(2*h+1) - l*(l+1)*(2*l+1)) / 6.0;
+}
+
+static PyObject *regress_uniform(PyObject *self, PyObject *args)
+{
+  PyObject* a_obj = NULL;
+  PyObject* scales_obj = NULL;
+  PyArrayObject* a = NULL;
+  PyObject* r = NULL;
+  PyObject* grad = NULL;
+  SmoothingMethod smoothing_method;
+  BoundaryCondition boundary_condition;
+  int box;
+  npy_intp rank, lrank, i, n, ne, E, nrows, row, col, nseg, c, s, t, jt, lo, hi, clo, chi;
+  npy_intp dims[3], gdims[4], di[3], index[3], j[3], kkdims[3];
+  double scales[3];
+  RegressSegment* segments = NULL;
+  double *x, *y, *g, *F0 = NULL, *F1 = NULL, *Fr0, *Fr1, *xr;
+  npy_intp* NF = NULL, *NFr;
+  double mat[4][4], rhs[4], solution[4];
+  double S0, Su, Suu, F, Fu, s0, s1, s2, f0, f1, v, wfac;
+  int linear, last_distinct, has_nonfinite = 0;
+  int return_gradient = 1;
+  if (!PyArg_ParseTuple(args, "OOiii|i", &a_obj, &scales_obj, &smoothing_method, &boundary_condition, &box,
+			&return_gradient))
+    return NULL;
+  if (!PyTuple_Check(scales_obj))
+    {
+      PyErr_SetString(PyExc_TypeError,"second argument must be tuple object");
+      return NULL;
+    }
+  a = (PyArrayObject*)PyArray_ContiguousFromAny(a_obj, PyArray_FLOAT64, 1, 3);
+  if (a==NULL)
+    return NULL;
+  rank = PyArray_NDIM(a);
+  lrank = rank - 1;
+  if (PyTuple_Size(scales_obj) != rank)
+    {
+      PyErr_SetString(PyExc_TypeError,"second argument must have size equal to the rank of the first argument");
+      goto fail;
+    }
+  linear = (smoothing_method==SM_LINEAR);
+  nseg = 1;
+  for (i=0; i<rank; ++i)
+    {
+      dims[i] = PyArray_DIMS(a)[i];
+      gdims[i+1] = dims[i];
+      scales[i] = PyFloat_AsDouble(PyTuple_GET_ITEM(scales_obj, i));
+      di[i] = (npy_intp)(ceil(1 / scales[i]));
+      if (i<lrank)
+	nseg *= 2*di[i]+1;
+    }
+  gdims[0] = rank;
+  n = dims[lrank];
+  E = di[lrank];
+  ne = n + 2*E;
+  nrows = PyArray_SIZE(a) / (n ? n : 1);
+
+  r = PyArray_SimpleNew(rank, dims, PyArray_FLOAT64);
+  if (r==NULL)
+    goto fail;
+  if (linear && return_gradient)
+    {
+      grad = PyArray_SimpleNew(rank+1, gdims, PyArray_FLOAT64);
+      if (grad==NULL)
+	goto fail;
+    }
+  else
+    {
+      grad = Py_None;
+      Py_INCREF(grad);
+    }
+  segments = (RegressSegment*)malloc(sizeof(RegressSegment)*nseg);
+  F0 = (double*)malloc(sizeof(double)*nrows*(ne+1));
+  if (linear)
+    F1 = (double*)malloc(sizeof(double)*nrows*(ne+1));
+  if (segments==NULL || F0==NULL || (linear && F1==NULL))
+    {
+      PyErr_NoMemory();
+      goto fail;
+    }
+  x = (double*)PyArray_DATA(a);
+  y = (double*)PyArray_DATA(r);
+  g = (grad!=Py_None ? (double*)PyArray_DATA(grad) : NULL);
+  for (i=0; i<PyArray_SIZE(a); ++i)
+    if (!npy_isfinite(x[i]))
       {
-	double mat[4][4] = {{0,0,0,0},{0,0,0,0},{0,0,0,0},{0,0,0,0}};
-	double rhs[4] = {0,0,0,0};
-	double solution[4];
-	int kkdims[3] = {-1, -1, -1};
+	has_nonfinite = 1;
+	break;
+      }
+  if (has_nonfinite)
+    {
+      NF = (npy_intp*)malloc(sizeof(npy_intp)*nrows*(ne+1));
+      if (NF==NULL)
+	{
+	  PyErr_NoMemory();
+	  goto fail;
+	}
+    }
 
-	if (verbose)
-	  {
-	    if (PyObject_CallFunctionObjArgs(write_func,
-					     PyString_FromString("\n"),
-					     NULL)==NULL)
-	      goto fail;
-	  }
-	REGRESS_LOOP(0);
-	REGRESS_LOOP(1);
-	REGRESS_LOOP(2);
-	/* computing neighborhood indices and kernel values
-	 */
-	REGRESS_INIT_KERNEL_LOOP;
-	kn = 0;
-	REGRESS_KERNEL_LOOP(0);
-	REGRESS_KERNEL_LOOP(1);
-	REGRESS_KERNEL_LOOP(2);
-	r2 = d0*d0 + d1*d1 + d2*d2;
-	if (r2 <= 1.0)
-	  {
-	    REGRESS_EVAL_KERNEL;
-	    kv /= kernel_sum;
-	    kn++;			
-	    REGRESS_GET_VALUE(a, PyArray_GETPTR3(a, j0, j1, j2), value);
-	    REGRESS_UPDATE_KKDIMS(0);
-	    REGRESS_UPDATE_KKDIMS(1);
-	    REGRESS_UPDATE_KKDIMS(2);			
-	    switch (smoothing_method)
+  Py_BEGIN_ALLOW_THREADS
+  nseg = make_uniform_segments(segments, rank, scales, di, box);
+  /* prefix sums of extended rows */
+  for (row=0; row<nrows; ++row)
+    {
+      xr = x + row*n;
+      Fr0 = F0 + row*(ne+1);
+      Fr1 = (linear ? F1 + row*(ne+1) : NULL);
+      NFr = (NF==NULL ? NULL : NF + row*(ne+1));
+      Fr0[0] = 0.0;
+      if (linear) Fr1[0] = 0.0;
+      if (NFr!=NULL) NFr[0] = 0;
+      for (t=-E; t<n+E; ++t)
+	{
+	  jt = map_index(t, n, boundary_condition);
+	  v = (jt<0 ? 0.0 : xr[jt]);
+	  s = t + E;
+	  if (NFr!=NULL)
+	    {
+	      NFr[s+1] = NFr[s];
+	      if (!npy_isfinite(v))
+		{
+		  NFr[s+1]++;
+		  v = 0.0;
+		}
+	    }
+	  Fr0[s+1] = Fr0[s] + v;
+	  if (linear) Fr1[s+1] = Fr1[s] + v * s;
+	}
+    }
+  for (row=0; row<nrows; ++row)
+    {
+      /* leading indices of output row */
+      for (i=lrank-1, t=row; i>=0; --i)
+	{
+	  index[i] = t % dims[i];
+	  t /= dims[i];
+	}
+      for (col=0; col<n; ++col)
+	{
+	  memset(mat, 0, sizeof(mat));
+	  memset(rhs, 0, sizeof(rhs));
+	  for (i=0; i<lrank; ++i)
+	    kkdims[i] = -1;
+	  last_distinct = 0;
+	  for (c=0; c<nseg; ++c)
+	    {
+	      /* source row */
+	      for (i=0, t=0; i<lrank; ++i)
+		{
+		  j[i] = map_index(index[i] + segments[c].offset[i], dims[i], boundary_condition);
+		  if (j[i]<0)
+		    break;
+		  t = t*dims[i] + j[i];
+		}
+	      if (i<lrank)
+		continue;
+	      Fr0 = F0 + t*(ne+1);
+	      Fr1 = (linear ? F1 + t*(ne+1) : NULL);
+	      NFr = (NF==NULL ? NULL : NF + t*(ne+1));
+	      xr = x + t*n;
+	      S0 = Su = Suu = F = Fu = 0.0;
+	      wfac = (segments[c].h ? 0.5 : 1.0) * segments[c].weight;
+	      for (s=segments[c].m; s>=segments[c].m-segments[c].h && s>=0; --s)
+		{
+		  lo = col - s;
+		  hi = col + s;
+		  if (boundary_condition==BC_FINITE)
+		    {
+		      clo = (lo<0 ? 0 : lo);
+		      chi = (hi>=n ? n-1 : hi);
+		    }
+		  else
+		    {
+		      clo = lo;
+		      chi = hi;
+		    }
+		  range_moments(clo-col, chi-col, &s0, &s1, &s2);
+		  f0 = Fr0[hi+E+1] - Fr0[lo+E];
+		  f1 = (linear ? (Fr1[hi+E+1] - Fr1[lo+E]) - (col+E) * f0 : 0.0);
+		  if (NFr!=NULL && NFr[hi+E+1] > NFr[lo+E])
+		    for (t=lo; t<=hi; ++t)
+		      {
+			jt = map_index(t, n, boundary_condition);
+			if (jt<0 || npy_isfinite(xr[jt]))
+			  continue;
+			f0 += xr[jt];
+			if (linear) f1 += xr[jt] * (t-col);
+		      }
+		  S0 += wfac * s0; Su += wfac * s1; Suu += wfac * s2;
+		  F += wfac * f0; Fu += wfac * f1;
+		}
+	      mat[0][0] += S0;
+	      rhs[0] += F;
+	      if (!linear)
+		continue;
+	      if (segments[c].m > 0 && n > 1)
+		last_distinct = 1;
+	      for (i=0; i<lrank; ++i)
+		{
+		  if (kkdims[i]==-1)
+		    kkdims[i] = j[i];
+		  else if (kkdims[i]>=0 && kkdims[i]!=j[i])
+		    kkdims[i] = -2;
+		  mat[0][i+1] += segments[c].offset[i] * S0;
+		  rhs[i+1] += segments[c].offset[i] * F;
+		  for (s=i; s<lrank; ++s)
+		    mat[i+1][s+1] += segments[c].offset[i] * segments[c].offset[s] * S0;
+		  mat[i+1][rank] += segments[c].offset[i] * Su;
+		}
+	      mat[0][rank] += Su;
+	      mat[rank][rank] += Suu;
+	      rhs[rank] += Fu;
+	    }
+	  if (!linear)
+	    {
+	      y[row*n+col] = rhs[0] / mat[0][0];
+	      continue;
+	    }
+	  kkdims[lrank] = (last_distinct ? -2 : 0);
+	  for (i=0; i<rank; ++i)
+	    if (kkdims[i]!=-2)
 	      {
-	      case SM_AVERAGE:
-		rhs[0] += kv * value;
-		mat[0][0] += kv;
-		break;
-	      case SM_LINEAR:
-		rhs[0] += kv * value; rhs[1] += kv * value * ki0; rhs[2] += kv * value * ki1; rhs[3] += kv * value * ki2;
-		mat[0][0] += kv; mat[0][1] += kv * ki0; mat[0][2] += kv * ki1; mat[0][3] += kv * ki2;
-		mat[1][1] += kv * ki0 * ki0; mat[1][2] += kv * ki0 * ki1; mat[1][3] += kv * ki0 * ki2;
-		mat[2][2] += kv * ki1 * ki1; mat[2][3] += kv * ki1 * ki2; mat[3][3] += kv * ki2 * ki2;
-		break;
-	      default:
-		PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-		goto fail;
+		rhs[i+1] = 0;
+		for (s=0; s<=rank; ++s)
+		  mat[i+1][s] = mat[s][i+1] = 0;
+		mat[i+1][i+1] = 1;
 	      }
-	  }
-	REGRESS_KERNEL_LOOP_END;
-	REGRESS_KERNEL_LOOP_END;
-	REGRESS_KERNEL_LOOP_END;
-
-	/* interpolating */
-	if (kn>1)
-	  switch (smoothing_method)
+	  switch (rank)
 	    {
-	    case SM_AVERAGE:
-	      value = rhs[0] / mat[0][0];
+	    case 1:
+	      {
+		double mat2[2][2] = {{mat[0][0], mat[0][1]}, {mat[1][0], mat[1][1]}};
+		compute_solution2(solution, mat2, rhs);
+	      }
 	      break;
-	    case SM_LINEAR:
-	      REGRESS_APPLY_KKDIMS;
-	      value = compute_dot4(mat, rhs, solution, i0, i1, i2);
+	    case 2:
+	      {
+		double mat3[3][3] = {{mat[0][0], mat[0][1], mat[0][2]},
+				     {mat[1][0], mat[1][1], mat[1][2]},
+				     {mat[2][0], mat[2][1], mat[2][2]}};
+		compute_solution3(solution, mat3, rhs);
+	      }
+	      break;
+	    case 3:
+	      compute_solution4(solution, mat, rhs);
 	      break;
-	    default: 
-	      PyErr_SetString(PyExc_ValueError,"regress: unknown smoothing method");
-	      goto fail;
 	    }
-	REGRESS_SET_VALUE(r, PyArray_GETPTR3(r, i0, i1, i2), value);
-	if (smoothing_method==SM_LINEAR)
-	  for (im1=0;im1<rank;im1++)
-	    REGRESS_SET_VALUE(grad, PyArray_GETPTR4(grad, im1, i0, i1, i2), solution[im1+1]);
-	count ++;
-      }
-      REGRESS_LOOP_END;
-      if (verbose)
-	{
-	  eta = (clock() - start_clock) * (sz/((double)count)-1.0) / CLOCKS_PER_SEC;
-	  CALL_WRITE((write_func,
-		      PyString_FromString("\rComputing regression: %6.2f%% done, #kernel points:%d, ETA:%4.1fs  "),
-		      PyFloat_FromDouble((count*100.0)/sz),
-		      PyInt_FromLong(kn),
-		      PyFloat_FromDouble(eta),
-		      NULL));
+	  y[row*n+col] = solution[0];
+	  if (g!=NULL)
+	    for (i=0; i<rank; ++i)
+	      g[(i*nrows + row)*n + col] = solution[i+1];
 	}
-      REGRESS_LOOP_END;
-      REGRESS_LOOP_END;
-      CALL_WRITE((write_func, PyString_FromString("\n"), NULL));
-      break;
-    default:
-      PyErr_SetString(PyExc_ValueError,"regress: unsupported array rank");
-      goto fail;
     }
-  free(scales);
-  free(kdims);
-  if (gdims!=NULL) free(gdims);
-  free(di);
+  Py_END_ALLOW_THREADS
+
+  free(segments);
+  free(F0);
+  if (F1!=NULL) free(F1);
+  if (NF!=NULL) free(NF);
+  Py_DECREF(a);
   return Py_BuildValue("NN", r, grad);
  fail:
-  Py_DECREF(r);
-  Py_DECREF(grad);
-  free(scales);
-  free(kdims);
-  if (gdims!=NULL) free(gdims);
-  free(di);
+  if (segments!=NULL) free(segments);
+  if (F0!=NULL) free(F0);
+  if (F1!=NULL) free(F1);
+  if (NF!=NULL) free(NF);
+  Py_XDECREF(a);
+  Py_XDECREF(r);
+  Py_XDECREF(grad);
   return NULL;
-
 }
 
 static PyMethodDef module_methods[] = {
   {"kernel", kernel, METH_VARARGS, "kernel(scales, kernel_type_code)->array"},
-  {"regress", regress, METH_VARARGS, "regress(a, scales, kernel_type_code, smoother_method_code, boundary_condition_code, verbose)->(array,gradient)"},
+  {"regress", regress, METH_VARARGS, "regress(a, scales, kernel_type_code, smoother_method_code, boundary_condition_code, write_func[, nthreads, return_gradient])->(array,gradient)"},
+  {"average_1d", average_1d, METH_VARARGS, "average_1d(a, axis, kernel, boundary_condition_code)->array"},
+  {"uniform_1d", uniform_1d, METH_VARARGS, "uniform_1d(a, axis, m, end_weight, boundary_condition_code)->array"},
+  {"regress_uniform", regress_uniform, METH_VARARGS, "regress_uniform(a, scales, smoother_method_code, boundary_condition_code, box[, return_gradient])->(array,gradient)"},
   {NULL}  /* Sentinel */
 };
 
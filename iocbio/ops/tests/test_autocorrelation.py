@@ -0,0 +1,34 @@
+from __future__ import division
+
+import numpy
+from iocbio.ops import acf_ext
+from iocbio.ops.autocorrelation import acf, acf_argmax
+
+def make_data(n):
+    x = numpy.linspace(0, 6*numpy.pi, n)
+    return [numpy.sin(3*x) + 0.3*numpy.random.rand(n),
+            numpy.random.rand(n),
+            numpy.zeros(n),
+            numpy.random.rand(n, 3)]
+
+def test_acf_fft():
+    numpy.random.seed(1)
+    for n in [1, 2, 3, 7, 50, 333]:
+        # fractional, negative and >=N lags
+        y = numpy.concatenate([numpy.arange(-n-3, n+4, 0.13), [0., 1., n-1, n, n+0.5, -n-0.5, 1e9]])
+        for f in make_data(n):
+            for method, mth in [('constant', 0), ('linear', 1)]:
+                expected = acf_ext.acf(f, y, mth)
+                result = acf(f, y, method, enable_fft=True)
+                assert result.shape==expected.shape, `n, f.shape, method`
+                scale = max(abs(expected).max(), 1e-300)
+                assert abs(result - expected).max()/scale < 1e-12, `n, f.shape, method`
+
+def test_acf_argmax_fft():
+    numpy.random.seed(1)
+    for n in [1, 2, 3, 7, 50, 333]:
+        for f in make_data(n)[:3]:
+            for start_j in [0, 1, 5, n-1, n]:
+                expected = acf_ext.acf_argmax(f, start_j, 1)
+                result = acf_argmax(f, start_j, enable_fft=True)
+                assert abs(result - expected) < 1e-8, `n, start_j, result, expected`
@@ -0,0 +1,45 @@
+from __future__ import division
+
+import numpy
+from iocbio.utils import Options
+from iocbio.ops.fft_tasks import FFTTasks, fft_plan_pool
+from iocbio.ops.fft_backends import backends
+
+def test_many():
+    numpy.random.seed(0)
+    for backend in backends:
+        if not backend.is_available('double'):
+            continue
+        name = backend.name
+        options = Options(fft_backend=name)
+        for shape in [(8,), (6,9), (4,5,6)]:
+            data = numpy.random.rand(*((3,)+shape))
+            kernel = numpy.random.rand(*shape)
+            for real in [False, True]:
+                task = FFTTasks(shape, float_type='double', options=options, real=real)
+                task.set_convolve_kernel(kernel)
+                data_f = task.fft_many(data)
+                data_if = task.ifft_many(data_f)
+                result = task.convolve_many(data)
+                for i in range(data.shape[0]):
+                    assert abs(data_f[i] - task.fft(data[i])).max() < 1e-12, `name, shape, real`
+                    assert abs(data_if[i] - task.ifft(data_f[i])).max() < 1e-12, `name, shape, real`
+                    assert abs(result[i] - task.convolve(data[i])).max() < 1e-12, `name, shape, real`
+                assert abs(data_if - data).max() < 1e-12, `name, shape, real`
+
+def test_convolve_not_inplace():
+    numpy.random.seed(0)
+    task = FFTTasks((6, 8), float_type='double', real=True)
+    kernel = numpy.random.rand(6, 8)
+    data = numpy.random.rand(6, 8)
+    task.set_convolve_kernel(kernel)
+    expected = task.convolve(data)
+    rbuffer = task.get_buffers()[0]
+    rbuffer[:] = 1
+    result = task.convolve(data, inplace=False)
+    assert abs(result - expected).max() < 1e-12
+    assert (rbuffer==1).all()
+    # the second set of buffers is returned to the pool after the call
+    size = fft_plan_pool.get_statistics()['size']
+    task.convolve(data, inplace=False)
+    assert fft_plan_pool.get_statistics()['size']==size
@@ -0,0 +1,69 @@
+from __future__ import division
+
+import numpy
+from iocbio.ops import regress_ext, regression
+from iocbio.ops.regression import regress, get_regress_method, boundary_conditions
+
+def test_regress_fft():
+    numpy.random.seed(0)
+    for shape, scales in [((33,), (0.1,)), ((32,), (0.1,)),
+                          ((13, 17), (0.2, 0.15)), ((32, 33), (0.1, 0.1)),
+                          ((16, 20), (0.2, 0.25)), ((9, 10, 11), (0.3, 0.3, 0.3))]:
+        data = numpy.random.rand(*shape)
+        for support in ['ellipsoid', 'box']:
+            for kernel in ['uniform', 'tricube']:
+                if support=='box' and kernel!='uniform':
+                    continue
+                direct = regress(data, scales, kernel, 'average', 'periodic', verbose=False,
+                                 support=support, enable_fft=False, return_gradient=False)
+                for enable_fft in [True, 'auto']:
+                    result = regress(data, scales, kernel, 'average', 'periodic', verbose=False,
+                                     support=support, enable_fft=enable_fft, return_gradient=False)
+                    assert abs(result - direct).max() < 1e-12, `shape, support, kernel, enable_fft`
+
+def test_regress_fft_auto():
+    # large kernels with periodic averaging are computed with FFT
+    assert get_regress_method((64, 64), (0.05, 0.05), 'tricube', 'average', 'periodic',
+                              'ellipsoid', 'auto')=='fft'
+
+def test_regress_box_uniform():
+    # averaging with box uniform kernel uses prefix sums one axis at
+    # a time, compare with segment sums of regress_uniform
+    numpy.random.seed(0)
+    for shape, scales in [((33,), (0.1,)), ((13, 17), (0.2, 0.15)),
+                          ((9, 10, 11), (0.3, 0.25, 1/3)), ((8, 9, 40), (0.5, 0.1, 0.04))]:
+        data = numpy.random.rand(*shape)
+        assert get_regress_method(shape, scales, 'uniform', 'average', 'finite', 'box')=='separable'
+        for boundary in boundary_conditions:
+            expected = regress_ext.regress_uniform(data, scales, 0, boundary_conditions[boundary], 1, 0)[0]
+            result = regress(data, scales, 'uniform', 'average', boundary, verbose=False,
+                             support='box', return_gradient=False)
+            assert abs(result - expected).max() < 1e-12, `shape, boundary`
+
+def test_regress_box_invalid():
+    data = numpy.random.rand(8, 8)
+    try:
+        regress(data, (0.5, 0.5), 'tricube', 'linear', 'finite', verbose=False,
+                support='box', return_gradient=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('box support with tricube kernel and linear method was accepted')
+
+def test_kernel_spectrum_cache_eviction():
+    cache, order = regression.kernel_spectrum_cache, regression.kernel_spectrum_cache_order
+    cache_size = regression.kernel_spectrum_cache_size
+    cache.clear()
+    del order[:]
+    try:
+        regression.kernel_spectrum_cache_size = 2
+        data = numpy.random.rand(64)
+        for scale in [0.2, 0.25, 0.2, 0.5]:
+            regression.regress_fft(data, (scale,))
+        # the least recently used spectrum of scale 0.25 is evicted
+        assert [key[1] for key in order]==[(0.2,), (0.5,)], `order`
+        assert sorted(cache)==sorted(order)
+    finally:
+        regression.kernel_spectrum_cache_size = cache_size
+        cache.clear()
+        del order[:]
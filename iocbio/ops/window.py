@@ -26,17 +26,67 @@ itself::
 .. image:: ../_static/apply_window_1d.png
   :width: 60%
 
+Window profiles
+---------------
+
+The window is a product of 1D profiles along the axes of data. The
+profiles are cached by ``(shape, scales, smoothness)`` so that
+windowing of many images with the same shape reduces to a
+multiplication pass over data that is carried out in parallel over the
+outer axes of data.
+
 """
 
-__all__ = ['apply_window']
+__all__ = ['apply_window', 'get_window_profiles']
 
 try:
-    from .apply_window_ext import apply_window_inplace
+    from .apply_window_ext import apply_window_inplace, window_profile, apply_window_profiles
 except ImportError, msg:
     print msg
 
+# Maps (shape, scales, smoothness) to window profiles, see
+# get_window_profiles. The order list holds the keys, most recently
+# used last.
+window_profiles_cache = {}
+window_profiles_cache_order = []
+window_profiles_cache_size = 16
+
+def get_window_profiles(shape, scales, smoothness=1):
+    """ Return 1D window profiles.
+
+    Parameters
+    ----------
+    shape : tuple
+      Shape of data.
+    scales : tuple
+      Scaling factors, see `apply_window`.
+    smoothness : int
+      Smoothness of window, see `apply_window`.
+
+    Returns
+    -------
+    profiles : tuple
+      A tuple of 1D arrays such that the window function is
+      ``profiles[0][i0]*profiles[1][i1]*..``.
+
+    See also
+    --------
+    :mod:`iocbio.ops.window`, apply_window
+    """
+    key = tuple(shape), tuple([float(s) for s in scales]), int(smoothness)
+    profiles = window_profiles_cache.get(key)
+    if profiles is None:
+        while window_profiles_cache_order and len(window_profiles_cache_order) >= window_profiles_cache_size:
+            del window_profiles_cache[window_profiles_cache_order.pop(0)]
+        profiles = tuple([window_profile(n, s, key[2]) for n, s in zip(*key[:2])])
+        window_profiles_cache[key] = profiles
+    else:
+        window_profiles_cache_order.remove(key)
+    window_profiles_cache_order.append(key)
+    return profiles
+
 def apply_window(data, scales, smoothness=1, 
-                 background=0.0, inplace=False):
+                 background=0.0, inplace=False, threads=0):
     """ Multiply data with window function.
 
     Each value in data will be multiplied with ``w=w[0]*w[1]*..``
@@ -63,15 +113,22 @@ def apply_window(data, scales, smoothness=1,
     inplace : bool
       When True then multiplication is performed in-situ.
 
+    threads : int
+      Number of threads used for multiplication. When 0 then the
+      number of processors is used.
+
     Returns
     -------
     data : numpy.ndarray
 
     See also
     --------
-    :mod:`iocbio.ops.window`
+    :mod:`iocbio.ops.window`, get_window_profiles
     """
     if not inplace:
         data = data.copy()
-    apply_window_inplace(data, scales, smoothness, background)
+    if len(scales) != data.ndim:
+        raise TypeError('scales must have size equal to the rank of data')
+    profiles = get_window_profiles(data.shape, scales, smoothness)
+    apply_window_profiles(data, profiles, float(background), int(threads))
     return data
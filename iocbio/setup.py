@@ -1,4 +1,5 @@
 
+import os
 import sys
 from os.path import join, basename, dirname, splitext
 from glob import glob
@@ -6,6 +7,46 @@ from glob import glob
 from numpy.distutils import log
 from distutils.dep_util import newer
 
+# Cached result of get_openmp_args.
+_openmp_args = []
+
+def get_openmp_args():
+    """ Return compiler and linker flags that enable OpenMP.
+
+    The flags are tried by compiling and linking a small OpenMP
+    program with the default C compiler. An empty list is returned
+    when the compiler does not support OpenMP or when
+    IOCBIO_NO_OPENMP environment variable is set.
+    """
+    if os.environ.get('IOCBIO_NO_OPENMP'):
+        return []
+    if _openmp_args:
+        return _openmp_args[0]
+    import tempfile
+    import shutil
+    from distutils.errors import CompileError, LinkError
+    from numpy.distutils.ccompiler import new_compiler
+    compiler = new_compiler()
+    compiler.customize(None)
+    args = ['-fopenmp']
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        source = join(tmp_dir, 'openmp_test.c')
+        f = open(source, 'w')
+        f.write('#include <omp.h>\nint main(void) { return omp_get_max_threads() < 1; }\n')
+        f.close()
+        try:
+            objects = compiler.compile([source], output_dir=tmp_dir, extra_postargs=args)
+            compiler.link_executable(objects, join(tmp_dir, 'openmp_test'), extra_postargs=args)
+        except (CompileError, LinkError):
+            log.warn('%s C compiler does not support %s, building without OpenMP',
+                     compiler.compiler_type, ' '.join(args))
+            args = []
+    finally:
+        shutil.rmtree(tmp_dir)
+    _openmp_args.append(args)
+    return args
+
 
 def configuration(parent_package='',top_path=None):
     from numpy.distutils.misc_util import Configuration